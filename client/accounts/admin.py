@@ -1,15 +1,33 @@
 import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import magic
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.contrib.auth.hashers import make_password
 from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
 
 from .models import User
 
 
+# Number of passwords from which hashing is spread over multiple threads
+PARALLEL_HASHING_THRESHOLD = 10
+
+
+def hash_passwords(passwords):
+    """
+    Hash the given passwords, for larger uploads the (deliberately slow) hashing is spread over multiple threads
+    (the password hashers release the GIL while hashing).
+    """
+    if len(passwords) < PARALLEL_HASHING_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return list(executor.map(make_password, passwords))
+
+
 class UserForm(forms.ModelForm):
     """A form for creating/updating users. Includes all the fields on
     the user, but replaces the password field with admin's
@@ -32,6 +50,11 @@ class UserForm(forms.ModelForm):
         self.fields['email'].required = False
         self.fields['full_name'].required = False
         self.fields['date_joined'].required = False
+        self.fields['simulation_weight'].required = False  # the (model) default if not given, see below
+
+    def clean_simulation_weight(self):
+        weight = self.cleaned_data['simulation_weight']
+        return User._meta.get_field('simulation_weight').default if weight is None else weight
 
     def clean(self):
         cleaned_data = super().clean()
@@ -53,23 +76,29 @@ class UserForm(forms.ModelForm):
                             institution = email.split('@')[-1]
                             if institution in ('gmail.com', 'yahoo.com', 'hotmail.com'):
                                 institution = ''
-                            if not User.objects.filter(email=email).exists():
-                                users.append((email, email.split('@')[0], institution, col))
+                            users.append((email, email.split('@')[0], institution, col))
                             break
                         if '@' in col:
                             email = col
+            # skip existing users (and duplicates in the file) using a single query
+            existing = set(User.objects.filter(email__in=[user[0] for user in users]).values_list('email', flat=True))
+            new_users = {}
+            for user in users:
+                if user[0] not in existing:
+                    new_users.setdefault(user[0], user)
+            users = list(new_users.values())
+            self.import_report = {'created': len(users), 'skipped': sorted(existing)}
             if not users:
                 raise forms.ValidationError('TSV file did not contain (new) user accounts.')
+            passwords = hash_passwords([user[3] for user in users])
             user = users.pop()
             self.cleaned_data['email'] = user[0]
             self.cleaned_data['full_name'] = user[1]
             self.cleaned_data['institution'] = user[2]
-            self.cleaned_data['password'] = make_password(user[3])
-            for user in users:
-                User.objects.create(email=user[0],
-                                    full_name=user[1],
-                                    institution=user[2],
-                                    password=make_password(user[3]))
+            self.cleaned_data['password'] = passwords.pop()
+            # the other users are created when the form is saved (see save_bulk_users)
+            self.bulk_users = [User(email=user[0], full_name=user[1], institution=user[2], password=password)
+                               for user, password in zip(users, passwords)]
 
         elif not all((self.cleaned_data.get('email', None),
                       self.cleaned_data.get('full_name', None),
@@ -87,11 +116,35 @@ class UserForm(forms.ModelForm):
             cleaned_data['password'] = make_password(self.cleaned_data['password1'])
         return cleaned_data
 
+    def save_bulk_users(self):
+        """
+        Creates the other users of a bulk upload (the form's own user is the last one in the file).
+        """
+        User.objects.bulk_create(getattr(self, 'bulk_users', []))
+
+    def save(self, commit=True):
+        if not commit:  # the admin saves the user (and the bulk upload) in save_model
+            return super().save(commit=False)
+        with transaction.atomic():
+            user = super().save()
+            self.save_bulk_users()
+        return user
+
 
 class UserAdmin(admin.ModelAdmin):
     form = UserForm
     add_form = UserForm
 
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            form.save_bulk_users()
+        report = getattr(form, 'import_report', None)
+        if report:
+            messages.info(request, f"Bulk upload created {report['created']} user account(s)." +
+                          (f" Skipped {len(report['skipped'])} existing account(s): {', '.join(report['skipped'])}."
+                           if report['skipped'] else ''))
+
 
 # Now register the new UserAdmin...
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:54
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='max_running_simulations',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum number of simultaneously running simulations (0 = no limit, empty = the site default).', null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='simulation_weight',
+            field=models.FloatField(default=1, help_text='Share of the simulation capacity, relative to other users.', validators=[django.core.validators.MinValueValidator(0.01)]),
+        ),
+    ]
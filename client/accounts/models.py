@@ -1,4 +1,5 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils import timezone
 
@@ -20,6 +21,14 @@ class User(PermissionsMixin, AbstractBaseUser):
     is_active = models.BooleanField(default=True)
 
     date_joined = models.DateTimeField(default=timezone.now)
+
+    # simulation scheduling (see simulations.scheduler)
+    simulation_weight = models.FloatField(default=1, validators=[MinValueValidator(0.01)],
+                                          help_text='Share of the simulation capacity, relative to other users.')
+    max_running_simulations = models.PositiveIntegerField(
+        blank=True, null=True,
+        help_text='Maximum number of simultaneously running simulations (0 = no limit, empty = the site default).'
+    )
     last_login = models.DateTimeField(blank=True, null=True)
 
     USERNAME_FIELD = 'email'
@@ -3,7 +3,7 @@ from datetime import datetime
 from shutil import copyfile
 
 import pytest
-from accounts.admin import UserForm
+from accounts.admin import PARALLEL_HASHING_THRESHOLD, UserForm
 from accounts.forms import MyAccountForm, RegistrationForm
 from accounts.models import User
 from django.conf import settings
@@ -121,6 +121,17 @@ class TestMyAccountForm:
         form.save()
         assert data_equals_user(data, user)
 
+    def test_empty_simulation_weight(self, user):
+        user.simulation_weight = 2
+        user.save()
+        data = {'email': user.email, 'full_name': user.full_name, 'institution': user.institution,
+                'date_joined': datetime.now(), 'simulation_weight': ''}
+        form = UserForm(instance=user, data=data)
+        assert form.is_valid()
+        form.save()
+        user.refresh_from_db()
+        assert user.simulation_weight == 1  # the default weight
+
     def test_same_email_user(self, user, admin_user):
         data = {'email': admin_user.email,
                 'full_name': user.full_name,
@@ -287,6 +298,34 @@ class TestUserForm:
         assert User.objects.filter(email='yawyisrael@gmail.com').exists()
         assert User.objects.filter(email='bernard_christophe@hotmail.com').exists()
 
+    def test_bulk_upload_many(self, tmp_path):
+        User.objects.create(email='user0@uni.ac.uk', full_name='user0', institution='uni.ac.uk', password='pwd')
+        accounts_file = os.path.join(tmp_path, 'many_accounts.tsv')
+        with open(accounts_file, 'w') as file:
+            for i in range(PARALLEL_HASHING_THRESHOLD + 2):
+                file.write(f'{i}\tuser{i}\tuser{i}@uni.ac.uk\t\t\tPassw0rd{i}\n')
+            file.write('99\tuser1\tuser1@uni.ac.uk\t\t\tduplicate\n')
+        tsv_upload = TemporaryUploadedFile('many_accounts.tsv', 'text/plain', os.path.getsize(accounts_file), 'utf-8')
+        tsv_upload.file = open(accounts_file, 'rb')
+
+        form = UserForm({}, {'tsv': tsv_upload})
+        assert form.is_valid()
+        assert User.objects.count() == 1  # users are only created when the form is saved
+        form.save()
+        assert form.import_report == {'created': PARALLEL_HASHING_THRESHOLD + 1, 'skipped': ['user0@uni.ac.uk']}
+        assert User.objects.count() == PARALLEL_HASHING_THRESHOLD + 2
+        for i in range(1, PARALLEL_HASHING_THRESHOLD + 2):
+            user = User.objects.get(email=f'user{i}@uni.ac.uk')
+            assert user.institution == 'uni.ac.uk'
+            assert check_password(f'Passw0rd{i}', user.password)
+
+    def test_bulk_upload_admin(self, logged_in_admin, client):
+        with open(os.path.join(settings.BASE_DIR, 'accounts', 'tests', 'accounts.tsv'), 'rb') as file:
+            response = client.post('/admin/accounts/user/add/', {'tsv': file, 'simulation_weight': 1})
+        assert response.status_code == 302
+        assert User.objects.filter(email__in=['pierre.jordaan@novartis.com', 'yawyisrael@gmail.com',
+                                              'bernard_christophe@hotmail.com']).count() == 3
+
     def test_bulk_upload_no_accounts(self, tmp_path):
         tsv_upload = self.upload_accounts(tmp_path, 'accounts2.tsv')
         form = UserForm({}, {'tsv': tsv_upload})
@@ -0,0 +1,19 @@
+"""
+ASGI config for ap-nimbus-client project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI the natively async views (simulation status, graph data, restarting simulations and media files) run
+concurrently on the event loop, rather than each taking up a worker process while waiting on the AP manager.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.production_settings')
+
+application = get_asgi_application()
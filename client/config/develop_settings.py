@@ -1,7 +1,7 @@
 import os
 
 from .production_settings import *  # noqa
-from .production_settings import BASE_DIR
+from .production_settings import BASE_DIR, INSTALLED_APPS
 
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -9,6 +9,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['*']
 
+# load testing commands (fake_ap_manager, load_test), which create users and must not be run against production
+INSTALLED_APPS = INSTALLED_APPS + ['loadtest']
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -77,6 +77,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -176,12 +177,60 @@ USE_X_FORWARDED_HOST = True
 MEDIA_URL = FORCE_SCRIPT_NAME + 'media/'
 MEDIA_ROOT = '/opt/django/media/'
 
+# Internal nginx location for serving protected media via X-Accel-Redirect (e.g. /protected_media/)
+# If empty, protected media files are served by django itself
+MEDIA_X_ACCEL_REDIRECT = os.environ.get('MEDIA_X_ACCEL_REDIRECT', '')
+
 # Force using temporary fiile for upload
 FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
 
 # API location for AP manager
 AP_PREDICT_ENDPOINT = os.environ.get('AP_PREDICT_ENDPOINT', 'http://path_to_ap_manager')
 AP_PREDICT_STATUS_TIMEOUT = int(os.environ.get('AP_PREDICT_STATUS_TIMEOUT', 1000))
+# Stream input files (cellml / PK data) to AP manager as multipart uploads, rather than embedding them in a json body
+AP_PREDICT_MULTIPART_SUBMISSION = os.environ.get('AP_PREDICT_MULTIPART_SUBMISSION', 'False').lower() == 'true'
+
+# Simulation scheduler: submitted simulations are queued and started while fewer than SIMULATION_MAX_RUNNING simulations
+# are running in total and fewer than SIMULATION_MAX_RUNNING_PER_USER for the user (0 = no limit)
+SIMULATION_MAX_RUNNING = int(os.environ.get('SIMULATION_MAX_RUNNING', 0))
+SIMULATION_MAX_RUNNING_PER_USER = int(os.environ.get('SIMULATION_MAX_RUNNING_PER_USER', 0))
+# Simulations predicted to run for at least SIMULATION_LARGE_RUNTIME seconds (0 = off) are large, at most
+# SIMULATION_MAX_RUNNING_LARGE of those run at the same time (0 = no limit)
+SIMULATION_LARGE_RUNTIME = int(os.environ.get('SIMULATION_LARGE_RUNTIME', 0))
+SIMULATION_MAX_RUNNING_LARGE = int(os.environ.get('SIMULATION_MAX_RUNNING_LARGE', 0))
+
+# Runtime prediction: fitted on the last RUNTIME_ESTIMATOR_HISTORY successful simulations every RUNTIME_ESTIMATOR_REFIT
+# seconds, groups of similar simulations need at least RUNTIME_ESTIMATOR_MIN_SAMPLES runs to go by
+RUNTIME_ESTIMATOR_HISTORY = int(os.environ.get('RUNTIME_ESTIMATOR_HISTORY', 5000))
+RUNTIME_ESTIMATOR_REFIT = int(os.environ.get('RUNTIME_ESTIMATOR_REFIT', 3600))
+RUNTIME_ESTIMATOR_MIN_SAMPLES = int(os.environ.get('RUNTIME_ESTIMATOR_MIN_SAMPLES', 3))
+
+# Result retention: the archive_simulations command moves the results of (successful) simulations older than this
+# many days, whose results take up at least SIMULATION_ARCHIVE_MIN_SIZE KB, into compressed archive files (0 = off)
+SIMULATION_ARCHIVE_AFTER_DAYS = int(os.environ.get('SIMULATION_ARCHIVE_AFTER_DAYS', 0))
+SIMULATION_ARCHIVE_MIN_SIZE = int(os.environ.get('SIMULATION_ARCHIVE_MIN_SIZE', 0))
+
+# Build the spreadsheets of successful simulations in the background (run the build_spreadsheets command as worker),
+# rather than when they are first downloaded
+SIMULATION_SPREADSHEET_WORKER = os.environ.get('SIMULATION_SPREADSHEET_WORKER', 'False').lower() == 'true'
+
+# Number of threads building spreadsheets for bulk exports (per export)
+SIMULATION_EXPORT_WORKERS = int(os.environ.get('SIMULATION_EXPORT_WORKERS', 4))
+
+# Bearer token for scraping the prometheus /metrics endpoint (staff users can always see the metrics)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Request profiling: profile all requests (otherwise only requests from staff users sending an X-Profile header),
+# log (profiled) requests taking at least PROFILING_SLOW_REQUEST_MS ms (0 = off) with their slowest queries and
+# profile a fraction (PROFILING_CPROFILE_RATE) of the requests to the given views with cProfile
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_TRACE_MEMORY = os.environ.get('PROFILING_TRACE_MEMORY', 'False').lower() == 'true'
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 1000))
+PROFILING_TOP_QUERIES = int(os.environ.get('PROFILING_TOP_QUERIES', 5))
+PROFILING_CPROFILE_RATE = float(os.environ.get('PROFILING_CPROFILE_RATE', 0))
+PROFILING_CPROFILE_VIEWS = os.environ.get('PROFILING_CPROFILE_VIEWS',
+                                          'SimulationCreateView,SimulationListView,DataSimulationView').split(',')
+PROFILING_CPROFILE_DIR = os.environ.get('PROFILING_CPROFILE_DIR', '/opt/django/profiles')
 
 # Hosting information for the privacy policy
 HOSTING_INFO = os.environ.get('HOSTING_INFO', '')
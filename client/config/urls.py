@@ -13,7 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from core.views import MediaView
+from core.views import MediaView, MetricsView
 from django.contrib import admin
 from django.urls import include, re_path
 from django.views.generic import TemplateView
@@ -27,6 +27,9 @@ urlpatterns = [
     # protected file upload
     re_path(r'^media/(?P<file_name>.+)$', MediaView.as_view(), name="media"),
 
+    # prometheus metrics
+    re_path(r'^metrics$', MetricsView.as_view(), name="metrics"),
+
     re_path(r'^admin/', admin.site.urls),
     re_path(r'^accounts/', include('accounts.urls', namespace='accounts')),
     re_path(r'^accounts/', include('django.contrib.auth.urls')),
@@ -1,12 +1,15 @@
 import json
 import os
+import threading
 import uuid
 
 import pytest
 from accounts.models import User
 from django.conf import settings
 from files.models import IonCurrent
+from loadtest.fake_ap_manager import FakeAPManager, make_server
 from model_bakery.recipe import Recipe, seq
+from simulations import views
 from simulations.models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
 
 
@@ -161,7 +164,7 @@ def simulation_range(simulation_recipe, user, o_hara_model):
 
     data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'STDOUT.txt')
     with open(data_source_file, encoding='utf-8') as file:
-        sim.STDOUT = json.loads(file.read())
+        sim.save_stdout(json.loads(file.read())['content'])
 
     data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'version_info.txt')
     with open(data_source_file, encoding='utf-8') as file:
@@ -211,9 +214,52 @@ def simulation_pkdata(simulation_recipe, user, o_hara_model):
                                   PK_data=f'{uuid.uuid4()}_pk_data.tsv')
 
 
+RESULT_FILES = {'q_net': 'q_net.txt', 'voltage_results': 'voltage_results.txt', 'pkpd_results': 'pkpd_results.txt',
+                'voltage_traces': 'voltage_traces.txt'}
+
+
+@pytest.fixture
+def load_results():
+    """
+    Makes a simulation successful, with the results from the given test files (by default those of simulation_range).
+    """
+    def load(sim, call_id=None, **files):
+        sim.status = Simulation.Status.SUCCESS
+        sim.progress = 'Completed'
+        if call_id is not None:
+            sim.ap_predict_call_id = call_id
+        for field, file_name in (files or RESULT_FILES).items():
+            with open(os.path.join(settings.BASE_DIR, 'simulations', 'tests', file_name), 'r') as file:
+                setattr(sim, field, json.loads(file.read()))
+        sim.save()
+        return sim
+    return load
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.MEDIA_X_ACCEL_REDIRECT = ''
+    return tmp_path
+
+
 @pytest.fixture
 def manifest_contents():
     manifest_file = os.path.join(settings.BASE_DIR, 'files', 'migrations', 'appredict_lookup_table_manifest.txt')
     with open(manifest_file) as f:
         return f.read().strip()
 
+
+@pytest.fixture
+def fake_ap_manager(settings, monkeypatch):
+    ap_manager = FakeAPManager(run_time=0, concentration_count=3, trace_length=10)
+    server = make_server(ap_manager, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    url = f'http://localhost:{server.server_address[1]}/'
+    settings.AP_PREDICT_ENDPOINT = url
+    monkeypatch.setattr(views, 'AP_MANAGER_URL', url + 'api/collection/%s/%s')
+    yield ap_manager
+    server.shutdown()
+    server.server_close()
+    thread.join()
@@ -0,0 +1,75 @@
+import os
+
+from django.db.models import Count, Sum
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from simulations.models import Simulation
+
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+AP_MANAGER_CALL_SECONDS = Histogram(
+    'ap_manager_call_seconds', 'Latency of calls to the AP manager.', ['command'],
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+AP_MANAGER_CALL_ERRORS = Counter(
+    'ap_manager_call_errors', 'Failed calls to the AP manager (connection, api or validation errors).', ['command'],
+)
+AP_MANAGER_RESPONSE_BYTES = Histogram(
+    'ap_manager_response_bytes', 'Size of AP manager responses (e.g. result payloads).', ['command'],
+    buckets=(1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8),
+)
+SUBMISSION_SECONDS = Histogram(
+    'simulation_submission_seconds', 'Latency of submitting a simulation to the AP manager.', ['outcome'],
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+COMPLETION_SECONDS = Histogram(
+    'simulation_completion_seconds', 'Time from submission until a simulation is completed successfully.',
+    buckets=(MINUTE, 5 * MINUTE, 15 * MINUTE, 30 * MINUTE, HOUR, 2 * HOUR, 6 * HOUR, 24 * HOUR),
+)
+RENDER_SECONDS = Histogram(
+    'simulation_render_seconds', 'Time to render simulation results (graph data or spreadsheet).', ['view'],
+    buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+
+
+class SimulationStatusCollector:
+    """
+    Number of simulations and their total predicted runtime by status (from the database when the metrics are
+    collected), the latter e.g. for capacity planning.
+    """
+    def collect(self):
+        rows = Simulation.objects.order_by().values_list('status').annotate(Count('pk'), Sum('estimated_runtime'))
+        counts = {status: (count, runtime) for status, count, runtime in rows}
+        gauge = GaugeMetricFamily('simulations', 'Number of simulations by status.', labels=['status'])
+        runtime_gauge = GaugeMetricFamily('simulations_predicted_runtime_seconds',
+                                          'Total predicted runtime of simulations by status.', labels=['status'])
+        for status in Simulation.Status.values:
+            count, runtime = counts.get(status, (0, None))
+            gauge.add_metric([status], count)
+            runtime_gauge.add_metric([status], runtime or 0)
+        yield gauge
+        yield runtime_gauge
+
+
+def collect_metrics():
+    """
+    The current metrics, in the Prometheus text format.
+    When PROMETHEUS_MULTIPROC_DIR is set (for uWSGI with multiple processes), each process writes its metrics to files
+    in that directory, which are aggregated here.
+    """
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    status_registry = CollectorRegistry()
+    status_registry.register(SimulationStatusCollector())
+    return generate_latest(registry) + generate_latest(status_registry)
@@ -0,0 +1,190 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import tracemalloc
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.urls import Resolver404, resolve
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+current_profile = ContextVar('current_profile', default=None)
+# tracemalloc is process wide, so memory is traced for one request at a time
+trace_memory_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    Timings collected while handling a (profiled) request.
+    """
+    def __init__(self):
+        self.start = perf_counter()
+        self.total = 0
+        self.queries = []  # (sql, duration) tuples
+        self.ap_manager_calls = 0
+        self.ap_manager_time = 0
+        self.peak_memory = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper, timing each query.
+        """
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, perf_counter() - start))
+
+    @property
+    def query_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicated_queries(self):
+        """
+        Queries (as sql with placeholders) executed more than once, with the number of times they were executed.
+        """
+        return {sql: count for sql, count in Counter(sql for sql, _ in self.queries).items() if count > 1}
+
+    def top_queries(self, n):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:n]
+
+    def server_timing(self):
+        timings = [f'total;dur={self.total * 1000:.1f}',
+                   f'db;dur={self.query_time * 1000:.1f};desc="{len(self.queries)} queries, '
+                   f'{len(self.duplicated_queries())} duplicated"',
+                   f'ap;dur={self.ap_manager_time * 1000:.1f};desc="{self.ap_manager_calls} AP manager calls"']
+        if self.peak_memory is not None:
+            timings.append(f'mem;desc="peak {self.peak_memory / 1024:.0f} KB"')
+        return ', '.join(timings)
+
+
+def record_ap_manager_call(duration):
+    """
+    Add the time taken by a call to the AP manager to the profile of the current request (if it is being profiled).
+    """
+    profile = current_profile.get()
+    if profile is not None:
+        profile.ap_manager_calls += 1
+        profile.ap_manager_time += duration
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per request profiling, for all requests when PROFILING_ENABLED is set or for requests from staff users
+    sending the X-Profile header. Profiled requests get a Server-Timing header (wall time, database queries and AP
+    manager calls), requests slower than PROFILING_SLOW_REQUEST_MS are logged with their slowest queries and a
+    sample (PROFILING_CPROFILE_RATE) of the requests to PROFILING_CPROFILE_VIEWS is profiled with cProfile.
+    Under ASGI, cProfile only sees the event loop thread and concurrently handled requests would share (and stop)
+    each other's memory tracing, so neither is used for requests handled asynchronously. Under WSGI, memory is traced
+    for one request at a time (per process), requests arriving meanwhile are profiled without it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def is_enabled(self, request):
+        if settings.PROFILING_ENABLED:
+            return True
+        return PROFILE_HEADER in request.headers and getattr(request, 'user', None) is not None \
+            and request.user.is_staff
+
+    def view_name(self, request):
+        try:
+            view = resolve(request.path_info).func
+        except Resolver404:
+            return None
+        return getattr(view, 'view_class', view).__name__
+
+    def start(self, trace_memory=False):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        trace_memory = trace_memory and trace_memory_lock.acquire(blocking=False)
+        if trace_memory and tracemalloc.is_tracing():  # traced by someone else (e.g. PYTHONTRACEMALLOC)
+            trace_memory_lock.release()
+            trace_memory = False
+        if trace_memory:
+            tracemalloc.start()
+        return profile, token, trace_memory
+
+    def stop(self, profile, token, trace_memory):
+        profile.total = perf_counter() - profile.start
+        if trace_memory:
+            profile.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            trace_memory_lock.release()
+        current_profile.reset(token)
+
+    def finish(self, request, response, profile):
+        response['Server-Timing'] = profile.server_timing()
+        if settings.PROFILING_SLOW_REQUEST_MS and profile.total * 1000 >= settings.PROFILING_SLOW_REQUEST_MS:
+            self.log_slow_request(request, profile)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_enabled(request):
+            return self.get_response(request)
+
+        profile, token, trace_memory = self.start(trace_memory=settings.PROFILING_TRACE_MEMORY)
+        view_name = self.view_name(request)
+        profiler = None
+        if view_name in settings.PROFILING_CPROFILE_VIEWS and random.random() < settings.PROFILING_CPROFILE_RATE:
+            profiler = cProfile.Profile()
+        try:
+            with connection.execute_wrapper(profile):
+                if profiler:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            self.stop(profile, token, trace_memory)
+
+        if profiler:
+            self.save_profile(profiler, view_name)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        # only look up the user (a database query) if profiling is asked for
+        if not settings.PROFILING_ENABLED and \
+                (PROFILE_HEADER not in request.headers or not await sync_to_async(self.is_enabled)(request)):
+            return await self.get_response(request)
+
+        profile, token, trace_memory = self.start()
+        # the database is only queried from the request's (thread sensitive) thread
+        await sync_to_async(lambda: connection.execute_wrappers.append(profile))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(profile))()
+            self.stop(profile, token, trace_memory)
+        return self.finish(request, response, profile)
+
+    def save_profile(self, profiler, view_name):
+        os.makedirs(settings.PROFILING_CPROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILING_CPROFILE_DIR,
+                            f'{view_name}-{datetime.now().strftime("%Y%m%dT%H%M%S%f")}.prof')
+        profiler.dump_stats(path)
+        return path
+
+    def log_slow_request(self, request, profile):
+        lines = [f'Slow request {request.method} {request.path}: {profile.server_timing()}']
+        for sql, duration in profile.top_queries(settings.PROFILING_TOP_QUERIES):
+            lines.append(f'  {duration * 1000:.1f} ms: {sql}')
+        for sql, count in profile.duplicated_queries().items():
+            lines.append(f'  duplicated {count} times: {sql}')
+        logger.warning('\n'.join(lines))
@@ -0,0 +1,98 @@
+import logging
+import os
+
+import pytest
+from asgiref.sync import async_to_sync
+from core.profiling import (
+    RequestProfile,
+    current_profile,
+    record_ap_manager_call,
+    trace_memory_lock,
+)
+
+
+@pytest.fixture
+def profiling(settings, tmp_path):
+    settings.PROFILING_ENABLED = False
+    settings.PROFILING_TRACE_MEMORY = False
+    settings.PROFILING_SLOW_REQUEST_MS = 0
+    settings.PROFILING_CPROFILE_RATE = 0
+    settings.PROFILING_CPROFILE_DIR = str(tmp_path)
+    return settings
+
+
+def test_request_profile():
+    profile = RequestProfile()
+    profile.queries = [('SELECT 1', 0.001), ('SELECT 2 WHERE id = %s', 0.003), ('SELECT 2 WHERE id = %s', 0.002)]
+    assert profile.duplicated_queries() == {'SELECT 2 WHERE id = %s': 2}
+    assert profile.top_queries(2) == [('SELECT 2 WHERE id = %s', 0.003), ('SELECT 2 WHERE id = %s', 0.002)]
+    assert 'db;dur=6.0;desc="3 queries, 1 duplicated"' in profile.server_timing()
+
+    token = current_profile.set(profile)
+    record_ap_manager_call(0.5)
+    current_profile.reset(token)
+    record_ap_manager_call(0.5)  # no profile: ignored
+    assert profile.ap_manager_calls == 1
+    assert 'ap;dur=500.0;desc="1 AP manager calls"' in profile.server_timing()
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+    def test_disabled(self, profiling, logged_in_user, client):
+        assert 'Server-Timing' not in client.get('/simulations/')
+        # only staff users can enable profiling with the header
+        assert 'Server-Timing' not in client.get('/simulations/', HTTP_X_PROFILE='1')
+
+    def test_enabled(self, profiling, logged_in_user, client, simulation_range):
+        profiling.PROFILING_ENABLED = True
+        profiling.PROFILING_TRACE_MEMORY = True
+        response = client.get('/simulations/')
+        assert response.status_code == 200
+        timing = response['Server-Timing']
+        assert timing.startswith('total;dur=')
+        assert 'db;dur=' in timing and 'ap;dur=' in timing and 'mem;desc="peak' in timing
+
+    def test_memory_traced_once(self, profiling, logged_in_user, client):
+        profiling.PROFILING_ENABLED = True
+        profiling.PROFILING_TRACE_MEMORY = True
+        with trace_memory_lock:  # another request is tracing memory
+            response = client.get('/simulations/')
+        assert 'db;dur=' in response['Server-Timing'] and 'mem;' not in response['Server-Timing']
+        assert 'mem;' in client.get('/simulations/')['Server-Timing']
+
+    def test_staff_header(self, profiling, logged_in_admin, client):
+        assert 'Server-Timing' not in client.get('/simulations/')
+        assert 'db;dur=' in client.get('/simulations/', HTTP_X_PROFILE='1')['Server-Timing']
+
+    def test_slow_request(self, profiling, logged_in_user, client, caplog):
+        profiling.PROFILING_ENABLED = True
+        profiling.PROFILING_SLOW_REQUEST_MS = 0.001
+        profiling.PROFILING_TOP_QUERIES = 1
+        with caplog.at_level(logging.WARNING, logger='core.profiling'):
+            client.get('/simulations/')
+        assert len(caplog.records) == 1
+        message = caplog.records[0].getMessage().split('\n')
+        assert message[0].startswith('Slow request GET /simulations/: total;dur=')
+        assert ' ms: SELECT ' in message[1]
+
+    def test_cprofile(self, profiling, logged_in_user, client, tmp_path):
+        profiling.PROFILING_ENABLED = True
+        profiling.PROFILING_CPROFILE_RATE = 1
+        profiling.PROFILING_CPROFILE_VIEWS = ['SimulationListView']
+        client.get('/simulations/')
+        client.get('/simulations/new')
+        profiles = os.listdir(tmp_path)
+        assert len(profiles) == 1
+        assert profiles[0].startswith('SimulationListView-') and profiles[0].endswith('.prof')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_asgi(self, profiling, user, async_client, simulation_range):
+        profiling.PROFILING_ENABLED = True
+        profiling.PROFILING_TRACE_MEMORY = True
+        async_client.force_login(user)
+        response = async_to_sync(async_client.get)(f'/simulations/{simulation_range.pk}/data')
+        assert response.status_code == 200
+        # queries made in the thread running the view are included
+        assert 'db;dur=' in response['Server-Timing'] and '"0 queries' not in response['Server-Timing']
+        # memory isn't traced for concurrently handled requests
+        assert 'mem;' not in response['Server-Timing']
@@ -3,8 +3,10 @@ import os
 import shutil
 
 import pytest
+from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.http import FileResponse
+from files.models import MediaFile
 
 
 @pytest.mark.django_db
@@ -53,3 +55,143 @@ def test_is_author(logged_in_user, client, simulation_pkdata, tmp_path):
     with open(response_file_path, 'wb') as file:
         file.write(b''.join(response.streaming_content))
     assert filecmp.cmp(pkd_test_dest_file, response_file_path, shallow=False)
+
+
+@pytest.fixture
+def pk_data_file(simulation_pkdata, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    pkd_test_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'sample.tsv')
+    pkd_test_dest_file = os.path.join(settings.MEDIA_ROOT, str(simulation_pkdata.PK_data))
+    shutil.copy(pkd_test_source_file, pkd_test_dest_file)
+    with open(pkd_test_dest_file, 'rb') as file:
+        return file.read()
+
+
+@pytest.mark.django_db
+def test_x_accel_redirect(logged_in_user, client, simulation_pkdata, settings):
+    settings.MEDIA_X_ACCEL_REDIRECT = '/protected_media/'
+    response = client.get(f'/media/{simulation_pkdata.PK_data}')
+    assert response.status_code == 200
+    assert response['X-Accel-Redirect'] == f'/protected_media/{simulation_pkdata.PK_data}'
+    assert response['Content-Disposition'] == f'attachment; filename="{simulation_pkdata.PK_data}"'
+    assert 'Content-Type' not in response
+    assert response.content == b''
+
+
+@pytest.mark.django_db
+def test_x_accel_redirect_quoting(logged_in_user, client, settings):
+    settings.MEDIA_X_ACCEL_REDIRECT = '/protected_media/'
+    MediaFile.objects.create(file_name='pk data/ré#sult?.tsv', author=logged_in_user, source='Simulation',
+                             source_pk=0, original_name='my "pk" data é.tsv')
+    response = client.get('/media/pk data/ré%23sult%3F.tsv')
+    assert response['X-Accel-Redirect'] == '/protected_media/pk%20data/r%C3%A9%23sult%3F.tsv'
+    assert response['Content-Disposition'] == "attachment; filename*=utf-8''my%20%22pk%22%20data%20%C3%A9.tsv"
+
+
+@pytest.mark.django_db
+def test_x_accel_redirect_not_the_author(other_user, client, simulation_pkdata, settings):
+    settings.MEDIA_X_ACCEL_REDIRECT = '/protected_media/'
+    client.login(username=other_user.email, password='password')
+    response = client.get(f'/media/{simulation_pkdata.PK_data}')
+    assert response.status_code == 403
+    assert 'X-Accel-Redirect' not in response
+
+
+@pytest.mark.django_db
+def test_missing_file(logged_in_user, client, simulation_pkdata, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    response = client.get(f'/media/{simulation_pkdata.PK_data}')
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_range(logged_in_user, client, simulation_pkdata, pk_data_file):
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE='bytes=10-19')
+    assert response.status_code == 206
+    assert response['Content-Range'] == f'bytes 10-19/{len(pk_data_file)}'
+    assert response['Content-Length'] == '10'
+    assert b''.join(response.streaming_content) == pk_data_file[10:20]
+
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE='bytes=-5')
+    assert response.status_code == 206
+    assert b''.join(response.streaming_content) == pk_data_file[-5:]
+
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE='bytes=100-')
+    assert response.status_code == 206
+    assert b''.join(response.streaming_content) == pk_data_file[100:]
+
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE=f'bytes={len(pk_data_file)}-')
+    assert response.status_code == 416
+    assert response['Content-Range'] == f'bytes */{len(pk_data_file)}'
+
+    # multiple ranges are not supported, send the whole file
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE='bytes=0-1,5-6')
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == pk_data_file
+
+
+@pytest.mark.django_db
+def test_conditional(logged_in_user, client, simulation_pkdata, pk_data_file):
+    response = client.get(f'/media/{simulation_pkdata.PK_data}')
+    assert response.status_code == 200
+    assert response['Accept-Ranges'] == 'bytes'
+    etag, last_modified = response['ETag'], response['Last-Modified']
+
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == 304
+
+    # range only applies if the file hasn't changed
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE='bytes=0-4', HTTP_IF_RANGE=etag)
+    assert response.status_code == 206
+    response = client.get(f'/media/{simulation_pkdata.PK_data}', HTTP_RANGE='bytes=0-4', HTTP_IF_RANGE='"other"')
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == pk_data_file
+
+
+async def read_async(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_asgi(user, client, async_client, simulation_pkdata, pk_data_file):
+    # under ASGI files are read in a thread, as the response is streamed
+    client.force_login(user)
+    async_client.force_login(user)
+    response = async_to_sync(async_client.get)(f'/media/{simulation_pkdata.PK_data}')
+    assert response.status_code == 200
+    assert response.is_async
+    assert response['Content-Length'] == str(len(pk_data_file))
+    assert response['Content-Disposition'] == f'attachment; filename="{simulation_pkdata.PK_data}"'
+    assert response['Content-Type'] == client.get(f'/media/{simulation_pkdata.PK_data}')['Content-Type']
+    assert async_to_sync(read_async)(response) == pk_data_file
+
+    response = async_to_sync(async_client.get)(f'/media/{simulation_pkdata.PK_data}', headers={'Range': 'bytes=-5'})
+    assert response.status_code == 206
+    assert async_to_sync(read_async)(response) == pk_data_file[-5:]
+
+
+@pytest.mark.django_db
+class TestMetricsView:
+    def test_not_allowed(self, logged_in_user, client, settings):
+        settings.METRICS_TOKEN = ''
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code == 403
+
+    def test_token(self, client, settings, simulation_range):
+        settings.METRICS_TOKEN = 'secret-token'
+        assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong-token').status_code == 403
+        response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret-token')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
+        content = response.content.decode()
+        assert 'simulations{status="NOT_STARTED"} 1.0' in content
+        assert 'simulations{status="SUCCESS"} 0.0' in content
+        assert '# TYPE ap_manager_call_seconds histogram' in content
+        assert '# TYPE simulation_render_seconds histogram' in content
+
+    def test_staff(self, admin_user, client):
+        client.login(username=admin_user.email, password='password')
+        assert client.get('/metrics').status_code == 200
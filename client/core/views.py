@@ -1,27 +1,198 @@
+import mimetypes
 import os
+import re
+from hmac import compare_digest
+from urllib.parse import quote
 
-from braces.views import UserFormKwargsMixin
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import FileResponse
-from django.views.generic.base import RedirectView
-from files.models import CellmlModel
-from simulations.models import Simulation
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+from django.views.generic import View
+from files.models import MediaFile
+from prometheus_client import CONTENT_TYPE_LATEST
 
+from .metrics import collect_metrics
 
-class MediaView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargsMixin, RedirectView):
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(range_header, size):
+    """
+    Parse a (single) HTTP Range header into an inclusive (start, end) tuple.
+    Returns None if the header is missing or not a single byte range and raises ValueError if it can't be satisfied.
+    """
+    match = RANGE_RE.match(range_header.strip()) if range_header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':  # suffix range e.g. bytes=-500 (the last 500 bytes)
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def read_range(file, start, end):
+    """
+    Generator reading bytes start..end (inclusive) from the given file in chunks.
+    """
+    with file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def aread_range(path, start, end):
+    """
+    Async version of read_range (reading in a thread), so that serving a file under ASGI neither blocks the event
+    loop nor loads the whole file in memory (as django does with synchronous iterators).
+    """
+    file = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+    chunks = read_range(file, start, end)
+    try:
+        while (chunk := await sync_to_async(next, thread_sensitive=False)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        chunks.close()
+
+
+async def aiterate(iterator):
+    """
+    Async version of a (synchronous) iterator, advanced in django's sync thread (where sync views run, so that
+    database access works as usual). Under ASGI django consumes synchronous iterators in full before sending them,
+    so this is what makes a large StreamingHttpResponse actually stream.
+    """
+    iterator = iter(iterator)
+    try:
+        while (chunk := await sync_to_async(next)(iterator, None)) is not None:
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def streaming_content(request, iterator):
+    """
+    The content for a StreamingHttpResponse streaming the iterator, under WSGI as well as ASGI.
+    """
+    return aiterate(iterator) if isinstance(request, ASGIRequest) else iterator
+
+
+class AsyncAccessMixin:
+    """
+    Login and access checks for natively async views, as LoginRequiredMixin and UserPassesTestMixin do for sync views.
+    Users who are not logged in are redirected to the login page and test_func (which is run in a thread, as it
+    usually queries the database) decides whether a logged in user is allowed access.
+    """
+    def test_func(self):
+        return True
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        if not await sync_to_async(self.test_func)():
+            raise PermissionDenied()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class MediaView(AsyncAccessMixin, View):
     """
     Serve files only if user has access
     (i.e. they are linked to a predefined CellmlModel or Simulation or CellmlModel they own).
+    When MEDIA_X_ACCEL_REDIRECT is set, the file itself is served by nginx (via X-Accel-Redirect),
+    otherwise files are served by django, supporting (single) byte ranges and conditional requests.
     """
     def test_func(self):
         self.file_name = self.kwargs['file_name']
-        my_cellml_files = CellmlModel.objects.filter(cellml_file=self.file_name, author=self.request.user)
-        public_cellml_files = CellmlModel.objects.filter(cellml_file=self.file_name, predefined=True)
-        my_sim = Simulation.objects.filter(PK_data=self.file_name, author=self.request.user)
-        return my_cellml_files.union(public_cellml_files).exists() or my_sim.exists()
+        self.entry = MediaFile.accessible_entry(self.file_name, self.request.user)
+        return self.entry is not None
 
-    def get(self, request, *args, **kwargs):
-        return FileResponse(open(os.path.join(settings.MEDIA_ROOT, self.file_name), 'rb'),
-                            as_attachment=True, filename=self.file_name)
+    def x_accel_redirect(self):
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_X_ACCEL_REDIRECT + quote(self.file_name)
+        response['Content-Disposition'] = content_disposition_header(True, self.entry.download_name)
+        # let nginx determine the content type from the file
+        del response['Content-Type']
+        return response
 
+    async def get(self, request, *args, **kwargs):
+        if settings.MEDIA_X_ACCEL_REDIRECT:
+            return self.x_accel_redirect()
+        return await sync_to_async(self.serve, thread_sensitive=False)(request)
+
+    def serve(self, request):
+        path = os.path.join(settings.MEDIA_ROOT, self.file_name)
+        if not os.path.isfile(path):
+            raise Http404()
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if not_modified:
+            return not_modified
+
+        byte_range = None
+        if 'HTTP_IF_RANGE' not in request.META or request.META['HTTP_IF_RANGE'] == etag:
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE', ''), stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(self.content(request, path, start, end), status=206,
+                                             content_type='application/octet-stream')
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Disposition'] = content_disposition_header(True, self.entry.download_name)
+        elif isinstance(request, ASGIRequest):
+            # FileResponse only streams files synchronously
+            content_type = mimetypes.guess_type(self.entry.download_name)[0] or 'application/octet-stream'
+            response = StreamingHttpResponse(aread_range(path, 0, stat.st_size - 1), content_type=content_type)
+            response['Content-Length'] = str(stat.st_size)
+            response['Content-Disposition'] = content_disposition_header(True, self.entry.download_name)
+        else:
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=self.entry.download_name)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
+
+    @staticmethod
+    def content(request, path, start, end):
+        if isinstance(request, ASGIRequest):
+            return aread_range(path, start, end)
+        return read_range(open(path, 'rb'), start, end)
+
+
+class MetricsView(View):
+    """
+    Prometheus metrics, for staff users or scrapers presenting METRICS_TOKEN as bearer token.
+    """
+    def get(self, request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        authorization = request.headers.get('Authorization', '')
+        if not (request.user.is_staff or (token and compare_digest(authorization, f'Bearer {token}'))):
+            return HttpResponseForbidden()
+        return HttpResponse(collect_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from files.models import CellmlModel, MediaFile
+from simulations.models import Simulation
+
+
+class Command(BaseCommand):
+    help = ('(Re-)build the index of uploaded media files used to check access to them. '
+            'The index is kept up to date via signals, this is only needed for objects changed in bulk '
+            '(e.g. via queryset updates or raw sql).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int, default=1000, help='Number of index entries to insert at once.')
+
+    def handle(self, *args, **kwargs):
+        entries = [MediaFile(file_name=model.cellml_file.name, author_id=model.author_id,
+                             predefined=model.predefined, source=CellmlModel.__name__, source_pk=model.pk)
+                   for model in CellmlModel.objects.exclude(cellml_file='').iterator()]
+        entries += [MediaFile(file_name=sim.PK_data.name, author_id=sim.author_id,
+                              source=Simulation.__name__, source_pk=sim.pk)
+                    for sim in Simulation.objects.exclude(PK_data='').only('pk', 'author', 'PK_data').iterator()]
+        with transaction.atomic():
+            MediaFile.objects.all().delete()
+            MediaFile.objects.bulk_create(entries, batch_size=kwargs['batch_size'])
+        self.stdout.write(f'Indexed {len(entries)} media files.')
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def index_media_files(apps, schema_editor):
+    CellmlModel = apps.get_model('files', 'CellmlModel')
+    Simulation = apps.get_model('simulations', 'Simulation')
+    MediaFile = apps.get_model('files', 'MediaFile')
+    MediaFile.objects.bulk_create(
+        [MediaFile(file_name=model.cellml_file.name, author_id=model.author_id, predefined=model.predefined,
+                   source='CellmlModel', source_pk=model.pk)
+         for model in CellmlModel.objects.exclude(cellml_file='').iterator()] +
+        [MediaFile(file_name=sim.PK_data.name, author_id=sim.author_id, source='Simulation', source_pk=sim.pk)
+         for sim in Simulation.objects.exclude(PK_data='').iterator()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_fix_0005_auto'),
+        ('simulations', '0007_rename_stdout_simulation_stdout'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(db_index=True, max_length=255)),
+                ('predefined', models.BooleanField(default=False)),
+                ('source', models.CharField(help_text='The model the file belongs to e.g. <em>CellmlModel</em>.', max_length=255)),
+                ('source_pk', models.BigIntegerField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('source', 'source_pk')},
+            },
+        ),
+        migrations.RunPython(index_media_files, migrations.RunPython.noop),
+    ]
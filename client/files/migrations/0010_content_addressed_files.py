@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:01
+
+import files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_mediafile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cellmlmodel',
+            name='cellml_file',
+            field=models.FileField(blank=True, help_text='Please upload the cellml file here. Please note: the cellml file is expected to be annotated.', storage=files.storage.blob_storage, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafile',
+            name='original_name',
+            field=models.CharField(blank=True, help_text='The name the file was uploaded with (if known).', max_length=255),
+        ),
+    ]
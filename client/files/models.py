@@ -4,9 +4,11 @@ import re
 import django.db.models.deletion
 import httpx
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.dispatch import receiver
 
+from .storage import blob_storage, lock_blob
+
 
 class AppredictLookupTableManifest(models.Model):
     manifest = models.TextField(default='')
@@ -108,7 +110,7 @@ class CellmlModel(models.Model):
                   "combianed with uploading a cellml file."
     )
 
-    cellml_file = models.FileField(blank=True, upload_to="",
+    cellml_file = models.FileField(blank=True, upload_to="", storage=blob_storage,
                                    help_text="Please upload the cellml file here. Please note: the cellml file is "
                                              "expected to be annotated.")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -124,16 +126,148 @@ class CellmlModel(models.Model):
     def __str__(self):
         return self.name + (" " + self.version if self.version else '') + " (" + str(self.year) + ")"
 
+    def save(self, *args, **kwargs):
+        if uploaded_name(self.cellml_file):
+            # a new upload stays locked until it is in the media file index, so that it can't be released in between
+            with transaction.atomic(savepoint=False):
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+    @property
+    def cellml_file_name(self):
+        return MediaFile.display_name(self, self.cellml_file)
+
+
+class MediaFile(models.Model):
+    """
+    Index of uploaded (media) files, mapping the stored file name to its owner and visibility.
+    Maintained via signals on models with uploaded files and used to check access to media files.
+    """
+    file_name = models.CharField(max_length=255, db_index=True)
+    author = models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)
+    predefined = models.BooleanField(default=False)
+    source = models.CharField(max_length=255, help_text="The model the file belongs to e.g. <em>CellmlModel</em>.")
+    source_pk = models.BigIntegerField()
+    original_name = models.CharField(max_length=255, blank=True,
+                                     help_text="The name the file was uploaded with (if known).")
+
+    class Meta:
+        unique_together = ('source', 'source_pk')
+
+    def __str__(self):
+        return self.file_name
+
+    @classmethod
+    def update_index(cls, instance, file, predefined=False, original_name=None):
+        """
+        Add, update or remove (if there is no longer a file) the index entry for the given object.
+        Without an `original_name` the entry keeps its original name, or takes that of another entry for the same file
+        (e.g. for a simulation sharing the PK data of its template).
+        """
+        source = type(instance).__name__
+        if file:
+            defaults = {'file_name': file.name, 'author_id': instance.author_id, 'predefined': predefined}
+            if original_name:
+                defaults['original_name'] = original_name
+            entry, _ = cls.objects.update_or_create(source=source, source_pk=instance.pk, defaults=defaults)
+            if not entry.original_name:
+                entry.original_name = cls.objects.filter(file_name=file.name).exclude(original_name='')\
+                    .values_list('original_name', flat=True).first() or ''
+                if entry.original_name:
+                    entry.save(update_fields=['original_name'])
+        else:
+            cls.remove_from_index(instance)
+
+    @classmethod
+    def remove_from_index(cls, instance):
+        cls.objects.filter(source=type(instance).__name__, source_pk=instance.pk).delete()
+
+    @classmethod
+    def release(cls, instance, file):
+        """
+        Deletes the file from storage, unless other objects still refer to it.
+        (Uploaded files are content addressed, so identical uploads share a single stored file.)
+        The file is locked while checking, so that it isn't deleted while an identical upload is being saved.
+        """
+        if not file:
+            return
+        with transaction.atomic():
+            lock_blob(file.name)
+            if not cls.objects.filter(file_name=file.name)\
+                    .exclude(source=type(instance).__name__, source_pk=instance.pk).exists():
+                file.storage.delete(file.name)
+
+    @classmethod
+    def has_access(cls, file_name, user):
+        """
+        Whether the user can access the file: it is linked to a predefined object or an object they own.
+        """
+        return cls.objects.filter(models.Q(author=user) | models.Q(predefined=True), file_name=file_name).exists()
+
+    @classmethod
+    def accessible_entry(cls, file_name, user):
+        """
+        The index entry giving the user access to the file (preferring their own), or None if they have no access.
+        """
+        return cls.objects.filter(models.Q(author=user) | models.Q(predefined=True), file_name=file_name)\
+            .order_by(models.Case(models.When(author=user, then=0), default=1)).first()
+
+    @property
+    def download_name(self):
+        """
+        The name to show (and download) the file as: the name it was uploaded with, or else its stored name.
+        """
+        return self.original_name or os.path.basename(self.file_name)
+
+    @classmethod
+    def display_name(cls, instance, file):
+        """
+        The name to show the given object's file as (see download_name).
+        """
+        entry = cls.objects.filter(source=type(instance).__name__, source_pk=instance.pk, file_name=file.name).first()
+        return entry.download_name if entry else os.path.basename(file.name)
+
+
+def uploaded_name(file):
+    """
+    The name of a new upload (before it is stored under its content address), or None if the file is already stored.
+    """
+    return os.path.basename(file.name) if file and not file._committed else None
+
+
+@receiver(models.signals.post_save, sender=CellmlModel)
+def update_media_index(sender, instance, **kwargs):
+    """
+    Updates the media file index when a `CellmlModel` object is saved.
+    """
+    MediaFile.update_index(instance, instance.cellml_file, predefined=instance.predefined,
+                           original_name=getattr(instance, '_uploaded_name', None))
+
+
+@receiver(models.signals.post_delete, sender=CellmlModel)
+def remove_from_media_index(sender, instance, **kwargs):
+    """
+    Removes the file from the media file index when the corresponding `CellmlModel` object is deleted.
+    """
+    MediaFile.remove_from_index(instance)
+
 
 @receiver(models.signals.post_delete, sender=CellmlModel)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
     """
     Deletes file from filesystem
-    when corresponding `CellmlModel` object is deleted.
+    when corresponding `CellmlModel` object is deleted
+    (and no other objects refer to it).
     """
-    if instance.cellml_file:
-        if os.path.isfile(instance.cellml_file.path):
-            os.remove(instance.cellml_file.path)
+    MediaFile.release(instance, instance.cellml_file)
+
+
+@receiver(models.signals.pre_save, sender=CellmlModel)
+def remember_uploaded_name(sender, instance, **kwargs):
+    """
+    Remembers the name of a newly uploaded cellml file, which is stored under its content address.
+    """
+    instance._uploaded_name = uploaded_name(instance.cellml_file)
 
 
 @receiver(models.signals.pre_save, sender=CellmlModel)
@@ -141,11 +275,10 @@ def auto_delete_file_on_change(sender, instance, **kwargs):
     """
     Deletes old file from filesystem
     when corresponding `CellmlModel` object is updated
-    with new file.
+    with new file (and no other objects refer to it).
     """
-    if instance.pk:
-        old_file = CellmlModel.objects.get(pk=instance.pk).cellml_file
-        if old_file and (not instance.cellml_file or old_file.path != instance.cellml_file.path):
-            if os.path.isfile(old_file.path):
-                os.remove(old_file.path)
-
+    old_model = CellmlModel.objects.filter(pk=instance.pk).first() if instance.pk else None
+    if old_model:
+        old_file = old_model.cellml_file
+        if old_file and (not instance.cellml_file or old_file.name != instance.cellml_file.name):
+            MediaFile.release(instance, old_file)
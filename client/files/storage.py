@@ -0,0 +1,73 @@
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import connection
+
+
+BLOB_DIR = 'blobs'
+BLOCK_SIZE = 1024 * 1024
+
+
+def sha256_file(file):
+    """
+    SHA-256 (hex digest) of the content of a (binary) file, read in blocks.
+    """
+    sha = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+        sha.update(block)
+    file.seek(0)
+    return sha.hexdigest()
+
+
+def lock_blob(name):
+    """
+    Locks the stored file `name` until the end of the current transaction (it isn't locked outside of one), so that
+    storing the file and recording the reference to it can't interleave with releasing it (see MediaFile.release).
+    """
+    if connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))', [name])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage keeping a single copy of identical files.
+    Files are stored under the SHA-256 of their content (blobs/<ab>/<sha256><ext>), so saving a file that is already
+    stored just returns the existing name. As files can be shared, they should only be deleted when no longer
+    referenced (see MediaFile.release), and objects should be saved in a transaction, so that the stored file stays
+    locked until it is referenced (see lock_blob).
+    """
+    def get_available_name(self, name, max_length=None):
+        return name  # names are determined by the content in _save
+
+    @staticmethod
+    def content_hash(name):
+        """
+        The SHA-256 of the content of a stored file (from its name), or None for files not stored by content.
+        """
+        base = os.path.splitext(os.path.basename(name))[0]
+        if name.startswith(BLOB_DIR + '/') and len(base) == 64:
+            return base
+        return None
+
+    def _save(self, name, content):
+        sha = sha256_file(content)
+        name = f'{BLOB_DIR}/{sha[:2]}/{sha}{os.path.splitext(name)[1].lower()}'
+        lock_blob(name)
+        if not self.exists(name):
+            # write under a unique name first and move into place, so a blob is either complete or not there at all
+            tmp_name = super()._save(f'{BLOB_DIR}/tmp/{uuid.uuid4()}', content)
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+
+def blob_storage():
+    """
+    Storage for uploaded files (cellml files and PK data), the `blobs` alias in STORAGES if configured.
+    """
+    return storages['blobs'] if 'blobs' in settings.STORAGES else ContentAddressedStorage()
@@ -0,0 +1,22 @@
+import pytest
+from django.core.management import call_command
+from files.models import MediaFile
+
+
+@pytest.mark.django_db
+def test_index_media_files(user, other_user, cellml_model_recipe, simulation_pkdata, o_hara_model, capsys):
+    cellml_model_recipe.make(author=other_user, predefined=False, cellml_file='other_model.cellml')
+    cellml_model_recipe.make(author=user, predefined=True, cellml_file='predef_model.cellml')
+    indexed = set(MediaFile.objects.values_list('file_name', 'author', 'predefined', 'source', 'source_pk'))
+    assert len(indexed) == 3
+
+    # index out of sync (e.g. after bulk updates)
+    MediaFile.objects.all().delete()
+    assert not MediaFile.has_access(str(simulation_pkdata.PK_data), user)
+
+    call_command('index_media_files')
+    assert 'Indexed 3 media files.' in capsys.readouterr().out
+    assert set(MediaFile.objects.values_list('file_name', 'author', 'predefined', 'source', 'source_pk')) == indexed
+    assert MediaFile.has_access(str(simulation_pkdata.PK_data), user)
+    assert MediaFile.has_access('predef_model.cellml', other_user)
+    assert not MediaFile.has_access('other_model.cellml', user)
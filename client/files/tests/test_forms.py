@@ -7,6 +7,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import TemporaryUploadedFile
 from files.forms import CellmlModelForm
 from files.models import CellmlModel, IonCurrent
+from files.storage import ContentAddressedStorage, sha256_file
 
 
 @pytest.mark.django_db
@@ -113,14 +114,15 @@ class TestCellmlModelForm:
 
         # file upload
         assert not CellmlModel.objects.filter(name="O'Hara-Rudy-CiPA").exists()
-        assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(file1)))
-        assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(file1)))
         form = CellmlModelForm(data, {'cellml_file': file1}, user=admin_user)
         assert form.is_valid()
         model = form.save()
-        assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(file1)))
+        file1_path = model.cellml_file.path
+        assert os.path.isfile(file1_path)
         assert model == CellmlModel.objects.get(name="O'Hara-Rudy-CiPA")
-        assert model.cellml_file == str(file1)
+        # stored by content
+        with open(file1_path, 'rb') as file:
+            assert ContentAddressedStorage.content_hash(model.cellml_file.name) == sha256_file(file)
         # check ion currents are automatically assigned
         assert list(model.ion_currents.all()) == list(IonCurrent.objects.all())
         assert [str(c) for c in IonCurrent.objects.all()] == ['IKr (herg)', 'INa', 'ICaL', 'IKs', 'IK1', 'Ito', 'INaL']
@@ -129,14 +131,14 @@ class TestCellmlModelForm:
         form = CellmlModelForm(data, {'cellml_file': file2}, instance=model, user=admin_user)
         assert form.is_valid()
         form.save()
-        assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(file1)))
-        assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(file2)))
-        assert model.cellml_file == str(file2)
+        assert not os.path.isfile(file1_path)
+        assert os.path.isfile(model.cellml_file.path)
+        assert model.cellml_file.path != file1_path
         # check ion currents are automatically assigned
         assert list(model.ion_currents.all()) == list(IonCurrent.objects.all())
 
         model.delete()
-        assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(file2)))
+        assert not os.path.isfile(model.cellml_file.path)
 
     def test_both_call_and_file(self, o_hara_model, data, file1, admin_user, httpx_mock, manifest_contents):
         # mock getting manifest file from cardiac server
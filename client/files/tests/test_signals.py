@@ -1,10 +1,13 @@
 import os
 import shutil
+import threading
 import uuid
 
 import pytest
 from django.conf import settings
-from files.models import CellmlModel
+from django.core.files import File
+from django.db import connection, transaction
+from files.models import CellmlModel, MediaFile
 
 
 @pytest.mark.django_db
@@ -49,3 +52,105 @@ def test_CellmlModel_file(user):
     not CellmlModel.objects.filter(name="O'Hara-Rudy-CiPA").exists()
     assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, cellml_file2))
 
+
+@pytest.mark.django_db
+def test_media_file_index(user, other_user, cellml_model_recipe, simulation_pkdata):
+    model = cellml_model_recipe.make(author=user, predefined=False, cellml_file='my_model.cellml')
+    assert MediaFile.has_access('my_model.cellml', user)
+    assert not MediaFile.has_access('my_model.cellml', other_user)
+
+    # predefined models are visible to everyone
+    model.predefined = True
+    model.save()
+    assert MediaFile.has_access('my_model.cellml', other_user)
+
+    # file changed
+    model.cellml_file = 'my_other_model.cellml'
+    model.save()
+    assert not MediaFile.has_access('my_model.cellml', user)
+    assert MediaFile.has_access('my_other_model.cellml', user)
+
+    # file removed
+    model.cellml_file = None
+    model.save()
+    assert not MediaFile.objects.filter(source='CellmlModel').exists()
+
+    # simulation pk data
+    assert MediaFile.has_access(str(simulation_pkdata.PK_data), user)
+    assert not MediaFile.has_access(str(simulation_pkdata.PK_data), other_user)
+    simulation_pkdata.delete()
+    assert not MediaFile.has_access(str(simulation_pkdata.PK_data), user)
+    assert not MediaFile.objects.exists()
+
+
+@pytest.mark.django_db
+def test_shared_file(user, other_user, cellml_model_recipe):
+    test_file = os.path.join(settings.BASE_DIR, 'files', 'tests', 'ohara_rudy_2011_epi.cellml')
+    models = []
+    for author in (user, other_user):
+        with open(test_file, 'rb') as file:
+            models.append(cellml_model_recipe.make(author=author, predefined=False,
+                                                   cellml_file=File(file, name='ohara_rudy_2011_epi.cellml')))
+    # identical uploads are stored once
+    assert models[0].cellml_file.name == models[1].cellml_file.name
+    assert models[0].cellml_file.name.startswith('blobs/')
+    path = models[0].cellml_file.path
+    assert os.path.isfile(path)
+    assert MediaFile.has_access(models[0].cellml_file.name, other_user)
+
+    # the file is only deleted with its last reference
+    models[0].delete()
+    assert os.path.isfile(path)
+    models[1].delete()
+    assert not os.path.isfile(path)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_release_during_upload(user, other_user, cellml_model_recipe):
+    test_file = os.path.join(settings.BASE_DIR, 'files', 'tests', 'ohara_rudy_2011_epi.cellml')
+    with open(test_file, 'rb') as file:
+        model = cellml_model_recipe.make(author=user, predefined=False,
+                                         cellml_file=File(file, name='ohara_rudy_2011_epi.cellml'))
+    path = model.cellml_file.path
+
+    def delete():
+        try:
+            model.delete()
+        finally:
+            connection.close()
+
+    # the last reference is deleted while an identical file is uploaded (and not yet in the media file index)
+    thread = threading.Thread(target=delete)
+    with transaction.atomic():
+        with open(test_file, 'rb') as file:
+            upload = cellml_model_recipe.make(author=other_user, predefined=False,
+                                              cellml_file=File(file, name='ohara_rudy_2011_epi.cellml'))
+        thread.start()
+        thread.join(timeout=1)
+        assert thread.is_alive()  # waiting for the upload to be saved
+    thread.join()
+    assert not CellmlModel.objects.filter(pk=model.pk).exists()
+    assert upload.cellml_file.name == model.cellml_file.name
+    assert os.path.isfile(path)
+
+
+@pytest.mark.django_db
+def test_original_name(user, other_user, client, settings, tmp_path, cellml_model_recipe):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.MEDIA_X_ACCEL_REDIRECT = ''
+    test_file = os.path.join(settings.BASE_DIR, 'files', 'tests', 'ohara_rudy_2011_epi.cellml')
+    models = []
+    for author, name in ((user, 'ohara_rudy_2011_epi.cellml'), (other_user, 'my_ohara.cellml')):
+        with open(test_file, 'rb') as file:
+            models.append(cellml_model_recipe.make(author=author, predefined=False, cellml_file=File(file, name=name)))
+    assert models[0].cellml_file.name == models[1].cellml_file.name
+    assert [model.cellml_file_name for model in models] == ['ohara_rudy_2011_epi.cellml', 'my_ohara.cellml']
+
+    # the original name is kept when saving without a new upload
+    models[1].save()
+    assert models[1].cellml_file_name == 'my_ohara.cellml'
+
+    # and downloads use the name the user uploaded the file as
+    client.login(username=other_user.email, password='password')
+    response = client.get(f'/media/{models[1].cellml_file.name}')
+    assert response['Content-Disposition'] == 'attachment; filename="my_ohara.cellml"'
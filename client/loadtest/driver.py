@@ -0,0 +1,199 @@
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from html.parser import HTMLParser
+from statistics import quantiles
+
+import httpx
+
+
+RESULT_URL_RE = re.compile(r'/simulations/(\d+)/result$')
+
+
+class FormParser(HTMLParser):
+    """
+    Collects the field values of the (first) post form in a page, as a browser would submit them.
+    """
+    def __init__(self):
+        super().__init__()
+        self.fields = []
+        self.in_form = self.done = False
+        self.select = self.textarea = None
+        self.select_value = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and not self.done and attrs.get('method', '').lower() == 'post':
+            self.in_form = True
+        if not self.in_form or 'disabled' in attrs:
+            return
+        name = attrs.get('name')
+        if tag == 'input' and name and attrs.get('type', 'text').lower() not in ('submit', 'button', 'file'):
+            if attrs.get('type', 'text').lower() not in ('checkbox', 'radio') or 'checked' in attrs:
+                self.fields.append((name, attrs.get('value') or ('on' if attrs.get('type') == 'checkbox' else '')))
+        elif tag == 'select' and name:
+            self.select, self.select_value = name, None
+        elif tag == 'option' and self.select:
+            if self.select_value is None or 'selected' in attrs:
+                self.select_value = attrs.get('value', '')
+        elif tag == 'textarea' and name:
+            self.textarea = [name, '']
+
+    def handle_data(self, data):
+        if self.textarea:
+            self.textarea[1] += data
+
+    def handle_endtag(self, tag):
+        if not self.in_form:
+            return
+        if tag == 'select' and self.select:
+            self.fields.append((self.select, self.select_value or ''))
+            self.select = None
+        elif tag == 'textarea' and self.textarea:
+            self.fields.append(tuple(self.textarea))
+            self.textarea = None
+        elif tag == 'form':
+            self.in_form, self.done = False, True
+
+
+def form_fields(html):
+    parser = FormParser()
+    parser.feed(html)
+    return parser.fields
+
+
+class Stats:
+    """
+    Thread safe collection of response times and errors, per page / endpoint.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, duration, ok):
+        with self.lock:
+            self.times[name].append(duration)
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, elapsed):
+        """
+        Per endpoint: number of requests, errors, throughput (per second) and response time percentiles (ms).
+        """
+        rows = []
+        for name, times in sorted(self.times.items()):
+            pct = quantiles(times, n=100, method='inclusive') if len(times) > 1 else times * 99
+            rows.append({'name': name, 'requests': len(times), 'errors': self.errors[name],
+                         'throughput': len(times) / elapsed, 'p50': pct[49] * 1000, 'p95': pct[94] * 1000,
+                         'p99': pct[98] * 1000, 'max': max(times) * 1000})
+        return rows
+
+
+class VirtualUser:
+    """
+    A user browsing the site: polling the simulation list (and the status of their simulations, as the page does),
+    looking at results and (sometimes) submitting new simulations, copied from one of their existing simulations.
+    """
+    def __init__(self, load_test, email, password, simulation_pks):
+        self.load_test = load_test
+        self.email = email
+        self.password = password
+        self.simulation_pks = list(simulation_pks)
+        self.random = random.Random(email)
+        self.client = httpx.Client(base_url=load_test.base_url, transport=load_test.transport, timeout=None,
+                                   follow_redirects=False)
+
+    def request(self, name, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.load_test.stats.record(name, time.perf_counter() - start, False)
+            return None
+        self.load_test.stats.record(name, time.perf_counter() - start, response.status_code < 400)
+        # keep the csrf cookie (which is marked secure) when testing over plain http
+        if 'csrftoken' in response.cookies:
+            token = response.cookies['csrftoken']
+            self.client.cookies.delete('csrftoken')
+            self.client.cookies.set('csrftoken', token)
+        return response
+
+    def post_form(self, name, url, fields, **data):
+        form = defaultdict(list)
+        for key, value in fields:
+            form[key].append(value)
+        form.update({key: [value] for key, value in data.items()})
+        return self.request(name, 'POST', url, data=form,
+                            headers={'X-CSRFToken': self.client.cookies.get('csrftoken', ''), 'Referer': str(url)})
+
+    def login(self):
+        # as in a browser, visiting a page redirects to the login page (which redirects back after logging in)
+        response = self.request('list', 'GET', '/simulations/')
+        if response is None or response.status_code != 302:
+            return False
+        login_url = response.url.join(response.headers['Location'])
+        page = self.request('login page', 'GET', login_url)
+        response = self.post_form('login', login_url, form_fields(page.text),
+                                  username=self.email, password=self.password)
+        return response is not None and response.status_code == 302
+
+    def submit(self):
+        url = f'/simulations/{self.random.choice(self.simulation_pks)}/template'
+        page = self.request('template page', 'GET', url)
+        if page is None or page.status_code != 200:
+            return
+        response = self.post_form('submit', url, form_fields(page.text),
+                                  title=f'load test {self.email} {time.time_ns()}')
+        if response is not None and response.status_code == 302:
+            match = RESULT_URL_RE.search(response.headers['Location'])
+            if match:
+                self.simulation_pks.append(int(match[1]))
+
+    def step(self):
+        self.request('list', 'GET', '/simulations/')
+        if self.simulation_pks:
+            self.request('status', 'GET', f"/simulations/status/false/{'/'.join(map(str, self.simulation_pks))}")
+            if self.random.random() < self.load_test.result_rate:
+                pk = self.random.choice(self.simulation_pks)
+                self.request('result', 'GET', f'/simulations/{pk}/result')
+                self.request('data', 'GET', f'/simulations/{pk}/data')
+            if self.random.random() < self.load_test.submit_rate:
+                self.submit()
+
+    def run(self, until):
+        with self.client:
+            if not self.login():
+                self.load_test.stats.record('login failed', 0, False)
+                return
+            while time.monotonic() < until:
+                self.step()
+                time.sleep(self.random.expovariate(1 / self.load_test.think_time) if self.load_test.think_time else 0)
+
+
+class LoadTest:
+    """
+    Runs a number of virtual users (each in a thread) against a running instance of the site for a given duration.
+    """
+    def __init__(self, base_url, users, duration=60, think_time=5, result_rate=0.2, submit_rate=0.05,
+                 transport=None):
+        self.base_url = base_url
+        self.users = users  # (email, password, simulation pks)
+        self.duration = duration
+        self.think_time = think_time
+        self.result_rate = result_rate
+        self.submit_rate = submit_rate
+        self.transport = transport
+        self.stats = Stats()
+
+    def run(self):
+        start = time.monotonic()
+        until = start + self.duration
+        threads = [threading.Thread(target=VirtualUser(self, *user).run, args=(until,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.stats.summary(time.monotonic() - start)
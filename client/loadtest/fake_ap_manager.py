@@ -0,0 +1,129 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from simulations import synthetic
+
+
+COLLECTION_RE = re.compile(r'^/api/collection/(?P<id>[^/]+)/(?P<command>[^/]+)/?$')
+RESULT_COMMANDS = ('q_net', 'voltage_traces', 'voltage_results', 'pkpd_results', 'messages')
+STDOUT = ('Fake AP manager\n'
+          'ApPredict args : --pacing-freq 1 --pacing-max-time 5 (fake)\n')
+
+
+class FakeAPManager:
+    """
+    Stand-in for the AP manager, for load testing without running ApPredict.
+    Simulations progress through a timeline of progress messages over run_time seconds, after which the (synthetic)
+    results of the configured size are returned. A fraction of the submissions (failure_rate) fails half way through
+    and a fraction of all calls (error_rate) returns an api error.
+    """
+    def __init__(self, run_time=30, progress_steps=10, failure_rate=0, error_rate=0, concentration_count=20,
+                 trace_length=1000, timepoints=100, seed=None):
+        self.run_time = run_time
+        self.progress = (['Initialising..'] + [f'{round(100 * i / progress_steps)}% completed'
+                                               for i in range(progress_steps + 1)] + ['..done!'])
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.runs = {}
+        self.lock = threading.Lock()
+        results = synthetic.simulation_results(concentration_count=concentration_count, trace_length=trace_length,
+                                               timepoints=timepoints)
+        # results are encoded once, so that large payloads are cheap to serve
+        self.results = {command: self.encode({'success': result}) for command, result in results.items()}
+        self.no_pkpd_results = self.encode({'success': []})
+
+    @staticmethod
+    def encode(data):
+        return json.dumps(data).encode('utf-8')
+
+    def submit(self, body):
+        if self.random.random() < self.failure_rate:
+            fail_at = self.run_time / 2
+        else:
+            fail_at = None
+        run_id = str(uuid.uuid4())
+        with self.lock:
+            self.runs[run_id] = {'started': time.monotonic(), 'fail_at': fail_at, 'pk_data': b'PK_data_file' in body}
+        return {'success': {'id': run_id}}
+
+    def elapsed(self, run):
+        return time.monotonic() - run['started']
+
+    def finished(self, run):
+        return run['fail_at'] is None and self.elapsed(run) >= self.run_time
+
+    def progress_status(self, run):
+        if run['fail_at'] is not None and self.elapsed(run) >= run['fail_at']:
+            return {'error': 'Simulation failed (fake AP manager failure injection).'}
+        fraction = min(self.elapsed(run) / self.run_time, 1) if self.run_time else 1
+        step = int(fraction * (len(self.progress) - 1))
+        return {'success': self.progress[:step + 1] + ['']}
+
+    def handle(self, method, path, body=b''):
+        """
+        Handle a request, returning the (http) status and the (json encoded) response body.
+        """
+        match = COLLECTION_RE.match(path.split('?')[0])
+        if method == 'POST':
+            return 200, self.encode(self.submit(body))
+        if method != 'GET' or not match:
+            return 404, self.encode({'error': f'Unknown endpoint {path}'})
+        with self.lock:
+            run = self.runs.get(match['id'])
+        command = match['command']
+        if run is None:
+            return 200, self.encode({'error': f"Unknown simulation {match['id']}"})
+        if self.random.random() < self.error_rate:
+            return 200, self.encode({'error': f'Random error (fake AP manager error injection) for {command}.'})
+
+        if command == 'progress_status':
+            return 200, self.encode(self.progress_status(run))
+        if command == 'STOP':
+            return 200, self.encode({'success': self.finished(run) or run['fail_at'] is not None})
+        if command == 'STDOUT':
+            return 200, self.encode({'content': STDOUT})
+        if command == 'received':  # results are cleaned up
+            run['received'] = True
+            return 200, self.encode({'success': 'received'})
+        if command in RESULT_COMMANDS:
+            if not self.finished(run) or run.get('received'):
+                return 200, self.encode({'error': f'Result {command} not available yet.'})
+            if command == 'pkpd_results' and not run['pk_data']:
+                return 200, self.no_pkpd_results
+            return 200, self.results[command]
+        return 200, self.encode({'error': f'Unknown command {command}'})
+
+
+def make_server(ap_manager, host='localhost', port=8080, latency=0, jitter=0):
+    """
+    A (threaded) http server for the fake AP manager, taking latency +/- jitter seconds to answer each request.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self, method):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            delay = latency + random.uniform(-jitter, jitter)
+            if delay > 0:
+                time.sleep(delay)
+            status, content = ap_manager.handle(method, self.path, body)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            self.respond('GET')
+
+        def do_POST(self):
+            self.respond('POST')
+
+        def log_message(self, format, *args):
+            pass  # don't log every request
+
+    return ThreadingHTTPServer((host, port), Handler)
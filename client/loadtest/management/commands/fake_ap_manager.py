@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from loadtest.fake_ap_manager import FakeAPManager, make_server
+
+
+class Command(BaseCommand):
+    help = ('Run a fake AP manager (for load testing without ApPredict), with configurable latency, progress, '
+            'failures and result sizes. Point AP_PREDICT_ENDPOINT at it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0', help='Address to listen on.')
+        parser.add_argument('--port', type=int, default=8080, help='Port to listen on.')
+        parser.add_argument('--latency', type=float, default=50, help='Response time of each call (ms).')
+        parser.add_argument('--jitter', type=float, default=0, help='Random variation of the latency (+/- ms).')
+        parser.add_argument('--run_time', type=float, default=30,
+                            help='Time (s) a simulation takes from submission until results are available.')
+        parser.add_argument('--progress_steps', type=int, default=10,
+                            help='Number of progress updates (%% completed) during a simulation.')
+        parser.add_argument('--failure_rate', type=float, default=0,
+                            help='Fraction (0-1) of the simulations that fail half way through.')
+        parser.add_argument('--error_rate', type=float, default=0,
+                            help='Fraction (0-1) of all api calls returning an error.')
+        parser.add_argument('--concentrations', type=int, default=20, help='Number of concentrations in results.')
+        parser.add_argument('--trace_length', type=int, default=1000, help='Number of points in each voltage trace.')
+        parser.add_argument('--timepoints', type=int, default=100,
+                            help='Number of PKPD timepoints (for simulations with PK data).')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for failure and error injection.')
+
+    def handle(self, *args, **kwargs):
+        ap_manager = FakeAPManager(run_time=kwargs['run_time'], progress_steps=kwargs['progress_steps'],
+                                   failure_rate=kwargs['failure_rate'], error_rate=kwargs['error_rate'],
+                                   concentration_count=kwargs['concentrations'],
+                                   trace_length=kwargs['trace_length'], timepoints=kwargs['timepoints'],
+                                   seed=kwargs['seed'])
+        server = make_server(ap_manager, kwargs['host'], kwargs['port'], kwargs['latency'] / 1000,
+                             kwargs['jitter'] / 1000)
+        self.stdout.write(f"Fake AP manager listening on http://{kwargs['host']}:{kwargs['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,63 @@
+from accounts.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from files.models import CellmlModel
+from loadtest.driver import LoadTest
+from simulations import synthetic
+from simulations.models import Simulation
+
+
+class Command(BaseCommand):
+    help = ('Load test a running instance of the site: a number of (load test) users poll their simulation list and '
+            'statuses, view results and submit simulations. Reports throughput and response times per page. '
+            'Use together with the fake_ap_manager command.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='URL of the running site, e.g. http://localhost:8000')
+        parser.add_argument('--users', type=int, default=10, help='Number of simultaneous users.')
+        parser.add_argument('--duration', type=float, default=60, help='Duration of the test (s).')
+        parser.add_argument('--think_time', type=float, default=5,
+                            help='Mean time (s) users wait between polling their simulations (as the pages do).')
+        parser.add_argument('--result_rate', type=float, default=0.2,
+                            help='Probability (0-1) of viewing a simulation result (page and graph data) each step.')
+        parser.add_argument('--submit_rate', type=float, default=0.05,
+                            help='Probability (0-1) of submitting a new simulation each step.')
+        parser.add_argument('--password', required=True, help='Password for the load test users (which are created if '
+                                                              'they don\'t exist yet).')
+
+    def setup_users(self, count, password):
+        """
+        Creates the load test users (if they don't exist yet), each with a finished simulation to start from.
+        """
+        model = CellmlModel.objects.filter(predefined=True).first()
+        if model is None:
+            raise CommandError('A predefined cellml model is needed to create simulations.')
+        results = synthetic.simulation_results()
+        users = []
+        for i in range(count):
+            email = f'load-test-{i}@example.com'
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                user = User.objects.create_user(email=email, full_name=f'Load test {i}', institution='load test',
+                                                password=password)
+            if not Simulation.objects.filter(author=user).exists():
+                Simulation.objects.create(author=user, title='load test', model=model,
+                                          ion_current_type=Simulation.IonCurrentType.PIC50,
+                                          ion_units=Simulation.IonCurrentUnits.negLogM,
+                                          status=Simulation.Status.SUCCESS, progress='Completed',
+                                          ap_predict_last_update=timezone.now(), **results)
+            pks = list(Simulation.objects.filter(author=user).values_list('pk', flat=True))
+            users.append((email, password, pks))
+        return users
+
+    def handle(self, *args, **kwargs):
+        users = self.setup_users(kwargs['users'], kwargs['password'])
+        load_test = LoadTest(kwargs['base_url'].rstrip('/'), users, duration=kwargs['duration'],
+                             think_time=kwargs['think_time'], result_rate=kwargs['result_rate'],
+                             submit_rate=kwargs['submit_rate'])
+        summary = load_test.run()
+        self.stdout.write(f"{'':<16}{'requests':>10}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'p99 ms':>9}{'max ms':>9}")
+        for row in summary:
+            self.stdout.write(f"{row['name']:<16}{row['requests']:>10}{row['errors']:>8}{row['throughput']:>8.2f}"
+                              f"{row['p50']:>9.0f}{row['p95']:>9.0f}{row['p99']:>9.0f}{row['max']:>9.0f}")
@@ -0,0 +1,16 @@
+import pytest
+from django.conf import settings
+from django.core.management import CommandError, call_command
+
+
+def test_not_installed_in_production():
+    # the load test commands create users, so are only available in development
+    assert 'loadtest' not in settings.INSTALLED_APPS
+    with pytest.raises(CommandError, match='Unknown command'):
+        call_command('load_test', 'http://localhost:8000', '--password', 'secret')
+
+
+def test_password_required(settings):
+    settings.INSTALLED_APPS = settings.INSTALLED_APPS + ['loadtest']
+    with pytest.raises(CommandError, match='--password'):
+        call_command('load_test', 'http://localhost:8000')
@@ -0,0 +1,76 @@
+import httpx
+import pytest
+from django.core.signals import request_finished, request_started
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+from loadtest.driver import (
+    LoadTest,
+    Stats,
+    VirtualUser,
+    form_fields,
+)
+from simulations.models import Simulation
+
+
+def test_form_fields():
+    html = '''<form method="get"><input name="q" value="search"></form>
+              <form method="POST" action="">
+                <input type="hidden" name="csrfmiddlewaretoken" value="token">
+                <input type="text" name="title" value="my title"><input type="number" name="empty">
+                <input type="checkbox" name="log_scale" checked><input type="checkbox" name="unchecked" value="1">
+                <input type="radio" name="pk_or_concs" value="points">
+                <input type="radio" name="pk_or_concs" value="range" checked>
+                <select name="model"><option value="">---</option><option value="3" selected>model</option></select>
+                <select name="units"><option value="M">M</option><option value="µM">µM</option></select>
+                <textarea name="notes">some notes</textarea>
+                <input type="file" name="PK_data"><input type="submit" name="save" value="Save">
+              </form>
+              <form method="post"><input name="other" value="x"></form>'''
+    assert form_fields(html) == [('csrfmiddlewaretoken', 'token'), ('title', 'my title'), ('empty', ''),
+                                 ('log_scale', 'on'), ('pk_or_concs', 'range'), ('model', '3'), ('units', 'M'),
+                                 ('notes', 'some notes')]
+
+
+def test_stats():
+    stats = Stats()
+    for i in range(1, 101):
+        stats.record('list', i / 1000, i != 100)
+    stats.record('data', 0.5, True)
+    data, list_ = stats.summary(elapsed=10)
+    assert data == {'name': 'data', 'requests': 1, 'errors': 0, 'throughput': 0.1, 'p50': 500, 'p95': 500,
+                    'p99': 500, 'max': 500}
+    assert list_['requests'] == 100 and list_['errors'] == 1 and list_['throughput'] == 10
+    assert list_['p50'] == pytest.approx(50.5) and list_['p95'] == pytest.approx(95.05)
+    assert list_['max'] == pytest.approx(100)
+
+
+@pytest.fixture
+def wsgi_transport():
+    # run the site in process (like the test client, without closing the test's database connection)
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    yield httpx.WSGITransport(app=get_wsgi_application())
+    request_started.connect(close_old_connections)
+    request_finished.connect(close_old_connections)
+
+
+@pytest.mark.django_db
+def test_virtual_user(fake_ap_manager, wsgi_transport, simulation_range):
+    load_test = LoadTest('http://testserver', [], think_time=0, result_rate=1, submit_rate=1,
+                         transport=wsgi_transport)
+    user = VirtualUser(load_test, simulation_range.author.email, 'password', [simulation_range.pk])
+    assert user.login()
+    user.step()
+    assert len(user.simulation_pks) == 2
+    new_simulation = Simulation.objects.get(pk=user.simulation_pks[1])
+    assert new_simulation.title.startswith('load test')
+    assert new_simulation.status == Simulation.Status.INITIALISING
+    assert new_simulation.model == simulation_range.model
+
+    assert sorted(load_test.stats.times) == ['data', 'list', 'login', 'login page', 'result', 'status', 'submit',
+                                             'template page']
+    assert not load_test.stats.errors
+
+    user.step()  # polls the status of both simulations
+    new_simulation.refresh_from_db()
+    assert new_simulation.status == Simulation.Status.SUCCESS, new_simulation.api_errors
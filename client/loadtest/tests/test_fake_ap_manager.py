@@ -0,0 +1,74 @@
+import json
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from loadtest.fake_ap_manager import FakeAPManager
+from simulations import views
+from simulations.models import Simulation
+
+
+def call(ap_manager, path, method='GET', body=b''):
+    status, content = ap_manager.handle(method, path, body)
+    return status, json.loads(content)
+
+
+def test_progress():
+    ap_manager = FakeAPManager(run_time=1000, progress_steps=4)
+    status, response = call(ap_manager, '/', 'POST', b'{}')
+    assert status == 200
+    run_id = response['success']['id']
+    assert call(ap_manager, f'/api/collection/{run_id}/progress_status')[1] == {'success': ['Initialising..', '']}
+    assert call(ap_manager, f'/api/collection/{run_id}/STOP')[1] == {'success': False}
+    assert 'error' in call(ap_manager, f'/api/collection/{run_id}/voltage_traces')[1]
+
+    ap_manager.runs[run_id]['started'] -= 500
+    assert call(ap_manager, f'/api/collection/{run_id}/progress_status')[1] == \
+        {'success': ['Initialising..', '0% completed', '25% completed', '50% completed', '']}
+
+    ap_manager.runs[run_id]['started'] -= 500
+    assert call(ap_manager, f'/api/collection/{run_id}/progress_status')[1]['success'][-2] == '..done!'
+    assert call(ap_manager, f'/api/collection/{run_id}/STOP')[1] == {'success': True}
+    assert len(call(ap_manager, f'/api/collection/{run_id}/voltage_traces')[1]['success']) == 20
+    assert call(ap_manager, f'/api/collection/{run_id}/pkpd_results')[1] == {'success': []}
+    assert 'ApPredict args' in call(ap_manager, f'/api/collection/{run_id}/STDOUT')[1]['content']
+    assert call(ap_manager, f'/api/collection/{run_id}/received')[1] == {'success': 'received'}
+    assert 'error' in call(ap_manager, f'/api/collection/{run_id}/voltage_traces')[1]
+
+
+def test_pk_data():
+    ap_manager = FakeAPManager(run_time=0, timepoints=5)
+    run_id = call(ap_manager, '/', 'POST', b'--boundary\r\nContent-Disposition: form-data; name="PK_data_file"')[1]
+    assert len(call(ap_manager, f"/api/collection/{run_id['success']['id']}/pkpd_results")[1]['success']) == 5
+
+
+def test_failure_injection():
+    ap_manager = FakeAPManager(run_time=0, failure_rate=1)
+    run_id = call(ap_manager, '/', 'POST')[1]['success']['id']
+    assert call(ap_manager, f'/api/collection/{run_id}/progress_status')[1] == \
+        {'error': 'Simulation failed (fake AP manager failure injection).'}
+    assert call(ap_manager, f'/api/collection/{run_id}/STOP')[1] == {'success': True}
+    assert 'error' in call(ap_manager, f'/api/collection/{run_id}/q_net')[1]
+
+    ap_manager = FakeAPManager(run_time=0, error_rate=1)
+    run_id = call(ap_manager, '/', 'POST')[1]['success']['id']
+    assert 'error' in call(ap_manager, f'/api/collection/{run_id}/q_net')[1]
+    assert call(ap_manager, '/api/collection/unknown/q_net')[1] == {'error': 'Unknown simulation unknown'}
+    assert call(ap_manager, '/unknown')[0] == 404
+
+
+@pytest.mark.django_db
+def test_simulation(fake_ap_manager, simulation_range):
+    simulation_range.version_info = None
+    views.start_simulation(simulation_range)
+    assert simulation_range.status == Simulation.Status.INITIALISING
+    assert simulation_range.ap_predict_call_id in fake_ap_manager.runs
+
+    async def update():
+        async with httpx.AsyncClient(timeout=None) as client:
+            await views.StatusSimulationView().update_sim(client, simulation_range)
+
+    async_to_sync(update)()
+    assert simulation_range.status == Simulation.Status.SUCCESS, simulation_range.api_errors
+    assert len(simulation_range.voltage_traces) == 3
+    assert simulation_range.version_info['appredict_args']
@@ -1,8 +1,25 @@
 from django.contrib import admin
 
-from .models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
+from .models import (
+    CompoundConcentrationPoint,
+    Simulation,
+    SimulationIonCurrentParam,
+    SimulationSpreadsheet,
+    SimulationSummary,
+)
 
 
-admin.site.register(Simulation)
+class SimulationAdmin(admin.ModelAdmin):
+    list_display = ('title', 'author', 'status', 'progress', 'priority', 'queued_at', 'started_at')
+    list_filter = ('status',)
+    # admins can move simulations up (or down) the queue
+    list_editable = ('priority',)
+    list_select_related = ('author',)
+    search_fields = ('title', 'author__email')
+
+
+admin.site.register(Simulation, SimulationAdmin)
 admin.site.register(SimulationIonCurrentParam)
 admin.site.register(CompoundConcentrationPoint)
+admin.site.register(SimulationSummary)
+admin.site.register(SimulationSpreadsheet)
@@ -0,0 +1,208 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from datetime import datetime
+
+from django.core import serializers
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from files.storage import sha256_file
+
+from .fields import CompressedJSON
+from .models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
+
+
+BLOCK_SIZE = 1024 * 1024
+CHUNK_DIR = 'chunks'
+MANIFEST_DIR = 'manifests'
+CHECKPOINT = 'checkpoint.json'
+SIMULATION_RECORD_FIELDS = [field.name for field in Simulation._meta.concrete_fields
+                            if field.name not in Simulation.ARCHIVED_FIELDS]
+
+
+class ChunkStore:
+    """
+    Content addressed store of gzip compressed chunks, keyed by the SHA-256 of their (uncompressed) content.
+    Chunks that are already in the store are not written (or compressed) again.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.written = []  # sizes of the (compressed) chunks written
+
+    def path(self, sha):
+        return os.path.join(self.root, CHUNK_DIR, sha[:2], sha + '.gz')
+
+    def _write(self, sha, write):
+        path = self.path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first, so that a chunk is either complete or not there at all
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode='wb', mtime=0) as gz:
+                write(gz)
+        os.replace(tmp.name, path)
+        self.written.append(os.path.getsize(path))
+
+    def put(self, data):
+        sha = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self.path(sha)):
+            self._write(sha, lambda gz: gz.write(data))
+        return sha
+
+    def put_file(self, file):
+        """
+        Stores the content of a (binary) file, reading it in blocks.
+        """
+        sha = sha256_file(file)
+        if not os.path.exists(self.path(sha)):
+            self._write(sha, lambda gz: shutil.copyfileobj(file, gz, BLOCK_SIZE))
+        return sha
+
+    def get(self, sha):
+        with gzip.open(self.path(sha), 'rb') as file:
+            return file.read()
+
+    def open(self, sha):
+        return gzip.open(self.path(sha), 'rb')
+
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                      cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def result_json(sim, field):
+    """
+    The (canonical) json of a result field, avoiding decoding values straight from the database.
+    """
+    value = sim.__dict__[field]
+    if isinstance(value, CompressedJSON):
+        return zlib.decompress(value)
+    return canonical_json(value)
+
+
+def backup_result(store, sim, field):
+    """
+    Stores a result field, returning its hash (or None if the result is NULL, so that it is restored as such).
+    """
+    if sim.__dict__[field] is None:
+        return None
+    return store.put(result_json(sim, field))
+
+
+def simulation_record(sim):
+    """
+    Serialised simulation (without the bulky results) and its ion current parameters and concentration points.
+    """
+    return (serializers.serialize('python', [sim], fields=SIMULATION_RECORD_FIELDS) +
+            serializers.serialize('python', sim.simulationioncurrentparam_set.all()) +
+            serializers.serialize('python', sim.compoundconcentrationpoint_set.all()))
+
+
+def media_fields(obj):
+    return [field.name for field in obj._meta.concrete_fields
+            if field.get_internal_type() == 'FileField' and getattr(obj, field.name)]
+
+
+def manifest_name(created):
+    return created.strftime('%Y%m%dT%H%M%S%fZ') + '.json'
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(path), delete=False) as tmp:
+        json.dump(data, tmp)
+    os.replace(tmp.name, path)
+
+
+def read_checkpoint(root):
+    """
+    The checkpoint (name and creation time of the latest manifest) of the backup in root, if any.
+    """
+    path = os.path.join(root, CHECKPOINT)
+    return read_json(path) if os.path.isfile(path) else None
+
+
+def write_manifest(root, manifest):
+    """
+    Writes the manifest and makes it the checkpoint for the next (incremental) backup.
+    """
+    name = manifest_name(datetime.fromisoformat(manifest['created']))
+    write_json(os.path.join(root, MANIFEST_DIR, name), manifest)
+    write_json(os.path.join(root, CHECKPOINT), {'manifest': name, 'created': manifest['created']})
+    return name
+
+
+def read_manifest(root, name):
+    return read_json(os.path.join(root, MANIFEST_DIR, name))
+
+
+def manifest_chain(root, name):
+    """
+    The manifests up to (and including) the given one, oldest first.
+    """
+    chain = []
+    while name:
+        manifest = read_manifest(root, name)
+        chain.append(manifest)
+        name = manifest['previous']
+    return chain[::-1]
+
+
+def backup_media(store, file):
+    """
+    Stores an uploaded file (if it still exists), returning its hash.
+    """
+    if not file.storage.exists(file.name):
+        return None
+    with file.storage.open(file.name, 'rb') as content:
+        return store.put_file(content)
+
+
+def restore_media(store, obj, field, sha):
+    """
+    Restores an uploaded file under its original name.
+    """
+    file = getattr(obj, field)
+    if file.storage.exists(file.name):
+        with file.storage.open(file.name, 'rb') as existing:
+            if sha256_file(existing) == sha:
+                return  # already there (e.g. a shared, content addressed file)
+        file.storage.delete(file.name)
+    with store.open(sha) as content:
+        name = file.storage.save(file.name, File(content, name=file.name))
+    if name != file.name:
+        setattr(obj, field, name)
+        obj.save(update_fields=[field])
+
+
+def restore_object(store, entry):
+    """
+    Restores a backed up object (a cellml model or a simulation and its ion current parameters and concentration
+    points), including its results and uploaded files.
+    """
+    deserialized = list(serializers.deserialize('python', json.loads(store.get(entry['record']))))
+    obj = deserialized[0].object
+    for field, sha in entry.get('results', {}).items():
+        data = store.get(sha) if sha else None
+        # (earlier backups stored NULL results as json null)
+        setattr(obj, field, CompressedJSON(zlib.compress(data)) if data not in (None, b'null') else None)
+    with transaction.atomic():
+        if isinstance(obj, Simulation):
+            SimulationIonCurrentParam.objects.filter(simulation_id=obj.pk).delete()
+            CompoundConcentrationPoint.objects.filter(simulation_id=obj.pk).delete()
+        for item in deserialized:
+            item.save()
+    for field, sha in entry['media'].items():
+        if sha:
+            restore_media(store, obj, field, sha)
+    return obj
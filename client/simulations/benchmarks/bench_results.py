@@ -0,0 +1,96 @@
+"""
+Benchmarks for processing and exporting the results of (large) simulations.
+These are not part of the test suite, run them with pytest-benchmark (from the client folder):
+    python -m pytest simulations/benchmarks -o python_files='bench_*.py' --benchmark-autosave
+and compare against saved runs (e.g. of the previous commit) with --benchmark-compare.
+"""
+import io
+import json
+
+import httpx
+import pytest
+import xlsxwriter
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import RequestFactory
+from simulations import synthetic
+from simulations.forms import SimulationForm
+from simulations.models import Simulation
+from simulations.views import DataSimulationView, SpreadsheetSimulationView, StatusSimulationView
+
+from .conftest import TIMEPOINTS
+
+
+SHEETS = ('input_values', 'qNet', 'pkpd_results', 'voltage_traces', 'voltage_traces_plot', 'version_info')
+
+
+def get_view(view_class, sim):
+    request = RequestFactory().get('/')
+    request.user = sim.author
+    view = view_class.as_view()
+    if view_class.view_is_async:
+        view = async_to_sync(view)
+    return view(request, pk=sim.pk)
+
+
+@pytest.mark.django_db
+def test_data_view(benchmark, large_simulation):
+    response = benchmark(get_view, DataSimulationView, large_simulation)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_spreadsheet_view(benchmark, large_simulation):
+    response = benchmark(get_view, SpreadsheetSimulationView, large_simulation)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('sheet', SHEETS)
+def test_spreadsheet_sheet(benchmark, large_simulation, sheet):
+    view = SpreadsheetSimulationView()
+
+    def write_sheet():
+        workbook = xlsxwriter.Workbook(io.BytesIO(), {'in_memory': True})
+        getattr(view, sheet)(workbook, workbook.add_format({'bold': True}), large_simulation)
+        workbook.close()
+
+    benchmark(write_sheet)
+
+
+@pytest.mark.django_db
+def test_update_sim(benchmark, large_simulation, large_results):
+    """
+    Ingestion of the results of a finished simulation (including schema validation and saving).
+    """
+    payloads = {command: json.dumps({'success': result}).encode() for command, result in large_results.items()}
+    payloads.update({'progress_status': b'{"success": ["..done!"]}', 'STOP': b'{"success": true}',
+                     'received': b'{"success": true}'})
+
+    def handler(request):
+        return httpx.Response(200, content=payloads[request.url.path.rsplit('/', 1)[1]],
+                              headers={'Content-Type': 'application/json'})
+
+    large_simulation.ap_predict_call_id = 'benchmark'
+    large_simulation.status = Simulation.Status.RUNNING
+
+    async def ingest():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await StatusSimulationView().update_sim(client, large_simulation)
+
+    benchmark(async_to_sync(ingest))
+    assert large_simulation.status == Simulation.Status.SUCCESS
+
+
+@pytest.mark.django_db
+def test_clean_PK_data(benchmark, tmp_path, user):
+    path = tmp_path / 'pk_data.tsv'
+    path.write_text(synthetic.pk_data(TIMEPOINTS))
+    upload = TemporaryUploadedFile('pk_data.tsv', 'text/plain', path.stat().st_size, 'utf-8')
+    upload.file = open(path, 'rb')
+    form = SimulationForm(user=user)
+    form.cleaned_data = {'PK_data': upload}
+
+    result = benchmark.pedantic(form.clean_PK_data, setup=lambda: upload.file.seek(0), rounds=20)
+    assert result == upload
+    upload.file.close()
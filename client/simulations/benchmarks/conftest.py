@@ -0,0 +1,24 @@
+import os
+
+import pytest
+from simulations import synthetic
+
+
+# size of the synthetic simulation, these can be scaled to match production data volumes
+CONCENTRATIONS = int(os.environ.get('BENCHMARK_CONCENTRATIONS', 40))
+TRACE_LENGTH = int(os.environ.get('BENCHMARK_TRACE_LENGTH', 5000))
+TIMEPOINTS = int(os.environ.get('BENCHMARK_TIMEPOINTS', 1000))
+
+
+@pytest.fixture(scope='session')
+def large_results():
+    return synthetic.simulation_results(concentration_count=CONCENTRATIONS, trace_length=TRACE_LENGTH,
+                                        timepoints=TIMEPOINTS)
+
+
+@pytest.fixture
+def large_simulation(simulation_range, large_results):
+    for command, result in large_results.items():
+        setattr(simulation_range, command, result)
+    simulation_range.save()
+    return simulation_range
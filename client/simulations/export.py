@@ -0,0 +1,239 @@
+"""
+Bulk export of (many) simulations: streamed as a ZIP of per-simulation workbooks, or as a single workbook summarising
+the results across simulations. Both are generated incrementally, with at most a bounded number of workbooks built
+(by a bounded worker pool) and held in memory at any time.
+Results can also be exported as a tidy (long format) table, as gzipped CSV or Parquet, for analysis pipelines.
+"""
+import csv
+import io
+import tempfile
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import xlsxwriter
+from django.db import connection
+
+from .models import Simulation, SimulationSummaryConcentration
+from .summary import number
+
+
+CHUNK_SIZE = 1024 * 1024
+SUMMARY_COLUMNS = (('pk', 'Simulation id'), ('title', 'Title'), ('model', 'Model'),
+                   ('pacing_frequency', 'Pacing frequency (Hz)'), ('created_at', 'Created at'),
+                   ('summary__control_apd90', 'Control APD90 (ms)'),
+                   ('summary__max_delta_apd90', 'Max ΔAPD90 (%)'),
+                   ('summary__max_delta_apd90_concentration', 'Max ΔAPD90 at concentration (µM)'),
+                   ('summary__min_qnet', 'Min qNet (C/F)'),
+                   ('summary__peak_pkpd_apd90', 'Peak PK APD90 (ms)'),
+                   ('summary__peak_pkpd_timepoint', 'Peak PK APD90 at timepoint (h)'))
+# the columns of the tidy results: metric is one of VOLTAGE_RESULTS' metrics, delta_apd90, qnet, pkpd_apd90 (per PK
+# series of concentrations, at a timepoint in h) or voltage (at a time in ms)
+TIDY_COLUMNS = ('simulation', 'metric', 'concentration', 'percentile', 'pk_series', 'timepoint', 'time', 'value')
+VOLTAGE_RESULTS = (('a90', 'apd90'), ('a50', 'apd50'), ('pv', 'peak_vm'), ('uv', 'upstroke_velocity'))
+ROW_GROUP_SIZE = 100000
+CONCENTRATION_COLUMNS = (('summary__simulation__pk', 'Simulation id'), ('summary__simulation__title', 'Title'),
+                         ('concentration', 'Concentration (µM)'), ('apd90', 'APD90 (ms)'),
+                         ('delta_apd90', 'ΔAPD90 (%)'), ('qnet', 'qNet (C/F)'))
+
+
+class ZipStream:
+    """
+    Write-only, unseekable file (for zipfile or pyarrow), collecting what is written so that it can be streamed.
+    """
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        """
+        Returns (and forgets) what has been written since the last call.
+        """
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+def in_thread(func, *args):
+    # worker threads use their own database connections, which need closing
+    try:
+        return func(*args)
+    finally:
+        connection.close()
+
+
+def ordered_results(func, items, workers):
+    """
+    Yields (item, func(item)) in order, running func in a pool of workers with at most `workers` results pending.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(in_thread, func, item)))
+            if len(pending) >= workers:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+def zip_stream(pks, workbook, workers, summaries=None):
+    """
+    Streams a ZIP file with the workbook (bytes returned by `workbook(pk)`, built by the workers) of each simulation
+    and, if given, a CSV file with the `summaries` rows.
+    """
+    stream = ZipStream()
+    # workbooks are zip files themselves, so aren't compressed again
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for pk, content in ordered_results(workbook, pks, workers):
+            with archive.open(f'AP-Portal_{pk}.xlsx', 'w') as entry:
+                for i in range(0, len(content), CHUNK_SIZE):
+                    entry.write(content[i:i + CHUNK_SIZE])
+                    yield stream.take()
+        if summaries is not None:
+            with archive.open('summaries.csv', 'w') as entry, \
+                    io.TextIOWrapper(entry, encoding='utf-8', newline='') as text:
+                writer = csv.writer(text)
+                for row in summaries:
+                    writer.writerow(row)
+                    if stream.position > CHUNK_SIZE:
+                        yield stream.take()
+    yield stream.take()
+
+
+def summary_rows(sims):
+    """
+    The header and rows summarising the (successful) simulations.
+    """
+    yield [title for _, title in SUMMARY_COLUMNS]
+    rows = sims.values_list(*(field for field, _ in SUMMARY_COLUMNS if field != 'model'), 'model__name',
+                            'model__version')
+    for *values, model_name, model_version in rows.iterator(chunk_size=1000):
+        values.insert(2, f'{model_name} {model_version}'.strip())
+        values[4] = str(values[4])  # created at
+        yield values
+
+
+def summary_workbook(sims):
+    """
+    A workbook (temporary file) with a sheet summarising each simulation's results and a sheet with the results per
+    concentration, written row by row (in xlsxwriter's constant memory mode).
+    """
+    file = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+    bold = workbook.add_format({'bold': True})
+    summary_sheet = workbook.add_worksheet('Summary')
+    for row, values in enumerate(summary_rows(sims)):
+        summary_sheet.write_row(row, 0, values, bold if row == 0 else None)
+
+    concentrations_sheet = workbook.add_worksheet('Concentrations')
+    concentrations_sheet.write_row(0, 0, [title for _, title in CONCENTRATION_COLUMNS], bold)
+    rows = SimulationSummaryConcentration.objects.filter(summary__simulation__in=sims.values('pk'))\
+        .order_by('summary__simulation__pk', 'concentration')\
+        .values_list(*(field for field, _ in CONCENTRATION_COLUMNS))
+    for row, values in enumerate(rows.iterator(chunk_size=1000), start=1):
+        concentrations_sheet.write_row(row, 0, values)
+    workbook.close()
+    file.seek(0)
+    return file
+
+
+def tidy_rows(sim):
+    """
+    The results of the simulation as rows of TIDY_COLUMNS. Values that weren't computed are None.
+    """
+    if sim.voltage_results:
+        percentiles = sim.voltage_results[0]['da90']
+        q_net = sim.q_net or []
+        for i, v_res in enumerate(sim.voltage_results[1:]):
+            concentration = number(v_res['c'])
+            for key, metric in VOLTAGE_RESULTS:
+                yield sim.pk, metric, concentration, None, None, None, None, number(v_res.get(key))
+            for percentile, value in zip(percentiles, v_res['da90']):
+                yield sim.pk, 'delta_apd90', concentration, percentile, None, None, None, number(value)
+            if i < len(q_net):
+                for percentile, value in zip(percentiles, q_net[i]['qnet'].split(',')):
+                    yield sim.pk, 'qnet', concentration, percentile, None, None, None, number(value)
+
+    for pkpd in sim.pkpd_results or []:
+        apd90 = pkpd['apd90'] if isinstance(pkpd['apd90'], list) else [pkpd['apd90']]
+        for series, value in enumerate(apd90, start=1):
+            yield sim.pk, 'pkpd_apd90', None, None, series, number(pkpd['timepoint']), None, number(value)
+
+    for trace in sim.voltage_traces or []:
+        concentration = number(trace['name'])
+        for point in trace['series']:
+            yield sim.pk, 'voltage', concentration, None, None, None, number(point['name']), number(point['value'])
+
+
+def tidy_results(pks):
+    """
+    The tidy results of the simulations, loading one simulation (with its results) at a time.
+    """
+    for pk in pks:
+        yield from tidy_rows(Simulation.objects.get(pk=pk).rehydrate())
+
+
+def csv_gzip_stream(rows):
+    """
+    Streams the rows (with TIDY_COLUMNS header) as gzip compressed CSV.
+    """
+    compressor = zlib.compressobj(wbits=31)  # gzip format
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(TIDY_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if text.tell() > CHUNK_SIZE:
+            yield compressor.compress(text.getvalue().encode('utf-8'))
+            text = io.StringIO()
+            writer = csv.writer(text)
+    yield compressor.compress(text.getvalue().encode('utf-8')) + compressor.flush()
+
+
+def parquet_stream(rows):
+    """
+    Streams the rows as Parquet file, written in row groups of ROW_GROUP_SIZE rows.
+    Requires pyarrow (raises ImportError otherwise).
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([('simulation', pyarrow.int64()), ('metric', pyarrow.string()),
+                             ('concentration', pyarrow.float64()), ('percentile', pyarrow.string()),
+                             ('pk_series', pyarrow.int32()), ('timepoint', pyarrow.float64()),
+                             ('time', pyarrow.float64()), ('value', pyarrow.float64())])
+
+    def table(group):
+        return pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type)
+                                          for column, field in zip(zip(*group), schema)], schema=schema)
+
+    stream = ZipStream()
+    with pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(stream, mode='w'), schema) as writer:
+        group = []
+        for row in rows:
+            group.append(row)
+            if len(group) >= ROW_GROUP_SIZE:
+                writer.write_table(table(group))
+                group = []
+                yield stream.take()
+        if group:
+            writer.write_table(table(group))
+    yield stream.take()
@@ -0,0 +1,85 @@
+import json
+import zlib
+
+from django import forms
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+class CompressedJSON(bytes):
+    """
+    Compressed json, as loaded from the database (it is only decompressed when first accessed).
+    """
+
+
+class CompressedJSONDescriptor(DeferredAttribute):
+    """
+    Decompresses the value on first access and caches the result on the instance.
+    (Defining __set__ makes this a data descriptor, so it is used even once the value is in the instance's __dict__).
+    """
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedJSON):
+            value = self.field.decompress(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class CompressedJSONField(models.Field):
+    """
+    Drop-in replacement for JSONField, for large (result) values.
+    Stores zlib compressed (canonical) json in a binary column, which is decompressed lazily on first access.
+    Values loaded from the database that have not been accessed are saved back without re-encoding.
+    """
+    descriptor_class = CompressedJSONDescriptor
+    empty_values = [None]
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    @staticmethod
+    def compress(value):
+        return zlib.compress(json.dumps(value, sort_keys=True, separators=(',', ':'),
+                                        ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def decompress(value):
+        return json.loads(zlib.decompress(value).decode('utf-8'))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return CompressedJSON(value)
+
+    def pre_save(self, model_instance, add):
+        # avoid decompressing values that haven't been accessed
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def to_python(self, value):
+        if isinstance(value, CompressedJSON):
+            return self.decompress(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, CompressedJSON):
+            return value
+        return self.compress(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is not None:
+            return connection.Database.Binary(value)
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.JSONField, **kwargs})
@@ -4,6 +4,7 @@ import magic
 from braces.forms import UserKwargModelFormMixin
 from django import forms
 from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.db.models import F, FilteredRelation, Q
 from files.models import CellmlModel
 
 from .models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
@@ -191,7 +192,7 @@ class SimulationForm(SimulationBaseForm):
     """
     class Meta:
         model = Simulation
-        exclude = ('author', )
+        exclude = ('author', 'priority')
 
     def __init__(self, *args, **kwargs):
         def get_choices(queryset):
@@ -236,3 +237,54 @@ class SimulationEditForm(SimulationBaseForm):
     class Meta:
         model = Simulation
         fields = ('title', 'notes')
+
+
+class SimulationFilterForm(forms.Form):
+    """
+    Filters and orders simulations by the summary of their results (see `SimulationSummary`).
+    ΔAPD90 and qNet are the largest change in APD90 and the smallest qNet over all concentrations, or if a
+    concentration is given, the values at that concentration.
+    """
+    ORDERINGS = {'delta_apd90': F('delta_apd90').desc(nulls_last=True),
+                 'qnet': F('qnet').asc(nulls_last=True),
+                 'pkpd_apd90': F('summary__peak_pkpd_apd90').desc(nulls_last=True)}
+
+    concentration = forms.FloatField(required=False, min_value=0, label='At concentration (µM)',
+                                     help_text="Filter and order by the results at this concentration.")
+    min_delta_apd90 = forms.FloatField(required=False, label='ΔAPD90 (%) from')
+    max_delta_apd90 = forms.FloatField(required=False, label='to')
+    min_qnet = forms.FloatField(required=False, label='qNet (C/F) from')
+    max_qnet = forms.FloatField(required=False, label='to')
+    order = forms.ChoiceField(required=False, choices=(('', 'Newest first'),
+                                                       ('delta_apd90', 'Largest ΔAPD90 first'),
+                                                       ('qnet', 'Smallest qNet first'),
+                                                       ('pkpd_apd90', 'Largest PK APD90 first')))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for _, field in self.fields.items():
+            if isinstance(field, forms.FloatField):
+                field.widget.attrs['step'] = 'any'
+
+    def filter(self, simulations):
+        """
+        Filters (and orders) the simulations, annotated with their `delta_apd90` and `qnet`.
+        Invalid filters are ignored.
+        """
+        data = self.cleaned_data if self.is_valid() else {}
+        if data.get('concentration') is not None:
+            condition = Q(summary__concentrations__concentration=data['concentration'])
+            simulations = simulations.annotate(at_concentration=FilteredRelation('summary__concentrations',
+                                                                                 condition=condition))\
+                .filter(at_concentration__isnull=False)\
+                .annotate(delta_apd90=F('at_concentration__delta_apd90'), qnet=F('at_concentration__qnet'))
+        else:
+            simulations = simulations.annotate(delta_apd90=F('summary__max_delta_apd90'), qnet=F('summary__min_qnet'))
+
+        filters = {f'{field}__{lookup}': data[f'{bound}_{field}']
+                   for field in ('delta_apd90', 'qnet') for bound, lookup in (('min', 'gte'), ('max', 'lte'))
+                   if data.get(f'{bound}_{field}') is not None}
+        simulations = simulations.filter(**filters)
+        if data.get('order'):
+            simulations = simulations.order_by(self.ORDERINGS[data['order']], '-created_at')
+        return simulations
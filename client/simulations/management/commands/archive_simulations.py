@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Value
+from django.db.models.functions import Coalesce, Length
+from django.utils import timezone
+from simulations.models import Simulation
+
+
+class Command(BaseCommand):
+    help = ('Archive the (bulky) results of old, successful simulations into compressed files, '
+            'to keep the simulations table small. Archived results are loaded transparently when '
+            'simulation results are viewed or exported.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SIMULATION_ARCHIVE_AFTER_DAYS,
+                            help='Archive simulations created more than this many days ago '
+                                 '(default: SIMULATION_ARCHIVE_AFTER_DAYS, 0 disables archiving).')
+        parser.add_argument('--min_size', type=int, default=settings.SIMULATION_ARCHIVE_MIN_SIZE,
+                            help='Only archive simulations whose stored results take up at least this many KB '
+                                 '(default: SIMULATION_ARCHIVE_MIN_SIZE).')
+        parser.add_argument('--user', action='append', default=[],
+                            help='Only archive simulations of the user with this email address '
+                                 '(can be given multiple times).')
+        parser.add_argument('--dry_run', action='store_true', help='Report what would be archived, without archiving.')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['days'] <= 0:
+            self.stdout.write('Archiving is disabled (set --days or SIMULATION_ARCHIVE_AFTER_DAYS).')
+            return
+
+        results_size = sum((Coalesce(Length(field), 0) for field in Simulation.ARCHIVED_FIELDS), Value(0))
+        sims = Simulation.objects.filter(status=Simulation.Status.SUCCESS, archive='',
+                                         created_at__lt=timezone.now() - timedelta(days=kwargs['days']))\
+            .annotate(results_size=results_size).filter(results_size__gte=kwargs['min_size'] * 1024)
+        if kwargs['user']:
+            sims = sims.filter(author__email__in=kwargs['user'])
+
+        count, size = 0, 0
+        for sim in sims.iterator(chunk_size=100):
+            if not kwargs['dry_run']:
+                sim.archive_results()
+            count += 1
+            size += sim.results_size
+        self.stdout.write(f"{'Would archive' if kwargs['dry_run'] else 'Archived'} {count} simulations "
+                          f'({size / 1024 ** 2:.2f} MB of results).')
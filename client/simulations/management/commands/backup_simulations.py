@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core import serializers
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from files.models import CellmlModel
+from simulations.backup import (
+    ChunkStore,
+    backup_media,
+    backup_result,
+    canonical_json,
+    media_fields,
+    read_checkpoint,
+    simulation_record,
+    write_manifest,
+)
+from simulations.models import Simulation
+
+
+class Command(BaseCommand):
+    help = ('Incremental backup of simulations and cellml models, including results and uploaded files. '
+            'Only simulations changed since the last backup (checkpoint) in the destination are exported. '
+            'Everything is stored in compressed, content addressed chunks, so unchanged results and files '
+            'are stored only once. Users and ion currents are not included (they are part of the database dump). '
+            'Use restore_simulations to restore.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('destination', type=str, help='Backup directory.')
+        parser.add_argument('--full', action='store_true',
+                            help='Export all simulations, rather than those changed since the last checkpoint.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of threads hashing and compressing chunks in parallel.')
+        parser.add_argument('--batch_size', type=int, default=100, help='Number of simulations to process at once.')
+
+    def backup(self, executor, store, obj, record, results=()):
+        return {'record': executor.submit(store.put, canonical_json(record)),
+                'results': {field: executor.submit(backup_result, store, obj, field) for field in results},
+                'media': {field: executor.submit(backup_media, store, getattr(obj, field))
+                          for field in media_fields(obj)}}
+
+    @staticmethod
+    def resolve(entries):
+        return {pk: {'record': entry['record'].result(),
+                     'results': {field: future.result() for field, future in entry['results'].items()},
+                     'media': {field: future.result() for field, future in entry['media'].items()}}
+                for pk, entry in entries.items()}
+
+    def handle(self, *args, **kwargs):
+        root = kwargs['destination']
+        store = ChunkStore(root)
+        checkpoint = None if kwargs['full'] else read_checkpoint(root)
+        manifest = {'created': timezone.now().isoformat(),
+                    'previous': checkpoint['manifest'] if checkpoint else None,
+                    'since': checkpoint['created'] if checkpoint else None,
+                    'cellml_models': {},
+                    'simulations': {},
+                    'cellml_model_pks': list(CellmlModel.objects.values_list('pk', flat=True)),
+                    'simulation_pks': list(Simulation.objects.values_list('pk', flat=True))}
+
+        sims = Simulation.objects.prefetch_related('simulationioncurrentparam_set', 'compoundconcentrationpoint_set')
+        if checkpoint:
+            sims = sims.filter(updated_at__gt=checkpoint['created'])
+
+        with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+            # cellml models are few and small, and don't record changes, so always check them all
+            models = {model.pk: self.backup(executor, store, model, serializers.serialize('python', [model]))
+                      for model in CellmlModel.objects.prefetch_related('ion_currents')}
+            manifest['cellml_models'] = self.resolve(models)
+
+            batch = {}
+            for sim in sims.iterator(chunk_size=kwargs['batch_size']):
+                batch[sim.pk] = self.backup(executor, store, sim, simulation_record(sim), Simulation.ARCHIVED_FIELDS)
+                if len(batch) >= kwargs['batch_size']:
+                    manifest['simulations'].update(self.resolve(batch))
+                    batch = {}
+            manifest['simulations'].update(self.resolve(batch))
+
+        name = write_manifest(root, manifest)
+        self.stdout.write(f"Backed up {len(manifest['simulations'])} simulations and "
+                          f"{len(manifest['cellml_models'])} cellml models to {name} "
+                          f'({len(store.written)} new chunks, {sum(store.written) / 1024 ** 2:.2f} MB).')
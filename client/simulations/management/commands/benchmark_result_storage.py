@@ -0,0 +1,50 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Length
+from simulations.models import Simulation
+
+
+RESULT_FIELDS = ('q_net', 'voltage_traces', 'voltage_results', 'pkpd_results')
+
+
+class Command(BaseCommand):
+    help = ('Report the storage size of (compressed) simulation results compared to plain json, '
+            'and the read latency for loading and decoding them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100, help='Number of (most recent) simulations to sample.')
+
+    def handle(self, *args, **kwargs):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_total_relation_size('simulations_simulation')")
+            table_size = cursor.fetchone()[0]
+        self.stdout.write(f'Table simulations_simulation: {table_size / 1024 ** 2:.2f} MB '
+                          f'({Simulation.objects.count()} simulations)')
+
+        pks = list(Simulation.objects.order_by('-created_at').values_list('pk', flat=True)[:kwargs['count']])
+        stored_sizes = Simulation.objects.filter(pk__in=pks)\
+            .aggregate(**{f'{field}_size': Sum(Length(field)) for field in RESULT_FIELDS})
+
+        start = time.perf_counter()
+        sims = list(Simulation.objects.filter(pk__in=pks))
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        values = [[getattr(sim, field) for field in RESULT_FIELDS] for sim in sims]
+        decode_time = time.perf_counter() - start
+
+        json_sizes = [sum(len(json.dumps(sim_values[i])) for sim_values in values if sim_values[i] is not None)
+                      for i in range(len(RESULT_FIELDS))]
+        for field, json_size in zip(RESULT_FIELDS, json_sizes):
+            stored_size = stored_sizes[f'{field}_size'] or 0
+            ratio = json_size / stored_size if stored_size else 0
+            self.stdout.write(f'{field}: json {json_size / 1024:.1f} KB, stored {stored_size / 1024:.1f} KB '
+                              f'(ratio {ratio:.1f})')
+        stdout_size = sum(sim.STDOUT.size for sim in sims if sim.STDOUT and sim.STDOUT.storage.exists(sim.STDOUT.name))
+        self.stdout.write(f'STDOUT: stored {stdout_size / 1024:.1f} KB (compressed files)')
+        self.stdout.write(f'Loaded {len(sims)} simulations in {load_time * 1000:.1f} ms, '
+                          f'decoded results in {decode_time * 1000:.1f} ms')
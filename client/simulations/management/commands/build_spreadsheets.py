@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from simulations.models import Simulation, SimulationSpreadsheet
+from simulations.views import build_spreadsheet, queue_spreadsheet
+
+
+class Command(BaseCommand):
+    help = ('Build the queued spreadsheet exports of successful simulations (queued when simulations complete, with '
+            'SIMULATION_SPREADSHEET_WORKER, or when downloaded). Run with --interval as background worker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, building queued spreadsheets every this many seconds '
+                                 '(default: run once).')
+        parser.add_argument('--all', action='store_true',
+                            help='First queue the spreadsheets of all successful simulations that do not have one '
+                                 '(e.g. those that completed before spreadsheets were stored).')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['all']:
+            sims = Simulation.objects.filter(status=Simulation.Status.SUCCESS).exclude(ap_predict_call_id='')\
+                .filter(Q(spreadsheet__isnull=True) | Q(spreadsheet__file=''))
+            for sim in sims.iterator(chunk_size=100):
+                queue_spreadsheet(sim)
+
+        while True:
+            built = 0
+            for spreadsheet in SimulationSpreadsheet.objects.filter(file='').order_by('queued_at'):
+                built += build_spreadsheet(spreadsheet)
+            self.stdout.write(f'Built {built} spreadsheets.')
+            if not kwargs['interval']:
+                break
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from simulations.backup import (
+    ChunkStore,
+    manifest_chain,
+    read_checkpoint,
+    restore_object,
+)
+
+
+class Command(BaseCommand):
+    help = ('Restore simulations and cellml models, including results and uploaded files, from a backup made '
+            'with backup_simulations. The users (and ion currents) they refer to need to exist already, '
+            'e.g. by restoring the database dump first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', type=str, help='Backup directory.')
+        parser.add_argument('--manifest', type=str,
+                            help='The backup (manifest file name) to restore, by default the latest.')
+
+    def restore(self, store, entries, pks):
+        restored = 0
+        for pk, entry in entries.items():
+            if int(pk) in pks:
+                try:
+                    restore_object(store, entry)
+                    restored += 1
+                except IntegrityError as e:
+                    self.stderr.write(f'Could not restore {pk}: {e}')
+        return restored
+
+    def handle(self, *args, **kwargs):
+        root = kwargs['source']
+        name = kwargs['manifest'] or (read_checkpoint(root) or {}).get('manifest')
+        if not name:
+            raise CommandError(f'No backup found in {root}.')
+        chain = manifest_chain(root, name)
+
+        # the latest version of each object, for objects that still existed at the time of the chosen backup
+        models, sims = {}, {}
+        for manifest in chain:
+            models.update(manifest['cellml_models'])
+            sims.update(manifest['simulations'])
+
+        store = ChunkStore(root)
+        restored_models = self.restore(store, models, set(chain[-1]['cellml_model_pks']))
+        restored_sims = self.restore(store, sims, set(chain[-1]['simulation_pks']))
+        self.stdout.write(f'Restored {restored_sims} simulations and {restored_models} cellml models from {name}.')
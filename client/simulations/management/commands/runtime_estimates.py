@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from files.models import CellmlModel
+from simulations.runtime import RuntimeEstimator, history
+
+
+class Command(BaseCommand):
+    help = ('Fit the runtime prediction on the history of successful simulations and report the median runtime '
+            'per group of similar simulations (model, pacing time, number of concentrations and uncertainty), '
+            'e.g. for capacity planning.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=settings.RUNTIME_ESTIMATOR_HISTORY,
+                            help='Number of recent successful simulations to fit on '
+                                 '(default: RUNTIME_ESTIMATOR_HISTORY).')
+        parser.add_argument('--min_samples', type=int, default=settings.RUNTIME_ESTIMATOR_MIN_SAMPLES,
+                            help='Minimum number of runs for a group to be predicted by its median '
+                                 '(default: RUNTIME_ESTIMATOR_MIN_SAMPLES).')
+
+    def handle(self, *args, **kwargs):
+        estimator = RuntimeEstimator(history(kwargs['history']), min_samples=kwargs['min_samples'])
+        models = {model.pk: str(model) for model in CellmlModel.objects.filter(pk__in={key.model
+                                                                                       for key in estimator.samples})}
+        self.stdout.write(f"{'model':<40}{'pacing (min)':>14}{'concs':>7}{'spreads':>9}{'runs':>7}{'median (s)':>12}")
+        for key in sorted(estimator.samples, key=lambda key: (models.get(key.model, ''), key[1:])):
+            runtime = estimator.runtimes.get(key)
+            self.stdout.write(f"{models.get(key.model, ''):<40.40}{key.pacing_time:>14g}{key.concentrations:>7}"
+                              f"{'yes' if key.uncertainty else 'no':>9}{estimator.samples[key]:>7}"
+                              f"{'-' if runtime is None else f'{runtime:.0f}':>12}")
+        for (model, uncertainty), rate in sorted(estimator.rates.items(), key=lambda item: item[0][0] or 0):
+            self.stdout.write(f"{models.get(model, 'all models')} ({'with' if uncertainty else 'without'} spreads): "
+                              f'{rate:.1f} s per minute of pacing per concentration')
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from simulations import scheduler
+from simulations.models import Simulation
+from simulations.views import StatusSimulationView, arelease_simulations
+
+
+class Command(BaseCommand):
+    help = ('Update the status of running simulations and start queued simulations there is capacity for. '
+            'Statuses are otherwise only updated while users look at their simulations, run this periodically '
+            '(e.g. from cron) or with --interval, so that finished simulations make room for queued ones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, scheduling every this many seconds (default: run once).')
+
+    async def schedule(self):
+        running = [sim async for sim in Simulation.objects.filter(status__in=scheduler.ACTIVE_STATUSES)
+                   .exclude(ap_predict_call_id='')]
+        if running:
+            async with httpx.AsyncClient(timeout=None) as client:
+                await asyncio.wait([asyncio.ensure_future(StatusSimulationView().update_sim(client, sim))
+                                    for sim in running])
+        await arelease_simulations()
+
+    def handle(self, *args, **kwargs):
+        while True:
+            async_to_sync(self.schedule)()
+            queued = Simulation.objects.filter(status=Simulation.Status.QUEUED).count()
+            self.stdout.write(f'{queued} simulations queued.')
+            if not kwargs['interval']:
+                break
+            time.sleep(kwargs['interval'])
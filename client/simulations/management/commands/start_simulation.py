@@ -1,10 +1,7 @@
 import os
-import uuid
-from shutil import copyfile
 
 from accounts.models import User
-from django.conf import settings
-from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files import File
 from django.core.management.base import BaseCommand
 from files.models import CellmlModel, IonCurrent
 from simulations.models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
@@ -95,12 +92,8 @@ class Command(BaseCommand):
 
         PK_data = ''
         if kwargs['pk_or_concs'] == 'pharmacokinetics':
-            uploaded_file = os.path.join(settings.MEDIA_ROOT, f'{uuid.uuid4()}.tsv')
-            copyfile(kwargs['PK_data'], uploaded_file)
-
-            PK_data = TemporaryUploadedFile(os.path.basename(kwargs['PK_data']), 'text/plain',
-                                            os.path.getsize(uploaded_file), 'utf-8')
-            PK_data.file = open(uploaded_file, 'rb')
+            # stored (content addressed) when the simulation is saved, identical files are only stored once
+            PK_data = File(open(kwargs['PK_data'], 'rb'), name=os.path.basename(kwargs['PK_data']))
 
         simulation = Simulation(title=title,
                                 notes=kwargs['notes'],
@@ -136,6 +129,8 @@ class Command(BaseCommand):
 
         # save all bits
         simulation.save()
+        if PK_data:
+            PK_data.close()
         for cp in concentration_points:
             cp.save()
         for icur in ion_currents:
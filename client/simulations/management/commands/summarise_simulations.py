@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from simulations.models import Simulation
+from simulations.summary import summarise
+
+
+class Command(BaseCommand):
+    help = ('Create the result summaries (used for filtering and ranking simulations by their results) of successful '
+            'simulations that do not have one yet, e.g. those that completed before summaries were introduced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recreate the summaries of all successful simulations.')
+        parser.add_argument('--user', action='append', default=[],
+                            help='Only summarise simulations of the user with this email address '
+                                 '(can be given multiple times).')
+
+    def handle(self, *args, **kwargs):
+        sims = Simulation.objects.filter(status=Simulation.Status.SUCCESS)
+        if not kwargs['all']:
+            sims = sims.filter(summary__isnull=True)
+        if kwargs['user']:
+            sims = sims.filter(author__email__in=kwargs['user'])
+
+        count = 0
+        for sim in sims.iterator(chunk_size=100):
+            summarise(sim.rehydrate())
+            count += 1
+        self.stdout.write(f'Summarised {count} simulations.')
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:40
+
+import simulations.fields
+from django.db import migrations
+
+
+RESULT_FIELDS = ('q_net', 'voltage_traces', 'voltage_results', 'pkpd_results', 'STDOUT')
+BATCH_SIZE = 100
+
+
+def copy_fields(apps, from_suffix, to_suffix):
+    Simulation = apps.get_model('simulations', 'Simulation')
+    from_fields = [field + from_suffix for field in RESULT_FIELDS]
+    to_fields = [field + to_suffix for field in RESULT_FIELDS]
+    batch = []
+    for sim in Simulation.objects.only('pk', *from_fields).iterator(chunk_size=BATCH_SIZE):
+        for from_field, to_field in zip(from_fields, to_fields):
+            setattr(sim, to_field, getattr(sim, from_field))
+        batch.append(sim)
+        if len(batch) >= BATCH_SIZE:
+            Simulation.objects.bulk_update(batch, to_fields)
+            batch = []
+    Simulation.objects.bulk_update(batch, to_fields)
+
+
+def compress_results(apps, schema_editor):
+    copy_fields(apps, '', '_compressed')
+
+
+def decompress_results(apps, schema_editor):
+    copy_fields(apps, '_compressed', '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0007_rename_stdout_simulation_stdout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name=field + '_compressed',
+            field=simulations.fields.CompressedJSONField(blank=True, null=True),
+        )
+        for field in RESULT_FIELDS
+    ] + [
+        migrations.RunPython(compress_results, decompress_results),
+    ] + [
+        migrations.RemoveField(
+            model_name='simulation',
+            name=field,
+        )
+        for field in RESULT_FIELDS
+    ] + [
+        migrations.RenameField(
+            model_name='simulation',
+            old_name=field + '_compressed',
+            new_name=field,
+        )
+        for field in RESULT_FIELDS
+    ]
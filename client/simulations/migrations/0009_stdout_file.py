@@ -0,0 +1,66 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:20
+
+import gzip
+
+import simulations.models
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+
+BATCH_SIZE = 100
+
+
+def stdout_to_files(apps, schema_editor):
+    Simulation = apps.get_model('simulations', 'Simulation')
+    batch = []
+    sims = Simulation.objects.filter(STDOUT_json__isnull=False).only('pk', 'STDOUT_json', 'STDOUT')
+    for sim in sims.iterator(chunk_size=BATCH_SIZE):
+        if isinstance(sim.STDOUT_json, dict) and 'content' in sim.STDOUT_json:
+            content = gzip.compress(sim.STDOUT_json['content'].encode('utf-8'))
+            sim.STDOUT.save(f'{sim.pk}.txt.gz', ContentFile(content), save=False)
+            batch.append(sim)
+        if len(batch) >= BATCH_SIZE:
+            Simulation.objects.bulk_update(batch, ['STDOUT'])
+            batch = []
+    Simulation.objects.bulk_update(batch, ['STDOUT'])
+
+
+def files_to_stdout(apps, schema_editor):
+    Simulation = apps.get_model('simulations', 'Simulation')
+    batch = []
+    for sim in Simulation.objects.exclude(STDOUT='').only('pk', 'STDOUT').iterator(chunk_size=BATCH_SIZE):
+        if sim.STDOUT.storage.exists(sim.STDOUT.name):
+            with sim.STDOUT.open('rb') as file:
+                sim.STDOUT_json = {'success': True, 'content': gzip.decompress(file.read()).decode('utf-8')}
+            sim.STDOUT.delete(save=False)
+            batch.append(sim)
+        if len(batch) >= BATCH_SIZE:
+            Simulation.objects.bulk_update(batch, ['STDOUT_json'])
+            batch = []
+    Simulation.objects.bulk_update(batch, ['STDOUT_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0008_compressed_results'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='simulation',
+            old_name='STDOUT',
+            new_name='STDOUT_json',
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='STDOUT',
+            field=models.FileField(blank=True, help_text='Gzip compressed STDOUT of the ApPredict run.',
+                                   storage=simulations.models.stdout_storage, upload_to='STDOUT/'),
+        ),
+        migrations.RunPython(stdout_to_files, files_to_stdout),
+        migrations.RemoveField(
+            model_name='simulation',
+            name='STDOUT_json',
+        ),
+    ]
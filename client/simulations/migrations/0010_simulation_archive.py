@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:52
+
+import simulations.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0009_stdout_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='archive',
+            field=models.FileField(blank=True, help_text='Gzip compressed json of the archived (bulky) results.', storage=simulations.models.archive_storage, upload_to='archive/'),
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0010_simulation_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:01
+
+import files.storage
+from django.db import migrations, models
+
+
+def move_to_blobs(apps, schema_editor):
+    """
+    Moves existing uploaded files into the content addressed storage (deduplicating identical files).
+    Objects can share a file (e.g. simulations created from a template share the PK data file), so each file is moved
+    once, all references are updated and the old file is only deleted once nothing refers to it any more.
+    """
+    CellmlModel = apps.get_model('files', 'CellmlModel')
+    Simulation = apps.get_model('simulations', 'Simulation')
+    MediaFile = apps.get_model('files', 'MediaFile')
+    moved = {}  # old name -> (storage, new name)
+    for model, field in ((CellmlModel, 'cellml_file'), (Simulation, 'PK_data')):
+        storage = model._meta.get_field(field).storage
+        for old_name in list(model.objects.exclude(**{field: ''}).values_list(field, flat=True).distinct()):
+            if old_name not in moved:
+                if storage.content_hash(old_name) or not storage.exists(old_name):
+                    continue
+                with storage.open(old_name, 'rb') as content:
+                    moved[old_name] = storage, storage.save(old_name, content)
+            model.objects.filter(**{field: old_name}).update(**{field: moved[old_name][1]})
+
+    for old_name, (storage, new_name) in moved.items():
+        MediaFile.objects.filter(file_name=old_name).update(file_name=new_name)
+        storage.delete(old_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0011_simulation_updated_at'),
+        ('files', '0010_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='simulation',
+            name='PK_data',
+            field=models.FileField(blank=True, help_text='File format: tab-seperated values (TSV). Encoding: UTF-8\nColumn 1 : Time (hours)\nColumns 2-31 : Concentrations (µM).', storage=files.storage.blob_storage, upload_to=''),
+        ),
+        migrations.RunPython(move_to_blobs, migrations.RunPython.noop),
+    ]
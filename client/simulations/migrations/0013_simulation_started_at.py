@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0012_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0013_simulation_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='priority',
+            field=models.IntegerField(default=0, help_text='Scheduling priority (set by admins): queued simulations with a higher priority are started first.'),
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='simulation',
+            name='status',
+            field=models.CharField(blank=True, choices=[('QUEUED', 'Queued'), ('NOT_STARTED', 'Not Started'), ('INITIALISING', 'Initialising'), ('RUNNING', 'Running'), ('SUCCESS', 'Success'), ('FAILED', 'Failed')], db_index=True, default='NOT_STARTED', max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0014_simulation_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='estimated_runtime',
+            field=models.FloatField(blank=True, help_text='Predicted runtime (in seconds), from the runtimes of similar simulations.', null=True),
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0015_simulation_runtime'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulationSummary',
+            fields=[
+                ('simulation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='simulations.simulation')),
+                ('control_apd90', models.FloatField(blank=True, help_text='(in ms) APD90 without compound.', null=True)),
+                ('max_delta_apd90', models.FloatField(blank=True, db_index=True, help_text='(in %) Largest (median) change in APD90 over the concentrations.', null=True)),
+                ('max_delta_apd90_concentration', models.FloatField(blank=True, help_text='(in µM) Concentration with the largest change in APD90.', null=True)),
+                ('min_qnet', models.FloatField(blank=True, db_index=True, help_text='(in C/F) Smallest (median) qNet over the concentrations.', null=True)),
+                ('peak_pkpd_apd90', models.FloatField(blank=True, db_index=True, help_text='(in ms) Largest (median) APD90 over the PK timepoints.', null=True)),
+                ('peak_pkpd_timepoint', models.FloatField(blank=True, help_text='(in h) PK timepoint with the largest APD90.', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimulationSummaryConcentration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('concentration', models.FloatField(help_text='(in µM)')),
+                ('apd90', models.FloatField(blank=True, help_text='(in ms)', null=True)),
+                ('delta_apd90', models.FloatField(blank=True, help_text='(in %) Median change in APD90.', null=True)),
+                ('qnet', models.FloatField(blank=True, help_text='(in C/F) Median qNet.', null=True)),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='concentrations', to='simulations.simulationsummary')),
+            ],
+            options={
+                'ordering': ('concentration',),
+                'indexes': [models.Index(fields=['concentration', 'delta_apd90'], name='summary_conc_delta_apd90'), models.Index(fields=['concentration', 'qnet'], name='summary_conc_qnet')],
+                'unique_together': {('summary', 'concentration')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulations', '0016_simulation_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulationSpreadsheet',
+            fields=[
+                ('simulation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spreadsheet', serialize=False, to='simulations.simulation')),
+                ('result_version', models.CharField(help_text='The result version (see Simulation.result_version) the spreadsheet is built from.', max_length=255)),
+                ('file', models.FileField(blank=True, upload_to='spreadsheets/')),
+                ('queued_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
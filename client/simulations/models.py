@@ -1,15 +1,40 @@
+import gzip
+import json
 import math
-import os
 
 import django.db.models.deletion
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.deconstruct import deconstructible
 from django.utils.translation import gettext as _
-from files.models import CellmlModel, IonCurrent
+from files.models import (
+    CellmlModel,
+    IonCurrent,
+    MediaFile,
+    uploaded_name,
+)
+from files.storage import blob_storage
+
+from .fields import CompressedJSONField
+
+
+def stdout_storage():
+    """
+    Storage for (compressed) ApPredict STDOUT files, the `stdout` alias in STORAGES if configured.
+    """
+    return storages['stdout'] if 'stdout' in settings.STORAGES else default_storage
+
+
+def archive_storage():
+    """
+    Storage for archived simulation results, the `archive` alias in STORAGES if configured.
+    """
+    return storages['archive'] if 'archive' in settings.STORAGES else default_storage
 
 
 @deconstructible
@@ -27,7 +52,10 @@ class Simulation(models.Model):
     """
     Main simulation model
     """
+    ARCHIVED_FIELDS = ('q_net', 'voltage_traces', 'voltage_results', 'pkpd_results')
+
     class Status(models.TextChoices):
+        QUEUED = "QUEUED"
         NOT_STARTED = "NOT_STARTED"
         INITIALISING = "INITIALISING"
         RUNNING = "RUNNING"
@@ -59,12 +87,14 @@ class Simulation(models.Model):
         compound_concentration_points = 'compound_concentration_points', 'Compound Concentration Points'
         pharmacokinetics = 'pharmacokinetics', 'Pharmacokinetics'
 
-    status = models.CharField(choices=Status.choices, max_length=255, blank=True, default=Status.NOT_STARTED)
+    status = models.CharField(choices=Status.choices, max_length=255, blank=True, default=Status.NOT_STARTED,
+                              db_index=True)
     title = models.CharField(max_length=255, help_text="A short title to identify this simulation.")
     notes = models.TextField(blank=True, default='',
                              help_text="Any notes related to this simulation. Please note: These will also be visible "
                                        "to admin users.")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     author = models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)
 
     model = models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=CellmlModel)
@@ -88,19 +118,32 @@ class Simulation(models.Model):
     )
     intermediate_point_log_scale = models.BooleanField(default=True, blank=True,
                                                        help_text='Use log scale for intermediate points.')
-    PK_data = models.FileField(blank=True, help_text="File format: tab-seperated values (TSV). Encoding: UTF-8\n"
-                                                     "Column 1 : Time (hours)\nColumns 2-31 : Concentrations (µM).")
+    PK_data = models.FileField(blank=True, storage=blob_storage,
+                               help_text="File format: tab-seperated values (TSV). Encoding: UTF-8\n"
+                                         "Column 1 : Time (hours)\nColumns 2-31 : Concentrations (µM).")
     progress = models.CharField(max_length=255, blank=True, default='Initialising..')
+    started_at = models.DateTimeField(blank=True, null=True)
+    queued_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    estimated_runtime = models.FloatField(blank=True, null=True,
+                                          help_text='Predicted runtime (in seconds), from the runtimes of similar '
+                                                    'simulations.')
+    priority = models.IntegerField(default=0, help_text='Scheduling priority (set by admins): queued simulations with '
+                                                        'a higher priority are started first.')
     ap_predict_last_update = models.DateTimeField(blank=True, default=timezone.now)
     ap_predict_call_id = models.CharField(max_length=255, blank=True)
     api_errors = models.CharField(max_length=255, blank=True)
     messages = models.JSONField(blank=True, null=True)
-    q_net = models.JSONField(blank=True, null=True)
-    voltage_traces = models.JSONField(blank=True, null=True)
-    voltage_results = models.JSONField(blank=True, null=True)
-    pkpd_results = models.JSONField(blank=True, null=True)
-    STDOUT = models.JSONField(blank=True, null=True)
+    q_net = CompressedJSONField(blank=True, null=True)
+    voltage_traces = CompressedJSONField(blank=True, null=True)
+    voltage_results = CompressedJSONField(blank=True, null=True)
+    pkpd_results = CompressedJSONField(blank=True, null=True)
+    STDOUT = models.FileField(blank=True, upload_to='STDOUT/', storage=stdout_storage,
+                              help_text='Gzip compressed STDOUT of the ApPredict run.')
     version_info = models.JSONField(blank=True, null=True)
+    archive = models.FileField(blank=True, upload_to='archive/', storage=archive_storage,
+                               help_text='Gzip compressed json of the archived (bulky) results.')
+    archived_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         unique_together = ('title', 'author')
@@ -109,6 +152,70 @@ class Simulation(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if uploaded_name(self.PK_data):
+            # new PK data stays locked until it is in the media file index (see CellmlModel.save)
+            with transaction.atomic(savepoint=False):
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+    @property
+    def result_version(self):
+        """
+        Identifies the results of a successful simulation (the id of the ApPredict run that produced them), so that
+        they can be cached. It changes when the simulation is restarted.
+        """
+        return self.ap_predict_call_id if self.status == self.Status.SUCCESS and self.ap_predict_call_id else None
+
+    @property
+    def PK_data_name(self):
+        return MediaFile.display_name(self, self.PK_data)
+
+    def save_stdout(self, content):
+        """
+        Stores (gzip compressed) STDOUT content, replacing any previously stored STDOUT.
+        """
+        if self.STDOUT:
+            self.STDOUT.delete(save=False)
+        self.STDOUT.save(f'{self.pk}.txt.gz', ContentFile(gzip.compress(content.encode('utf-8'))), save=False)
+
+    def open_stdout(self):
+        """
+        Opens the stored STDOUT for (streamed) reading as text.
+        """
+        return gzip.open(self.STDOUT.open('rb'), 'rt', encoding='utf-8')
+
+    def archive_results(self):
+        """
+        Moves the (bulky) results into a compressed archive file, clearing them in the database.
+        """
+        results = json.dumps({field: getattr(self, field) for field in self.ARCHIVED_FIELDS})
+        self.delete_archive()
+        self.archive.save(f'{self.pk}.json.gz', ContentFile(gzip.compress(results.encode('utf-8'))), save=False)
+        for field in self.ARCHIVED_FIELDS:
+            setattr(self, field, None)
+        self.archived_at = timezone.now()
+        self.save(update_fields=[*self.ARCHIVED_FIELDS, 'archive', 'archived_at', 'updated_at'])
+
+    def rehydrate(self):
+        """
+        Loads archived results (in memory only), so that an archived simulation can be used as normal.
+        """
+        if self.archive:
+            with self.archive.open('rb') as file:
+                results = json.loads(gzip.decompress(file.read()).decode('utf-8'))
+            for field, value in results.items():
+                setattr(self, field, value)
+        return self
+
+    def delete_archive(self):
+        """
+        Deletes the archive file (if any), e.g. when the simulation is restarted.
+        """
+        if self.archive:
+            self.archive.delete(save=False)
+        self.archived_at = None
+
 
 class SimulationIonCurrentParam(models.Model):
     """
@@ -151,13 +258,129 @@ class CompoundConcentrationPoint(models.Model):
         return str(self.simulation) + " - " + str(self.concentration)
 
 
+class SimulationSummary(models.Model):
+    """
+    Key results of a successful simulation in typed, indexed columns, so that simulations can be filtered and ranked
+    by them in the database. Derived from the results when the simulation completes (see `summary.summarise`).
+    """
+    simulation = models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=Simulation, primary_key=True,
+                                      related_name='summary')
+    control_apd90 = models.FloatField(blank=True, null=True, help_text="(in ms) APD90 without compound.")
+    max_delta_apd90 = models.FloatField(blank=True, null=True, db_index=True,
+                                        help_text="(in %) Largest (median) change in APD90 over the concentrations.")
+    max_delta_apd90_concentration = models.FloatField(blank=True, null=True,
+                                                      help_text="(in µM) Concentration with the largest change in "
+                                                                "APD90.")
+    min_qnet = models.FloatField(blank=True, null=True, db_index=True,
+                                 help_text="(in C/F) Smallest (median) qNet over the concentrations.")
+    peak_pkpd_apd90 = models.FloatField(blank=True, null=True, db_index=True,
+                                        help_text="(in ms) Largest (median) APD90 over the PK timepoints.")
+    peak_pkpd_timepoint = models.FloatField(blank=True, null=True,
+                                            help_text="(in h) PK timepoint with the largest APD90.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.simulation)
+
+
+class SimulationSummaryConcentration(models.Model):
+    """
+    Results of a successful simulation at a given compound concentration, for filtering and ranking simulations by
+    their results at that concentration.
+    """
+    summary = models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=SimulationSummary,
+                                related_name='concentrations')
+    concentration = models.FloatField(help_text="(in µM)")
+    apd90 = models.FloatField(blank=True, null=True, help_text="(in ms)")
+    delta_apd90 = models.FloatField(blank=True, null=True, help_text="(in %) Median change in APD90.")
+    qnet = models.FloatField(blank=True, null=True, help_text="(in C/F) Median qNet.")
+
+    class Meta:
+        ordering = ('concentration', )
+        unique_together = ('summary', 'concentration')
+        indexes = [models.Index(fields=('concentration', 'delta_apd90'), name='summary_conc_delta_apd90'),
+                   models.Index(fields=('concentration', 'qnet'), name='summary_conc_qnet')]
+
+    def __str__(self):
+        return str(self.summary) + " - " + str(self.concentration)
+
+
+class SimulationSpreadsheet(models.Model):
+    """
+    The spreadsheet (.xlsx) export of a successful simulation, built in the background when the simulation completes
+    (see the build_spreadsheets command) and served as a (protected) media file.
+    A spreadsheet without file is queued to be built.
+    """
+    simulation = models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=Simulation, primary_key=True,
+                                      related_name='spreadsheet')
+    result_version = models.CharField(max_length=255, help_text="The result version (see Simulation.result_version) "
+                                                                "the spreadsheet is built from.")
+    file = models.FileField(blank=True, upload_to='spreadsheets/')
+    queued_at = models.DateTimeField(default=timezone.now, db_index=True)
+    built_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return str(self.simulation)
+
+    @property
+    def author_id(self):
+        # the owner of the file in the media file index
+        return self.simulation.author_id
+
+
 @receiver(models.signals.post_delete, sender=Simulation)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
     """
-    Deletes file from filesystem
-    when corresponding `Simulation` object is deleted.
+    Deletes files from filesystem
+    when corresponding `Simulation` object is deleted
+    (uploaded PK data only if no other objects refer to it).
+    """
+    MediaFile.release(instance, instance.PK_data)
+    if instance.STDOUT:
+        instance.STDOUT.delete(save=False)
+    if instance.archive:
+        instance.archive.delete(save=False)
+
+
+@receiver(models.signals.pre_save, sender=Simulation)
+def check_PK_data_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Remembers whether the PK data file changes (so that the media file index is only updated when it does) and the
+    name of a newly uploaded PK data file, which is stored under its content address.
+    """
+    instance._uploaded_name = uploaded_name(instance.PK_data)
+    if instance._uploaded_name or not instance.pk:
+        instance._PK_data_changed = True
+    elif update_fields is not None:
+        instance._PK_data_changed = 'PK_data' in update_fields
+    else:
+        old_name = Simulation.objects.filter(pk=instance.pk).values_list('PK_data', flat=True).first()
+        instance._PK_data_changed = old_name != (instance.PK_data.name or '')
+
+
+@receiver(models.signals.post_save, sender=Simulation)
+def update_media_index(sender, instance, **kwargs):
+    """
+    Updates the media file index when a `Simulation` object is created or its PK data changes.
+    """
+    if instance._PK_data_changed:
+        MediaFile.update_index(instance, instance.PK_data, original_name=instance._uploaded_name)
+
+
+@receiver(models.signals.post_delete, sender=Simulation)
+def remove_from_media_index(sender, instance, **kwargs):
+    """
+    Removes the file from the media file index when the corresponding `Simulation` object is deleted.
     """
-    if instance.PK_data:
-        if os.path.isfile(instance.PK_data.path):
-            os.remove(instance.PK_data.path)
+    MediaFile.remove_from_index(instance)
 
+
+@receiver(models.signals.post_delete, sender=SimulationSpreadsheet)
+def delete_spreadsheet_file(sender, instance, **kwargs):
+    """
+    Deletes the spreadsheet file and its media file index entry when the spreadsheet is deleted
+    (e.g. when the simulation is restarted or deleted).
+    """
+    if instance.file:
+        instance.file.delete(save=False)
+    MediaFile.remove_from_index(instance)
@@ -0,0 +1,104 @@
+"""
+Runtime prediction for simulations, learned from the runtimes of successful simulations.
+Simulations are grouped by model, maximum pacing time, number of concentrations and whether uncertainty spreads are
+given (which makes ApPredict compute confidence intervals). The prediction is the median runtime of the group, or for
+groups with too few samples, the median runtime per unit of work (pacing time x concentrations) of the model.
+"""
+from collections import defaultdict, namedtuple
+from statistics import median
+from time import monotonic
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef
+
+from .models import Simulation, SimulationIonCurrentParam
+
+
+class Features(namedtuple('Features', ('model', 'pacing_time', 'concentrations', 'uncertainty'))):
+    @property
+    def work(self):
+        return self.pacing_time * max(self.concentrations, 1)
+
+
+def concentration_count(pk_or_concs, intermediate_point_count, points):
+    if pk_or_concs == Simulation.PkOptions.compound_concentration_range:
+        return int(intermediate_point_count or 0) + 2
+    if pk_or_concs == Simulation.PkOptions.compound_concentration_points:
+        return points
+    return 0  # pharmacokinetics: the number of concentrations depends on the PK data file
+
+
+def features(sim):
+    """
+    The features of a (saved) simulation the runtime is predicted from.
+    """
+    points = sim.compoundconcentrationpoint_set.count() \
+        if sim.pk_or_concs == Simulation.PkOptions.compound_concentration_points else 0
+    uncertainty = SimulationIonCurrentParam.objects.filter(simulation=sim, spread_of_uncertainty__gt=0).exists()
+    return Features(sim.model_id, sim.maximum_pacing_time,
+                    concentration_count(sim.pk_or_concs, sim.intermediate_point_count, points), uncertainty)
+
+
+def history(limit):
+    """
+    (features, runtime in seconds) of the most recent successful simulations.
+    The runtime is measured from the submission (or creation, for simulations from before submission times were
+    recorded) until the simulation finished (or last reported progress).
+    """
+    uncertainty = SimulationIonCurrentParam.objects.filter(simulation=OuterRef('pk'), spread_of_uncertainty__gt=0)
+    sims = Simulation.objects.filter(status=Simulation.Status.SUCCESS)\
+        .annotate(points=Count('compoundconcentrationpoint'), uncertainty=Exists(uncertainty))\
+        .order_by('-created_at')\
+        .values_list('model', 'maximum_pacing_time', 'pk_or_concs', 'intermediate_point_count', 'points',
+                     'uncertainty', 'created_at', 'started_at', 'ap_predict_last_update', 'finished_at')[:limit]
+    for (model, pacing_time, pk_or_concs, intermediate_point_count, points, uncertainty, created_at, started_at,
+         last_update, finished_at) in sims:
+        runtime = ((finished_at or last_update) - (started_at or created_at)).total_seconds()
+        if runtime > 0:
+            yield Features(model, pacing_time, concentration_count(pk_or_concs, intermediate_point_count, points),
+                           uncertainty), runtime
+
+
+class RuntimeEstimator:
+    """
+    Predicts simulation runtimes (in seconds) from the given (features, runtime) history.
+    """
+    def __init__(self, history, min_samples=3):
+        runtimes, rates = defaultdict(list), defaultdict(list)
+        for sim_features, runtime in history:
+            runtimes[sim_features].append(runtime)
+            rates[(sim_features.model, sim_features.uncertainty)].append(runtime / sim_features.work)
+            rates[(None, sim_features.uncertainty)].append(runtime / sim_features.work)
+        self.samples = {key: len(values) for key, values in runtimes.items()}
+        self.runtimes = {key: median(values) for key, values in runtimes.items() if len(values) >= min_samples}
+        self.rates = {key: median(values) for key, values in rates.items() if len(values) >= min_samples}
+
+    def estimate(self, sim_features):
+        """
+        The predicted runtime, or None if there isn't enough history to go by.
+        """
+        if sim_features in self.runtimes:
+            return self.runtimes[sim_features]
+        for key in ((sim_features.model, sim_features.uncertainty), (None, sim_features.uncertainty)):
+            if key in self.rates:
+                return self.rates[key] * sim_features.work
+        return None
+
+
+_estimator, _fitted_at = None, None
+
+
+def estimator():
+    """
+    The runtime estimator, fitted on the recent history and refitted every RUNTIME_ESTIMATOR_REFIT seconds.
+    """
+    global _estimator, _fitted_at
+    if _estimator is None or monotonic() - _fitted_at >= settings.RUNTIME_ESTIMATOR_REFIT:
+        _estimator = RuntimeEstimator(history(settings.RUNTIME_ESTIMATOR_HISTORY),
+                                      min_samples=settings.RUNTIME_ESTIMATOR_MIN_SAMPLES)
+        _fitted_at = monotonic()
+    return _estimator
+
+
+def estimate(sim):
+    return estimator().estimate(features(sim))
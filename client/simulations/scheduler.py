@@ -0,0 +1,121 @@
+"""
+Fair-share scheduling of simulation submissions.
+Submitted simulations are queued and released to the AP manager while there is capacity: at most
+SIMULATION_MAX_RUNNING simulations run at the same time overall and at most SIMULATION_MAX_RUNNING_PER_USER per user
+(or the user's own max_running_simulations). Queued simulations are released in weighted fair order, so that a user
+submitting many simulations doesn't starve other users, and admins can override the order with simulation priorities.
+"""
+from collections import Counter, defaultdict, deque
+from heapq import heappop, heappush
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import runtime
+from .models import Simulation
+
+
+# simulations taking up capacity (NOT_STARTED simulations are being submitted)
+ACTIVE_STATUSES = (Simulation.Status.NOT_STARTED, Simulation.Status.INITIALISING, Simulation.Status.RUNNING)
+
+
+def queue(sim):
+    """
+    Adds the simulation to the queue, it is started once the scheduler releases it (see `claim`).
+    """
+    sim.status = Simulation.Status.QUEUED
+    sim.progress = 'Queued'
+    sim.queued_at = timezone.now()
+    sim.estimated_runtime = runtime.estimate(sim)
+    sim.save()
+
+
+def user_limit(user):
+    """
+    The maximum number of running simulations for the user (0 = no limit).
+    """
+    if user.max_running_simulations is not None:
+        return user.max_running_simulations
+    return settings.SIMULATION_MAX_RUNNING_PER_USER
+
+
+def is_large(sim):
+    """
+    Whether the simulation is predicted to take long enough to go in the lane for large simulations.
+    """
+    return bool(settings.SIMULATION_LARGE_RUNTIME) and sim.estimated_runtime is not None and \
+        sim.estimated_runtime >= settings.SIMULATION_LARGE_RUNTIME
+
+
+def fair_order(queued, running):
+    """
+    Orders queued simulations by weighted fair queueing: the next simulation is taken from the user using the smallest
+    share of the capacity, relative to their weight, counting both running simulations and those taken before.
+    Priorities (set by admins) go first, users' simulations are taken in order of priority and submission time.
+    """
+    per_user = defaultdict(deque)
+    for sim in sorted(queued, key=lambda sim: (-sim.priority, sim.queued_at, sim.pk)):
+        per_user[sim.author_id].append(sim)
+    taken = Counter(running)
+
+    def key(user_pk):
+        sim = per_user[user_pk][0]
+        return (-sim.priority, taken[user_pk] / sim.author.simulation_weight, sim.queued_at, sim.pk)
+
+    heap = []
+    for user_pk in per_user:
+        heappush(heap, (key(user_pk), user_pk))
+    while heap:
+        _, user_pk = heappop(heap)
+        yield per_user[user_pk].popleft()
+        taken[user_pk] += 1
+        if per_user[user_pk]:
+            heappush(heap, (key(user_pk), user_pk))
+
+
+def claim(skip_locked=False):
+    """
+    Takes the queued simulations that can be started now off the queue (marking them NOT_STARTED) and returns them,
+    the caller starts them. The progress of simulations still waiting shows their position in the queue.
+    With `skip_locked`, nothing is claimed (rather than waiting) while another scheduler holds (part of) the queue.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # lock the queue, so that schedulers in other processes don't release the same simulations
+        queued = list(Simulation.objects.select_for_update(of=('self',), skip_locked=skip_locked)
+                      .select_related('author').filter(status=Simulation.Status.QUEUED))
+        if skip_locked and len(queued) != Simulation.objects.filter(status=Simulation.Status.QUEUED).count():
+            return []
+        if not queued:
+            return []
+        running = Counter({row['author']: row['count'] for row in Simulation.objects
+                           .filter(status__in=ACTIVE_STATUSES).values('author').annotate(count=Count('pk'))})
+        capacity = settings.SIMULATION_MAX_RUNNING - sum(running.values()) if settings.SIMULATION_MAX_RUNNING \
+            else len(queued)
+        large_capacity = len(queued)
+        if settings.SIMULATION_LARGE_RUNTIME and settings.SIMULATION_MAX_RUNNING_LARGE:
+            large_capacity = settings.SIMULATION_MAX_RUNNING_LARGE - Simulation.objects.filter(
+                status__in=ACTIVE_STATUSES, estimated_runtime__gte=settings.SIMULATION_LARGE_RUNTIME).count()
+
+        released, waiting, changed = [], [], []
+        for sim in fair_order(queued, running):
+            limit = user_limit(sim.author)
+            large = is_large(sim)
+            if capacity > 0 and (not limit or running[sim.author_id] < limit) and (not large or large_capacity > 0):
+                sim.status = Simulation.Status.NOT_STARTED
+                running[sim.author_id] += 1
+                capacity -= 1
+                large_capacity -= large
+                released.append(sim)
+            else:
+                waiting.append(sim)
+                progress = f'Queued (position {len(waiting)})'
+                if sim.progress == progress:
+                    continue
+                sim.progress = progress
+            sim.updated_at = now
+            changed.append(sim)
+        Simulation.objects.bulk_update(changed, ['status', 'progress', 'updated_at'])
+    return released
@@ -0,0 +1,91 @@
+"""
+Summary metrics of simulation results in typed, indexed columns (rather than the strings in the results' JSON), so
+that simulations can be filtered and ranked by their results in a single database query.
+Values ApPredict could not compute (reported as +/-DBL_MAX or as text) are stored as NULL.
+"""
+import math
+
+from django.db import transaction
+
+from .models import (
+    CompoundConcentrationPoint,
+    Simulation,
+    SimulationSummary,
+    SimulationSummaryConcentration,
+)
+
+
+UNASSIGNED = 1.0e+200
+
+
+def number(value):
+    """
+    The value as float, or None if it isn't a (computed) number.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) and abs(value) < UNASSIGNED else None
+
+
+def median(values):
+    """
+    The median of a list of percentiles (ApPredict lists them in order, or only gives the median).
+    """
+    return number(values[len(values) // 2]) if values else None
+
+
+def concentration_results(sim):
+    """
+    (concentration, APD90, median delta APD90, median qNet) of the simulation, for the same concentrations as shown
+    on the graphs.
+    """
+    if not sim.voltage_results:
+        return {}
+    requested = None
+    if sim.pk_or_concs == Simulation.PkOptions.compound_concentration_points:
+        requested = set(CompoundConcentrationPoint.objects.filter(simulation=sim)
+                        .values_list('concentration', flat=True))
+    q_net = sim.q_net or []
+    results = {}
+    for i, v_res in enumerate(sim.voltage_results[1:]):
+        concentration = number(v_res['c'])
+        if concentration is None or (requested and concentration not in requested):
+            continue
+        qnet = median(q_net[i]['qnet'].split(',')) if i < len(q_net) else None
+        results[concentration] = (concentration, number(v_res.get('a90')), median(v_res.get('da90', [])), qnet)
+    return results
+
+
+@transaction.atomic
+def summarise(sim):
+    """
+    (Re)creates the summary of a successful simulation's results (archived results need to be loaded first,
+    see `Simulation.rehydrate`).
+    """
+    SimulationSummary.objects.filter(simulation=sim).delete()
+    summary = SimulationSummary(simulation=sim)
+    results = sorted(concentration_results(sim).values())
+    if results and results[0][0] == 0:
+        summary.control_apd90 = results[0][1]
+
+    delta_apd90 = [(delta_apd90, conc) for conc, _, delta_apd90, _ in results if delta_apd90 is not None]
+    if delta_apd90:
+        summary.max_delta_apd90, summary.max_delta_apd90_concentration = max(delta_apd90)
+    summary.min_qnet = min((qnet for *_, qnet in results if qnet is not None), default=None)
+
+    if sim.pkpd_results:
+        pkpd = [(median(res['apd90'] if isinstance(res['apd90'], list) else [res['apd90']]), number(res['timepoint']))
+                for res in sim.pkpd_results]
+        pkpd = [(apd90, timepoint) for apd90, timepoint in pkpd if apd90 is not None]
+        if pkpd:
+            summary.peak_pkpd_apd90, summary.peak_pkpd_timepoint = max(pkpd)
+    summary.save()
+
+    SimulationSummaryConcentration.objects.bulk_create(
+        SimulationSummaryConcentration(summary=summary, concentration=conc, apd90=apd90, delta_apd90=delta_apd90,
+                                       qnet=qnet)
+        for conc, apd90, delta_apd90, qnet in results
+    )
+    return summary
@@ -0,0 +1,111 @@
+"""
+Generators for synthetic (but realistically shaped) simulation results, in the format returned by the AP manager.
+Used for benchmarking and load testing with large simulations. Values are pseudo random, but deterministic for a
+given seed.
+"""
+import math
+import random
+
+
+PERCENTILES = (95, 86, 68, 38)
+PKPD_COLUMNS = 30
+
+
+def fmt(value):
+    return f'{value:.6g}'
+
+
+def da90_header(percentiles=PERCENTILES):
+    """
+    The names of the Δ APD90 columns, lower percentiles first, e.g. dAp95%low, ..., median_delta_APD90, ... dAp95%upp.
+    Without percentiles (no uncertainty) there is a single delta_APD90(%) column.
+    """
+    if not percentiles:
+        return ['delta_APD90(%)']
+    return ([f'dAp{p}%low' for p in percentiles] + ['median_delta_APD90'] +
+            [f'dAp{p}%upp' for p in reversed(percentiles)])
+
+
+def concentrations(count, minimum=0.001, maximum=100):
+    """
+    Log spaced concentrations (as strings), starting with 0.
+    """
+    step = math.log10(maximum / minimum) / max(count - 2, 1)
+    return ['0'] + [fmt(minimum * 10 ** (i * step)) for i in range(count - 1)]
+
+
+def spread(rng, median, width, count):
+    """
+    count values spread symmetrically (low to high) around the median.
+    """
+    half = count // 2
+    low = sorted(median - width * rng.random() * (i + 1) / half for i in range(half)) if half else []
+    high = sorted(median + width * rng.random() * (i + 1) / half for i in range(half)) if half else []
+    return low + [median] * (count % 2) + high
+
+
+def q_net(concs, percentiles=PERCENTILES, seed=0):
+    rng = random.Random(seed)
+    count = len(da90_header(percentiles))
+    return [{'c': c, 'qnet': ','.join(fmt(v) for v in spread(rng, 0.069 - 0.0001 * i, 0.002, count))}
+            for i, c in enumerate(concs)]
+
+
+def voltage_results(concs, percentiles=PERCENTILES, seed=0):
+    rng = random.Random(seed)
+    header = da90_header(percentiles)
+    results = [{'c': 'Concentration(uM)', 'pv': 'PeakVm(mV)', 'uv': 'UpstrokeVelocity(mV/ms)', 'a50': 'APD50(ms)',
+                'a90': 'APD90(ms)', 'da90': header}]
+    for i, c in enumerate(concs):
+        apd90 = 289.8 + 2 * i
+        results.append({'c': c, 'pv': fmt(41.6 - 0.1 * i), 'uv': fmt(240.3 - 0.5 * i), 'a50': fmt(apd90 - 53.2),
+                        'a90': fmt(apd90), 'da90': [fmt(v) for v in spread(rng, 0.7 * i, 0.1 * i, len(header))]})
+    return results
+
+
+def voltage_traces(concs, trace_length=1000, seed=0):
+    """
+    Action potential shaped traces, one per concentration, with trace_length (time, voltage) points.
+    """
+    rng = random.Random(seed)
+    traces = []
+    for i, c in enumerate(concs):
+        series = []
+        for j in range(trace_length):
+            time = round(-5 + 0.1 * j, 1)
+            value = -88 if time <= 0 else -88 + 128 * math.exp(-time / (300 + 5 * i)) * min(time, 1)
+            series.append({'name': time, 'value': round(value + rng.gauss(0, 0.01), 4)})
+        traces.append({'name': c, 'series': series})
+    return traces
+
+
+def pkpd_results(timepoints=100, columns=PKPD_COLUMNS, seed=0):
+    """
+    APD90 at each timepoint (hours), for the given number of concentration columns (as in the PK data).
+    """
+    rng = random.Random(seed)
+    return [{'timepoint': fmt(t + 1), 'apd90': [fmt(650 + 10 * col + rng.random()) for col in range(columns)]}
+            for t in range(timepoints)]
+
+
+def pk_data(timepoints=100, columns=PKPD_COLUMNS, seed=0):
+    """
+    A PK data (tsv) file: a strictly increasing time column followed by concentration columns.
+    """
+    rng = random.Random(seed)
+    return ''.join('\t'.join([fmt(0.1 * (t + 1))] + [fmt(rng.random() * 10) for _ in range(columns)]) + '\n'
+                   for t in range(timepoints))
+
+
+def simulation_results(concentration_count=20, trace_length=1000, percentiles=PERCENTILES, timepoints=0,
+                       pkpd_columns=PKPD_COLUMNS, seed=0):
+    """
+    The result of each AP manager results command (q_net, voltage_traces, voltage_results, pkpd_results, messages)
+    for a synthetic simulation. With timepoints set, pkpd results are generated as for a simulation with PK data.
+    """
+    concs = concentrations(concentration_count)
+    return {'q_net': q_net(concs, percentiles, seed),
+            'voltage_traces': voltage_traces(concs, trace_length, seed),
+            'voltage_results': voltage_results(concs, percentiles, seed),
+            'pkpd_results': pkpd_results(timepoints, pkpd_columns, seed) if timepoints else [],
+            'messages': []}
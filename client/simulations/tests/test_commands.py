@@ -1,10 +1,15 @@
+import datetime
 import os
 import re
 
 import pytest
 from django.conf import settings
-from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.utils import timezone
 from files.models import IonCurrent
+from simulations.backup import read_manifest
 from simulations.models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
 
 
@@ -119,3 +124,111 @@ class TestCommandLineSimulationCreate:
         with pytest.raises(ValueError, match='Invalid intermediate_point_count'):
             call_command('start_simulation', 'my title', logged_in_user.email, "O'Hara-Rudy-CiPA",
                          '--intermediate_point_count=100')
+
+
+@pytest.mark.django_db
+def test_benchmark_result_storage(simulation_range, capsys):
+    simulation_range.q_net = [{'c': str(i), 'qnet': '0.0608'} for i in range(100)]
+    simulation_range.save()
+    call_command('benchmark_result_storage', '--count=10')
+    output = capsys.readouterr().out
+    assert 'Table simulations_simulation:' in output
+    assert re.search(r'q_net: json \d\.\d KB, stored 0\.\d KB \(ratio \d+\.\d\)', output)
+    assert 'voltage_traces: json 0.0 KB, stored 0.0 KB (ratio 0.0)' in output
+    assert re.search(r'STDOUT: stored \d+\.\d KB \(compressed files\)', output)
+    assert 'Loaded 1 simulations in' in output
+
+
+@pytest.mark.django_db
+def test_archive_simulations(simulation_range, simulation_points, other_user, capsys, settings):
+    for sim in (simulation_range, simulation_points):
+        sim.status = Simulation.Status.SUCCESS
+        sim.q_net = [{'c': str(i), 'qnet': '0.0608'} for i in range(100)]
+        sim.save()
+    Simulation.objects.filter(pk=simulation_range.pk).update(created_at=timezone.now() - datetime.timedelta(days=40))
+
+    settings.SIMULATION_ARCHIVE_AFTER_DAYS = 0
+    call_command('archive_simulations')
+    assert 'Archiving is disabled' in capsys.readouterr().out
+
+    call_command('archive_simulations', '--days=30', '--dry_run')
+    assert 'Would archive 1 simulations' in capsys.readouterr().out
+    assert not Simulation.objects.get(pk=simulation_range.pk).archive
+
+    call_command('archive_simulations', '--days=30', '--min_size=100')
+    assert 'Archived 0 simulations' in capsys.readouterr().out
+    call_command('archive_simulations', '--days=30', f'--user={other_user.email}')
+    assert 'Archived 0 simulations' in capsys.readouterr().out
+
+    call_command('archive_simulations', '--days=30', f'--user={simulation_range.author.email}')
+    assert 'Archived 1 simulations' in capsys.readouterr().out
+    archived = Simulation.objects.get(pk=simulation_range.pk)
+    assert archived.archive and archived.q_net is None
+    assert archived.rehydrate().q_net == simulation_range.q_net
+    assert Simulation.objects.get(pk=simulation_points.pk).q_net == simulation_points.q_net
+
+    # already archived
+    call_command('archive_simulations', '--days=30')
+    assert 'Archived 0 simulations' in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_backup_and_restore_simulations(simulation_range, simulation_pkdata, capsys, tmp_path):
+    simulation_range.q_net = [{'c': str(i), 'qnet': '0.0608'} for i in range(100)]
+    simulation_range.save()
+    simulation_pkdata.PK_data = default_storage.save(simulation_pkdata.PK_data.name, ContentFile(b'0\t1.0\n1\t2.0\n'))
+    simulation_pkdata.save()
+    params = SimulationIonCurrentParam.objects.filter(simulation=simulation_range).count()
+    destination = str(tmp_path / 'backup')
+
+    call_command('backup_simulations', destination, '--workers=2')
+    output = capsys.readouterr().out
+    assert re.search(r'Backed up 2 simulations and 1 cellml models to \S+\.json \(\d+ new chunks', output)
+    first_manifest = sorted(os.listdir(os.path.join(destination, 'manifests')))[0]
+    # results that weren't computed are recorded as such
+    assert set(read_manifest(destination, first_manifest)['simulations'][str(simulation_pkdata.pk)]['results']
+               .values()) == {None}
+
+    # nothing changed
+    call_command('backup_simulations', destination)
+    output = capsys.readouterr().out
+    assert 'Backed up 0 simulations and 1 cellml models' in output
+    assert '(0 new chunks, 0.00 MB)' in output
+
+    # only the changed record is stored again, not the (unchanged) results
+    Simulation.objects.get(pk=simulation_pkdata.pk).delete()
+    title = simulation_range.title
+    simulation_range.title = 'new title'
+    simulation_range.save()
+    call_command('backup_simulations', destination)
+    output = capsys.readouterr().out
+    assert 'Backed up 1 simulations and 1 cellml models' in output
+    assert '(1 new chunks' in output
+
+    Simulation.objects.all().delete()
+    assert not default_storage.exists(simulation_pkdata.PK_data.name)
+
+    # latest backup, without the deleted simulation
+    call_command('restore_simulations', destination)
+    assert 'Restored 1 simulations and 1 cellml models' in capsys.readouterr().out
+    sim = Simulation.objects.get(pk=simulation_range.pk)
+    assert sim.title == 'new title'
+    assert sim.q_net == simulation_range.q_net
+    assert sim.version_info == simulation_range.version_info
+    assert SimulationIonCurrentParam.objects.filter(simulation=sim).count() == params
+    with sim.open_stdout() as stdout, simulation_range.open_stdout() as original:
+        assert stdout.read() == original.read()
+
+    # earlier backup
+    call_command('restore_simulations', destination, f'--manifest={first_manifest}')
+    assert 'Restored 2 simulations and 1 cellml models' in capsys.readouterr().out
+    assert Simulation.objects.get(pk=simulation_range.pk).title == title
+    # results that weren't there are restored as NULL
+    assert Simulation.objects.filter(pk=simulation_pkdata.pk, q_net__isnull=True).exists()
+    with default_storage.open(Simulation.objects.get(pk=simulation_pkdata.pk).PK_data.name) as file:
+        assert file.read() == b'0\t1.0\n1\t2.0\n'
+
+
+def test_restore_simulations_no_backup(tmp_path):
+    with pytest.raises(CommandError, match='No backup found'):
+        call_command('restore_simulations', str(tmp_path))
@@ -0,0 +1,174 @@
+import csv
+import importlib.util
+import io
+import zipfile
+
+import pandas
+import pyarrow.parquet
+import pytest
+from asgiref.sync import async_to_sync
+from simulations import export
+from simulations.export import TIDY_COLUMNS, ordered_results, tidy_rows
+from simulations.summary import summarise
+from simulations.views import build_spreadsheet, queue_spreadsheet
+
+
+@pytest.fixture
+def sims(settings, media_root, load_results, simulation_range, simulation_points, simulation_pkdata, other_user):
+    settings.SIMULATION_EXPORT_WORKERS = 2
+    summarise(load_results(simulation_range, call_id='828b142a-9ecc-11ec-b909-0242ac120002'))
+    summarise(load_results(simulation_points))
+    simulation_pkdata.author = other_user  # only the user's own, successful simulations are exported
+    summarise(load_results(simulation_pkdata))
+    return simulation_range, simulation_points
+
+
+async def read_async(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+def test_ordered_results():
+    consumed = []
+
+    def items():
+        for i in range(10):
+            consumed.append(i)
+            yield i
+
+    results = ordered_results(lambda item: item * 2, items(), 3)
+    assert next(results) == (0, 0)
+    assert len(consumed) == 3  # no more than workers items are in progress
+    assert list(results) == [(i, i * 2) for i in range(1, 10)]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSimulationExportView:
+    def test_login_required(self, client):
+        assert client.get('/simulations/export').status_code == 302
+
+    def test_zip(self, logged_in_user, client, sims, simulation_pkdata):
+        sim_range, sim_points = sims
+        # a stored spreadsheet is used as is
+        spreadsheet = queue_spreadsheet(sim_range)
+        build_spreadsheet(spreadsheet)
+        spreadsheet.refresh_from_db()
+
+        response = client.get('/simulations/export?order=delta_apd90')
+        assert response['Content-Type'] == 'application/zip'
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        assert archive.namelist() == [f'AP-Portal_{sim_range.pk}.xlsx', f'AP-Portal_{sim_points.pk}.xlsx',
+                                      'summaries.csv']
+        with spreadsheet.file.open('rb') as file:
+            assert archive.read(f'AP-Portal_{sim_range.pk}.xlsx') == file.read()
+        sheets = pandas.read_excel(io.BytesIO(archive.read(f'AP-Portal_{sim_points.pk}.xlsx')), sheet_name=None,
+                                   engine='openpyxl')
+        assert len(sheets) == 6
+
+        rows = list(csv.DictReader(io.StringIO(archive.read('summaries.csv').decode())))
+        assert [int(row['Simulation id']) for row in rows] == [sim_range.pk, sim_points.pk]
+        assert rows[0]['Max ΔAPD90 (%)'] == '738.545'
+
+    def test_asgi(self, user, async_client, sims):
+        # under ASGI the zip file is streamed (rather than collected in memory by django)
+        sim_range, sim_points = sims
+        async_client.force_login(user)
+        response = async_to_sync(async_client.get)('/simulations/export')
+        assert response.is_async
+        archive = zipfile.ZipFile(io.BytesIO(async_to_sync(read_async)(response)))
+        assert set(archive.namelist()) == {f'AP-Portal_{sim_range.pk}.xlsx', f'AP-Portal_{sim_points.pk}.xlsx',
+                                           'summaries.csv'}
+
+    def test_selection(self, logged_in_user, client, sims, simulation_pkdata):
+        sim_range, _ = sims
+        response = client.get('/simulations/export', {'pk': [sim_range.pk, simulation_pkdata.pk]})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        assert archive.namelist() == [f'AP-Portal_{sim_range.pk}.xlsx', 'summaries.csv']
+
+        assert client.get('/simulations/export?pk=abc').status_code == 400
+        assert client.get('/simulations/export?min_qnet=abc').status_code == 400
+
+    def test_workbook(self, logged_in_user, client, sims):
+        sim_range, sim_points = sims
+        response = client.get('/simulations/export?format=xlsx&concentration=100')
+        assert response['Content-Disposition'] == 'attachment; filename="AP-Portal_simulations.xlsx"'
+        sheets = pandas.read_excel(io.BytesIO(b''.join(response.streaming_content)), sheet_name=None,
+                                   engine='openpyxl')
+        assert list(sheets) == ['Summary', 'Concentrations']
+        assert list(sheets['Summary']['Simulation id']) == [sim_range.pk]
+        assert sheets['Summary']['Control APD90 (ms)'][0] == 289.823
+        concentrations = sheets['Concentrations']
+        assert len(concentrations) == 11
+        assert list(concentrations.iloc[-1][['Concentration (µM)', 'ΔAPD90 (%)']]) == [100, 738.545]
+
+
+@pytest.mark.django_db
+def test_tidy_rows(simulation_range, load_results):
+    sim = load_results(simulation_range)
+    rows = list(tidy_rows(sim))
+    assert len(rows) == 11 * (4 + 9 + 9) + 4 + sum(len(trace['series']) for trace in sim.voltage_traces)
+    assert (sim.pk, 'apd90', 0.0, None, None, None, None, 289.823) in rows
+    assert (sim.pk, 'delta_apd90', 100.0, 'median_delta_APD90', None, None, None, 738.545) in rows
+    assert (sim.pk, 'qnet', 0.0, 'dAp95%low', None, None, None, None) in rows  # unassigned
+    assert (sim.pk, 'pkpd_apd90', None, None, 1, 2.0, None, 684.294) in rows
+    assert (sim.pk, 'voltage', 0.0, None, None, None, 0.1, -80.095) in rows
+
+
+@pytest.mark.django_db
+class TestSimulationResultsView:
+    def test_single(self, logged_in_user, client, simulation_range, load_results):
+        sim = load_results(simulation_range)
+        response = client.get(f'/simulations/{sim.pk}/results')
+        assert response['Content-Type'] == 'application/gzip'
+        assert response['Content-Disposition'] == f'attachment; filename="AP-Portal_{sim.pk}_results.csv.gz"'
+        table = pandas.read_csv(io.BytesIO(b''.join(response.streaming_content)), compression='gzip')
+        assert list(table.columns) == list(TIDY_COLUMNS)
+        assert len(table) == len(list(tidy_rows(sim)))
+        assert table[table.metric == 'apd90'].value.iloc[0] == 289.823
+
+    def test_single_access(self, other_user, client, simulation_range):
+        assert client.get(f'/simulations/{simulation_range.pk}/results').status_code == 302
+        client.login(username=other_user.email, password='password')
+        assert client.get(f'/simulations/{simulation_range.pk}/results').status_code == 403
+        assert client.get('/simulations/0/results').status_code == 404
+
+    def test_selection(self, logged_in_user, client, simulation_range, simulation_points, simulation_pkdata,
+                       load_results):
+        summarise(load_results(simulation_range))
+        summarise(load_results(simulation_points))
+        response = client.get('/simulations/results', {'pk': [simulation_range.pk, simulation_pkdata.pk]})
+        assert response['Content-Disposition'] == 'attachment; filename="AP-Portal_results.csv.gz"'
+        table = pandas.read_csv(io.BytesIO(b''.join(response.streaming_content)), compression='gzip')
+        assert set(table.simulation) == {simulation_range.pk}
+
+        response = client.get('/simulations/results?order=delta_apd90')
+        table = pandas.read_csv(io.BytesIO(b''.join(response.streaming_content)), compression='gzip')
+        assert set(table.simulation) == {simulation_range.pk, simulation_points.pk}
+
+        assert client.get('/simulations/results?format=xml').status_code == 400
+        assert client.get('/simulations/results?min_qnet=abc').status_code == 400
+
+    def test_parquet(self, logged_in_user, client, simulation_range, load_results, monkeypatch):
+        monkeypatch.setattr(export, 'ROW_GROUP_SIZE', 1000)
+        sim = load_results(simulation_range)
+        response = client.get(f'/simulations/{sim.pk}/results?format=parquet')
+        assert response['Content-Disposition'] == f'attachment; filename="AP-Portal_{sim.pk}_results.parquet"'
+        content = list(response.streaming_content)
+        assert len(content) > 2  # streamed per row group
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(b''.join(content)))
+        assert parquet_file.metadata.num_row_groups == len(content)
+        table = parquet_file.read().to_pandas()
+        assert list(table.columns) == list(TIDY_COLUMNS)
+        assert len(table) == len(list(tidy_rows(sim)))
+        assert table[table.metric == 'apd90'].value.iloc[0] == 289.823
+
+    def test_asgi(self, user, async_client, simulation_range, load_results):
+        sim = load_results(simulation_range)
+        async_client.force_login(user)
+        response = async_to_sync(async_client.get)(f'/simulations/{sim.pk}/results')
+        assert response.is_async
+        table = pandas.read_csv(io.BytesIO(async_to_sync(read_async)(response)), compression='gzip')
+        assert len(table) == len(list(tidy_rows(sim)))
+
+    def test_parquet_unavailable(self, logged_in_user, client, simulation_range, monkeypatch):
+        monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+        assert client.get(f'/simulations/{simulation_range.pk}/results?format=parquet').status_code == 501
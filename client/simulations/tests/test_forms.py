@@ -165,12 +165,13 @@ class TestSimulationForm_and_SimulationEditForm:
         assert form.is_valid()
         sim = form.save()
         assert Simulation.objects.count() == 1
-        assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(sample)))
+        assert os.path.isfile(sim.PK_data.path)
+        assert sim.PK_data.name.startswith('blobs/')
 
         # test deleting model deletes file
         sim.delete()
         assert Simulation.objects.count() == 0
-        assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, str(sample)))
+        assert not os.path.isfile(sim.PK_data.path)
 
     @pytest.mark.django_db
     def test_PK_data_validator(self, range_data, user, tmp_path):
@@ -1,7 +1,14 @@
+import importlib
+import json
 import math
+import os
 
 import pytest
-from files.models import IonCurrent
+from django import forms
+from django.apps import apps
+from django.db import connection
+from files.models import IonCurrent, MediaFile
+from simulations.fields import CompressedJSON, CompressedJSONField
 from simulations.models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
 
 
@@ -107,3 +114,89 @@ def test_CompoundConcentrationPoint(simulation_points):
     assert [pnt.concentration for pnt in CompoundConcentrationPoint.objects.filter(simulation=simulation_points)] ==\
         [24.9197, 25.85, 27.73, 35.8, 41.032, 42.949, 56.20, 62, 67.31, 72.27]
     assert str(CompoundConcentrationPoint.objects.all().first()) == 'my simulation1 - 24.9197'
+
+
+@pytest.mark.django_db
+def test_compressed_results(simulation_range):
+    q_net = [{'c': '0', 'qnet': '0.0608'}, {'c': '0.1', 'qnet': '0.0605'}]
+    simulation_range.q_net = q_net
+    simulation_range.voltage_traces = ''
+    simulation_range.save()
+
+    # stored compressed
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT q_net FROM simulations_simulation WHERE id = %s', [simulation_range.pk])
+        stored = bytes(cursor.fetchone()[0])
+    assert CompressedJSONField.decompress(stored) == q_net
+
+    # only decompressed when accessed
+    sim = Simulation.objects.get(pk=simulation_range.pk)
+    assert isinstance(sim.__dict__['q_net'], CompressedJSON)
+    assert sim.q_net == q_net
+    assert sim.__dict__['q_net'] == q_net
+    assert sim.voltage_traces == ''
+    assert sim.pkpd_results is None
+    assert sim.STDOUT == simulation_range.STDOUT
+
+    # saving doesn't require decompressing
+    sim = Simulation.objects.get(pk=simulation_range.pk)
+    sim.title = 'new title'
+    sim.save()
+    assert isinstance(sim.__dict__['q_net'], CompressedJSON)
+    sim.refresh_from_db()
+    assert sim.title == 'new title'
+    assert sim.q_net == q_net
+
+    # deferred loading
+    sim = Simulation.objects.only('pk').get(pk=simulation_range.pk)
+    assert sim.q_net == q_net
+
+    # forms show json
+    assert isinstance(Simulation._meta.get_field('q_net').formfield(), forms.JSONField)
+    assert json.loads(Simulation._meta.get_field('q_net').value_to_string(sim)) == q_net
+
+
+@pytest.mark.django_db
+def test_archive_results(simulation_range):
+    simulation_range.q_net = [{'c': '0.1', 'qnet': '0.0608'}]
+    simulation_range.pkpd_results = [{'timepoint': '0.1', 'apd90': [100]}]
+    simulation_range.save()
+
+    simulation_range.archive_results()
+    assert simulation_range.archive.name.startswith(f'archive/{simulation_range.pk}.json')
+    assert simulation_range.archived_at is not None
+    sim = Simulation.objects.get(pk=simulation_range.pk)
+    assert all(getattr(sim, field) is None for field in Simulation.ARCHIVED_FIELDS)
+    assert sim.status == simulation_range.status and sim.version_info == simulation_range.version_info
+
+    # loaded transparently (in memory)
+    assert sim.rehydrate() is sim
+    assert sim.q_net == [{'c': '0.1', 'qnet': '0.0608'}]
+    assert sim.pkpd_results == [{'timepoint': '0.1', 'apd90': [100]}]
+    assert sim.voltage_traces is None
+    assert Simulation.objects.get(pk=sim.pk).q_net is None
+
+    # archive is removed with the simulation
+    storage, name = sim.archive.storage, sim.archive.name
+    assert storage.exists(name)
+    sim.delete()
+    assert not storage.exists(name)
+
+
+@pytest.mark.django_db
+def test_move_to_blobs(settings, tmp_path, simulation_pkdata, simulation_range):
+    settings.MEDIA_ROOT = str(tmp_path)
+    (tmp_path / 'pk_data.tsv').write_text('0\t1\n')
+    # a simulation created from a template shares its PK data file
+    Simulation.objects.filter(pk__in=(simulation_pkdata.pk, simulation_range.pk)).update(PK_data='pk_data.tsv')
+    MediaFile.objects.update(file_name='pk_data.tsv')
+    migration = importlib.import_module('simulations.migrations.0012_content_addressed_files')
+    migration.move_to_blobs(apps, None)
+
+    names = set(Simulation.objects.values_list('PK_data', flat=True))
+    assert len(names) == 1
+    new_name = names.pop()
+    assert new_name.startswith('blobs/') and new_name.endswith('.tsv')
+    assert os.path.isfile(tmp_path / new_name)
+    assert not os.path.isfile(tmp_path / 'pk_data.tsv')
+    assert set(MediaFile.objects.values_list('file_name', flat=True)) == {new_name}
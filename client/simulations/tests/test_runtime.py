@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+import pytest
+from core.metrics import SimulationStatusCollector
+from django.core.management import call_command
+from django.utils import timezone
+from simulations import runtime
+from simulations.models import Simulation
+from simulations.runtime import Features, RuntimeEstimator
+from simulations.views import StatusSimulationView
+
+
+@pytest.fixture
+def fresh_estimator(monkeypatch):
+    monkeypatch.setattr(runtime, '_estimator', None)
+
+
+def test_estimator():
+    small, large = Features(1, 5, 6, False), Features(1, 10, 6, False)
+    estimator = RuntimeEstimator([(small, 100), (small, 110), (small, 300), (large, 200)], min_samples=3)
+    assert estimator.samples == {small: 3, large: 1}
+    assert estimator.estimate(small) == 110  # median of the group
+    # too few samples: predicted by the model's median runtime per unit of work (pacing time x concentrations)
+    assert estimator.estimate(large) == pytest.approx(3.5 * 60)
+    assert estimator.estimate(Features(2, 5, 6, False)) == pytest.approx(3.5 * 30)  # any model
+    assert estimator.estimate(Features(1, 5, 6, True)) is None  # nothing with uncertainty spreads
+
+
+@pytest.mark.django_db
+def test_features(simulation_range, simulation_points, simulation_pkdata):
+    assert runtime.features(simulation_range) == Features(simulation_range.model_id, 5, 6, True)
+    assert runtime.features(simulation_points).concentrations == simulation_points.compoundconcentrationpoint_set\
+        .count()
+    assert runtime.features(simulation_pkdata).concentrations == 0
+
+
+@pytest.mark.django_db
+def test_history(settings, fresh_estimator, simulation_range, simulation_points):
+    now = timezone.now()
+    Simulation.objects.filter(pk=simulation_range.pk).update(status=Simulation.Status.SUCCESS, started_at=now,
+                                                             finished_at=now + timedelta(seconds=90))
+    # older simulations have no submission / finish times
+    Simulation.objects.filter(pk=simulation_points.pk).update(status=Simulation.Status.SUCCESS,
+                                                              ap_predict_last_update=now + timedelta(days=1))
+    simulation_points.refresh_from_db()
+    history = dict(runtime.history(10))
+    assert history[runtime.features(simulation_range)] == 90
+    assert history[runtime.features(simulation_points)] == \
+        (simulation_points.ap_predict_last_update - simulation_points.created_at).total_seconds()
+
+    settings.RUNTIME_ESTIMATOR_MIN_SAMPLES = 1
+    assert runtime.estimate(simulation_range) == 90
+    assert runtime.estimator() is runtime.estimator()  # refitted only every RUNTIME_ESTIMATOR_REFIT seconds
+
+
+@pytest.mark.django_db
+def test_eta(simulation_range):
+    assert StatusSimulationView.eta(simulation_range) is None
+    simulation_range.status = Simulation.Status.RUNNING
+    simulation_range.started_at = timezone.now()
+    simulation_range.estimated_runtime = 60
+    assert StatusSimulationView.eta(simulation_range) == \
+        (simulation_range.started_at + timedelta(seconds=60)).isoformat()
+
+    simulation_range.save()
+    metrics = {metric.name: metric for metric in SimulationStatusCollector().collect()}
+    running = [sample for sample in metrics['simulations_predicted_runtime_seconds'].samples
+               if sample.labels == {'status': 'RUNNING'}]
+    assert running[0].value == 60
+
+
+@pytest.mark.django_db
+def test_command(simulation_range, capsys):
+    now = timezone.now()
+    Simulation.objects.filter(pk=simulation_range.pk).update(status=Simulation.Status.SUCCESS, started_at=now,
+                                                             finished_at=now + timedelta(seconds=90))
+    call_command('runtime_estimates', '--min_samples=1')
+    output = capsys.readouterr().out.split('\n')
+    assert output[1].split()[-5:] == ['5', '6', 'yes', '1', '90']
+    assert output[2].startswith('all models (with spreads): 3.0 s per minute of pacing per concentration')
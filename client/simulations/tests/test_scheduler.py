@@ -0,0 +1,192 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from simulations import scheduler
+from simulations.models import Simulation
+from simulations.views import release_simulations
+
+
+@pytest.fixture
+def queue(simulation_recipe, o_hara_model):
+    start = timezone.now()
+
+    def make(author, count=1, **kwargs):
+        return [simulation_recipe.make(author=author, model=o_hara_model, status=Simulation.Status.QUEUED,
+                                       queued_at=start + timedelta(seconds=Simulation.objects.count()), **kwargs)
+                for _ in range(count)]
+    return make
+
+
+@pytest.fixture
+def limits(settings):
+    settings.SIMULATION_MAX_RUNNING = 0
+    settings.SIMULATION_MAX_RUNNING_PER_USER = 0
+    return settings
+
+
+@pytest.mark.django_db
+def test_queue(simulation_range):
+    scheduler.queue(simulation_range)
+    simulation_range.refresh_from_db()
+    assert simulation_range.status == Simulation.Status.QUEUED
+    assert simulation_range.progress == 'Queued'
+    assert simulation_range.queued_at is not None
+
+
+@pytest.mark.django_db
+def test_fair_order(queue, user, other_user):
+    heavy = queue(user, 3)
+    light = queue(other_user)
+    assert list(scheduler.fair_order(heavy + light, {})) == [heavy[0], light[0], heavy[1], heavy[2]]
+    # running simulations count towards a user's share
+    assert list(scheduler.fair_order(heavy + light, {user.pk: 2})) == [light[0], heavy[0], heavy[1], heavy[2]]
+
+    # priorities (set by admins) go first
+    urgent = queue(user, priority=1)
+    assert list(scheduler.fair_order(heavy + light + urgent, {}))[0] == urgent[0]
+
+
+@pytest.mark.django_db
+def test_weights(queue, user, other_user):
+    user_sims, other_sims = queue(user, 3), queue(other_user, 3)
+    assert list(scheduler.fair_order(user_sims + other_sims, {})) == \
+        [user_sims[0], other_sims[0], user_sims[1], other_sims[1], user_sims[2], other_sims[2]]
+
+    user.simulation_weight = 2
+    user.save()
+    user_sims = list(Simulation.objects.filter(author=user).select_related('author').order_by('pk'))
+    assert list(scheduler.fair_order(user_sims + other_sims, {})) == \
+        [user_sims[0], other_sims[0], user_sims[1], user_sims[2], other_sims[1], other_sims[2]]
+
+
+@pytest.mark.django_db
+def test_claim(limits, queue, user, other_user, simulation_range):
+    assert scheduler.claim() == []
+    limits.SIMULATION_MAX_RUNNING = 3
+    limits.SIMULATION_MAX_RUNNING_PER_USER = 1
+    simulation_range.status = Simulation.Status.RUNNING  # already running for user
+    simulation_range.save()
+    heavy = queue(user, 2)
+    light = queue(other_user, 2)
+    assert scheduler.claim() == [light[0]]
+
+    statuses = {sim.pk: (sim.status, sim.progress) for sim in Simulation.objects.all()}
+    assert statuses[light[0].pk][0] == Simulation.Status.NOT_STARTED
+    assert statuses[heavy[0].pk] == (Simulation.Status.QUEUED, 'Queued (position 1)')
+    assert statuses[light[1].pk] == (Simulation.Status.QUEUED, 'Queued (position 2)')
+    assert statuses[heavy[1].pk] == (Simulation.Status.QUEUED, 'Queued (position 3)')
+
+    # the user's own limit overrides the default, the total is still limited
+    user.max_running_simulations = 0
+    user.save()
+    assert scheduler.claim() == [heavy[0]]
+    assert Simulation.objects.get(pk=light[1].pk).progress == 'Queued (position 1)'
+    assert Simulation.objects.get(pk=heavy[1].pk).progress == 'Queued (position 2)'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_claim_skip_locked(limits, queue, user, other_user):
+    queued = queue(user)[0]
+    other_queued = queue(other_user)[0]
+    locked, done = threading.Event(), threading.Event()
+
+    def lock():
+        with transaction.atomic():
+            Simulation.objects.select_for_update().get(pk=queued.pk)
+            locked.set()
+            done.wait(10)
+        connection.close()
+
+    thread = threading.Thread(target=lock)
+    thread.start()
+    try:
+        assert locked.wait(10)
+        assert scheduler.claim(skip_locked=True) == []
+        assert Simulation.objects.get(pk=other_queued.pk).status == Simulation.Status.QUEUED
+    finally:
+        done.set()
+        thread.join()
+    assert scheduler.claim(skip_locked=True) == [queued, other_queued]
+
+
+@pytest.mark.django_db
+def test_release(limits, queue, user, simulation_range, httpx_mock):
+    limits.SIMULATION_MAX_RUNNING = 1
+    simulation_range.status = Simulation.Status.RUNNING
+    simulation_range.save()
+    queued = queue(user)[0]
+    release_simulations()
+    assert Simulation.objects.get(pk=queued.pk).status == Simulation.Status.QUEUED
+
+    simulation_range.status = Simulation.Status.SUCCESS
+    simulation_range.save()
+    httpx_mock.add_response(json={'success': {'id': '828b142a-9ecc-11ec-b909-0242ac120002'}})
+    release_simulations()
+    queued.refresh_from_db()
+    assert queued.status == Simulation.Status.INITIALISING
+    assert queued.ap_predict_call_id == '828b142a-9ecc-11ec-b909-0242ac120002'
+
+
+@pytest.mark.django_db
+def test_restart_queues(limits, logged_in_user, client, simulation_range, simulation_points):
+    limits.SIMULATION_MAX_RUNNING = 1
+    simulation_points.status = Simulation.Status.RUNNING
+    simulation_points.save()
+    client.get(f'/simulations/{simulation_range.pk}/restart', HTTP_REFERER='http://domain/simulations')
+    simulation_range.refresh_from_db()
+    assert simulation_range.status == Simulation.Status.QUEUED
+    assert simulation_range.progress == 'Queued (position 1)'
+
+    # queued simulations aren't polled, but the status shows their position
+    response = client.get(f'/simulations/status/false/{simulation_range.pk}')
+    assert response.json() == [{'pk': simulation_range.pk, 'progress': 'Queued (position 1)',
+                                'status': Simulation.Status.QUEUED, 'eta': None, 'version': None,
+                                'spreadsheet': None}]
+
+
+@pytest.mark.django_db
+def test_poll_releases_on_finish(limits, logged_in_user, client, queue, simulation_range, httpx_mock,
+                                 monkeypatch):
+    claims = []
+    monkeypatch.setattr(scheduler, 'claim', lambda skip_locked=False: claims.append(skip_locked) or [])
+    simulation_range.status = Simulation.Status.RUNNING
+    simulation_range.ap_predict_call_id = '828b142a-9ecc-11ec-b909-0242ac120002'
+    simulation_range.save()
+    queue(logged_in_user)
+
+    # polls don't touch the queue while simulations are still running
+    httpx_mock.add_response(json={'success': '50% completed'})
+    client.get(f'/simulations/status/false/{simulation_range.pk}')
+    assert claims == []
+
+    # but release queued simulations (if the queue isn't locked) when one finished
+    httpx_mock.add_response(json={'error': 'failed'})
+    client.get(f'/simulations/status/false/{simulation_range.pk}')
+    assert Simulation.objects.get(pk=simulation_range.pk).status == Simulation.Status.FAILED
+    assert claims == [True]
+
+
+@pytest.mark.django_db
+def test_schedule_command(limits, fake_ap_manager, queue, user, capsys):
+    queued = queue(user, 2)
+    call_command('schedule_simulations')
+    assert capsys.readouterr().out == '0 simulations queued.\n'
+    assert {sim.status for sim in Simulation.objects.all()} == {Simulation.Status.INITIALISING}
+
+    call_command('schedule_simulations')  # the (fake) simulations finished
+    assert {sim.status for sim in Simulation.objects.all()} == {Simulation.Status.SUCCESS}
+    assert len(fake_ap_manager.runs) == len(queued)
+
+
+@pytest.mark.django_db
+def test_large_lane(limits, queue, user, other_user):
+    limits.SIMULATION_LARGE_RUNTIME = 600
+    limits.SIMULATION_MAX_RUNNING_LARGE = 1
+    large = queue(user, 2, estimated_runtime=3600)
+    small = queue(other_user, estimated_runtime=60)
+    assert scheduler.claim() == [large[0], small[0]]
+    assert Simulation.objects.get(pk=large[1].pk).status == Simulation.Status.QUEUED
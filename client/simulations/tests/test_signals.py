@@ -4,6 +4,7 @@ import uuid
 
 import pytest
 from django.conf import settings
+from files.models import MediaFile
 from simulations.models import Simulation
 
 
@@ -38,3 +39,23 @@ def test_auto_delete_file_on_delete_no_file_set(simulation_range):
     assert not simulation_range.PK_data
     simulation_range.delete()
     assert Simulation.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_media_index_only_updated_on_change(simulation_pkdata, django_assert_num_queries):
+    entry = MediaFile.objects.get(source='Simulation', source_pk=simulation_pkdata.pk)
+    assert entry.file_name == simulation_pkdata.PK_data.name
+
+    # progress updates don't touch the index
+    simulation_pkdata.progress = '50% completed'
+    with django_assert_num_queries(2):  # checking the PK data and saving
+        simulation_pkdata.save()
+    with django_assert_num_queries(1):
+        simulation_pkdata.save(update_fields=['progress'])
+
+    simulation_pkdata.PK_data = 'other_pk_data.tsv'
+    simulation_pkdata.save()
+    assert MediaFile.objects.get(pk=entry.pk).file_name == 'other_pk_data.tsv'
+    simulation_pkdata.PK_data = ''
+    simulation_pkdata.save()
+    assert not MediaFile.objects.filter(source='Simulation').exists()
@@ -0,0 +1,134 @@
+import io
+import os
+
+import pandas
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from files.models import MediaFile
+from simulations.models import Simulation, SimulationSpreadsheet
+from simulations.views import build_spreadsheet, queue_spreadsheet
+
+
+CALL_ID = '828b142a-9ecc-11ec-b909-0242ac120002'
+
+
+@pytest.fixture
+def sim_results(simulation_range, media_root, load_results):
+    return load_results(simulation_range, call_id=CALL_ID)
+
+
+def check_spreadsheet(content):
+    check_file_path = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'all_data.xlsx')
+    sheets = list(range(6))
+    response_df = pandas.read_excel(io.BytesIO(content), sheet_name=sheets, engine='openpyxl')
+    check_df = pandas.read_excel(check_file_path, sheet_name=sheets, engine='openpyxl')
+    for sheet in sheets:
+        assert str(response_df[sheet]) == str(check_df[sheet])
+
+
+@pytest.mark.django_db
+def test_built_on_download(logged_in_user, client, sim_results):
+    response = client.get(f'/simulations/{sim_results.pk}/spreadsheet')
+    file_name = f'spreadsheets/{sim_results.pk}/{CALL_ID}/AP-Portal_{sim_results.pk}.xlsx'
+    assert response.status_code == 302
+    assert response.url == f'/media/{file_name}'
+    spreadsheet = SimulationSpreadsheet.objects.get()
+    assert (spreadsheet.result_version, spreadsheet.file.name) == (CALL_ID, file_name)
+
+    # served as (protected) media file
+    response = client.get(response.url)
+    assert response['Content-Disposition'] == f'attachment; filename="AP-Portal_{sim_results.pk}.xlsx"'
+    check_spreadsheet(b''.join(response.streaming_content))
+
+    # and not rebuilt
+    client.get(f'/simulations/{sim_results.pk}/spreadsheet')
+    assert SimulationSpreadsheet.objects.get().built_at == spreadsheet.built_at
+    response = client.get(f'/simulations/status/true/{sim_results.pk}')
+    assert response.json()[0]['spreadsheet'] == 'ready'
+
+
+@pytest.mark.django_db
+def test_media_access(other_user, client, sim_results):
+    spreadsheet = queue_spreadsheet(sim_results)
+    assert build_spreadsheet(spreadsheet)
+    client.login(username=other_user.email, password='password')
+    assert client.get(f'/media/{spreadsheet.file.name}').status_code == 403
+
+
+@pytest.mark.django_db
+def test_worker(settings, logged_in_user, client, sim_results, capsys):
+    settings.SIMULATION_SPREADSHEET_WORKER = True
+    response = client.get(f'/simulations/{sim_results.pk}/spreadsheet')
+    assert response.status_code == 202
+    assert 'being prepared' in response.content.decode()
+    response = client.get(f'/simulations/status/true/{sim_results.pk}')
+    assert response.json()[0]['spreadsheet'] == 'preparing'
+
+    call_command('build_spreadsheets')
+    assert capsys.readouterr().out == 'Built 1 spreadsheets.\n'
+    response = client.get(f'/simulations/{sim_results.pk}/spreadsheet')
+    assert response.status_code == 302
+    check_spreadsheet(b''.join(client.get(response.url).streaming_content))
+
+
+@pytest.mark.django_db
+def test_build_all(sim_results, simulation_points, capsys):
+    call_command('build_spreadsheets', '--all')
+    assert capsys.readouterr().out == 'Built 1 spreadsheets.\n'
+    assert SimulationSpreadsheet.objects.get().simulation == sim_results
+    call_command('build_spreadsheets', '--all')
+    assert capsys.readouterr().out == 'Built 0 spreadsheets.\n'
+
+
+@pytest.mark.django_db
+def test_restart(logged_in_user, client, sim_results, httpx_mock):
+    spreadsheet = queue_spreadsheet(sim_results)
+    build_spreadsheet(spreadsheet)
+    path = spreadsheet.file.path
+    assert os.path.isfile(path)
+    assert MediaFile.objects.filter(file_name=spreadsheet.file.name).exists()
+
+    httpx_mock.add_response(json={'success': {'id': '3c4aa6c6-9ecc-11ec-b909-0242ac120002'}})
+    client.get(f'/simulations/{sim_results.pk}/restart', HTTP_REFERER='http://domain/simulations')
+    assert not SimulationSpreadsheet.objects.exists()
+    assert not os.path.isfile(path)
+    assert not MediaFile.objects.filter(file_name=spreadsheet.file.name).exists()
+
+    # a spreadsheet queued for earlier results is not built
+    assert not build_spreadsheet(SimulationSpreadsheet(simulation=sim_results, result_version=CALL_ID))
+
+
+@pytest.mark.django_db
+def test_edit(settings, logged_in_user, client, sim_results):
+    spreadsheet = queue_spreadsheet(sim_results)
+    build_spreadsheet(spreadsheet)
+    path = spreadsheet.file.path
+
+    client.post(f'/simulations/{sim_results.pk}/edit', data={'title': 'new title', 'notes': sim_results.notes})
+    assert not SimulationSpreadsheet.objects.exists()
+    assert not os.path.isfile(path)
+    # a build started before the edit is not stored
+    assert not build_spreadsheet(spreadsheet)
+
+    response = client.get(client.get(f'/simulations/{sim_results.pk}/spreadsheet').url)
+    sheet = pandas.read_excel(io.BytesIO(b''.join(response.streaming_content)), sheet_name='Input Values',
+                              header=None, engine='openpyxl')
+    assert sheet.iloc[0, 1] == 'new title'
+
+    settings.SIMULATION_SPREADSHEET_WORKER = True
+    client.post(f'/simulations/{sim_results.pk}/edit', data={'title': 'newer title', 'notes': sim_results.notes})
+    assert not SimulationSpreadsheet.objects.get().file
+
+
+@pytest.mark.django_db
+def test_queued_on_completion(settings, fake_ap_manager, simulation_range, media_root):
+    settings.SIMULATION_MAX_RUNNING = 0
+    settings.SIMULATION_MAX_RUNNING_PER_USER = 0
+    settings.SIMULATION_SPREADSHEET_WORKER = True
+    Simulation.objects.filter(pk=simulation_range.pk).update(status=Simulation.Status.QUEUED)
+    call_command('schedule_simulations')
+    call_command('schedule_simulations')
+    spreadsheet = SimulationSpreadsheet.objects.get()
+    assert spreadsheet.result_version == Simulation.objects.get(pk=simulation_range.pk).ap_predict_call_id
+    assert not spreadsheet.file
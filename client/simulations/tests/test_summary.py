@@ -0,0 +1,146 @@
+import csv
+import io
+
+import pytest
+from django.core.management import call_command
+from simulations.models import CompoundConcentrationPoint, Simulation, SimulationSummary
+from simulations.summary import number, summarise
+
+
+@pytest.fixture
+def sim_results(simulation_range, load_results):
+    return load_results(simulation_range)
+
+
+@pytest.fixture
+def sim_points_results(simulation_points, load_results):
+    CompoundConcentrationPoint.objects.filter(simulation=simulation_points).delete()
+    for conc in (1, 3):
+        CompoundConcentrationPoint.objects.create(simulation=simulation_points, concentration=conc)
+    return load_results(simulation_points, q_net='q_net_points.txt', voltage_results='voltage_results_points.txt')
+
+
+def test_number():
+    assert number('0.0674568') == 0.0674568
+    assert number('1.79769e+308') is None
+    assert number('-1.79769e+308') is None
+    assert number('NoActionPotential_1') is None
+    assert number(None) is None
+
+
+@pytest.mark.django_db
+def test_summarise(sim_results):
+    summary = summarise(sim_results)
+    assert summary.control_apd90 == 289.823
+    assert (summary.max_delta_apd90, summary.max_delta_apd90_concentration) == (738.545, 100)
+    assert summary.min_qnet == -0.0165214  # the qNet at 100µM is unassigned
+    assert (summary.peak_pkpd_apd90, summary.peak_pkpd_timepoint) == (710.012, 3)
+
+    concentrations = list(summary.concentrations.values_list('concentration', 'apd90', 'delta_apd90', 'qnet'))
+    assert len(concentrations) == 11
+    assert concentrations[2] == (0.00359381, 290.895, 0.369733, 0.0694645)
+    assert concentrations[-1] == (100, 2430.3, 738.545, None)
+
+    # re-summarising replaces the summary
+    summarise(sim_results)
+    assert SimulationSummary.objects.get().concentrations.count() == 11
+
+
+@pytest.mark.django_db
+def test_summarise_points(sim_points_results):
+    summary = summarise(sim_points_results)
+    # only the requested concentrations, as on the graphs
+    assert list(summary.concentrations.values_list('concentration', 'delta_apd90', 'qnet')) == \
+        [(1, 41.4075, 0.0435409), (3, 82.603, 0.0253105)]
+    assert summary.control_apd90 is None
+    assert summary.max_delta_apd90 == 82.603
+    assert summary.peak_pkpd_apd90 is None
+
+
+@pytest.mark.django_db
+def test_summarise_command(sim_results, simulation_points, capsys):
+    sim_results.archive_results()
+    call_command('summarise_simulations')
+    assert capsys.readouterr().out == 'Summarised 1 simulations.\n'
+    assert SimulationSummary.objects.get(simulation=sim_results).max_delta_apd90 == 738.545
+
+    call_command('summarise_simulations')
+    assert capsys.readouterr().out == 'Summarised 0 simulations.\n'
+    call_command('summarise_simulations', '--all')
+    assert capsys.readouterr().out == 'Summarised 1 simulations.\n'
+
+
+@pytest.mark.django_db
+class TestFilters:
+    @pytest.fixture
+    def summarised(self, sim_results, sim_points_results):
+        summarise(sim_results)
+        summarise(sim_points_results)
+        return sim_results, sim_points_results
+
+    def test_list(self, logged_in_user, client, summarised, simulation_pkdata):
+        sim_range, sim_points = summarised
+        response = client.get('/simulations/')
+        assert list(response.context['object_list']) == [simulation_pkdata, sim_points, sim_range]
+
+        response = client.get('/simulations/?min_delta_apd90=100')
+        assert list(response.context['object_list']) == [sim_range]
+
+        response = client.get('/simulations/?order=qnet')
+        assert list(response.context['object_list']) == [sim_range, sim_points, simulation_pkdata]
+
+        # at a given concentration
+        response = client.get('/simulations/?concentration=3&order=delta_apd90')
+        assert [(sim, sim.delta_apd90) for sim in response.context['object_list']] == [(sim_points, 82.603)]
+        response = client.get('/simulations/?concentration=100&max_delta_apd90=1000')
+        assert list(response.context['object_list']) == [sim_range]
+
+        # invalid filters are ignored
+        response = client.get('/simulations/?min_qnet=abc')
+        assert len(response.context['object_list']) == 3
+        assert response.context['filter_form'].errors
+
+    def test_export(self, logged_in_user, other_user, client, summarised):
+        sim_range, sim_points = summarised
+        summarised[0].author = other_user  # only the user's own simulations
+        summarised[0].save()
+        response = client.get('/simulations/summary?order=delta_apd90')
+        assert response.status_code == 200
+        data = response.json()
+        assert [row['pk'] for row in data] == [sim_points.pk]
+        assert data[0]['max_delta_apd90'] == data[0]['delta_apd90'] == 82.603
+        assert data[0]['model'] == str(sim_points.model).rsplit(' (', 1)[0]
+
+        sim_range.author = logged_in_user
+        sim_range.save()
+        response = client.get('/simulations/summary?format=csv&order=delta_apd90')
+        assert response['Content-Type'] == 'text/csv'
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert [int(row['pk']) for row in rows] == [sim_range.pk, sim_points.pk]
+        assert rows[0]['min_qnet'] == '-0.0165214'
+
+        assert client.get('/simulations/summary?min_qnet=abc').status_code == 400
+
+    def test_export_login_required(self, client):
+        response = client.get('/simulations/summary')
+        assert response.status_code == 302
+
+
+@pytest.mark.django_db
+def test_summarised_on_completion(settings, fake_ap_manager, simulation_range):
+    settings.SIMULATION_MAX_RUNNING = 0
+    settings.SIMULATION_MAX_RUNNING_PER_USER = 0
+    Simulation.objects.filter(pk=simulation_range.pk).update(status=Simulation.Status.QUEUED)
+    call_command('schedule_simulations')
+    assert not SimulationSummary.objects.exists()
+    call_command('schedule_simulations')
+    assert SimulationSummary.objects.get().simulation == simulation_range
+    assert SimulationSummary.objects.get().concentrations.exists()
+
+
+@pytest.mark.django_db
+def test_restart_removes_summary(logged_in_user, client, sim_results, httpx_mock):
+    summarise(sim_results)
+    httpx_mock.add_response(json={'success': {'id': '828b142a-9ecc-11ec-b909-0242ac120002'}})
+    client.get(f'/simulations/{sim_results.pk}/restart', HTTP_REFERER='http://domain/simulations')
+    assert not SimulationSummary.objects.exists()
@@ -0,0 +1,27 @@
+import jsonschema
+import pytest
+from simulations import synthetic
+from simulations.views import JSON_SCHEMAS
+
+
+@pytest.mark.parametrize('percentiles', [synthetic.PERCENTILES, ()])
+def test_simulation_results(percentiles):
+    results = synthetic.simulation_results(concentration_count=5, trace_length=50, percentiles=percentiles,
+                                           timepoints=3)
+    for command, result in results.items():
+        jsonschema.validate(instance=result, schema=JSON_SCHEMAS[command])
+
+    assert [v['c'] for v in results['voltage_results'][1:]] == [q['c'] for q in results['q_net']]
+    assert results['voltage_results'][0]['da90'] == synthetic.da90_header(percentiles)
+    for v_res, qnet in zip(results['voltage_results'][1:], results['q_net']):
+        assert len(v_res['da90']) == len(qnet['qnet'].split(',')) == len(percentiles) * 2 + 1
+        assert list(map(float, v_res['da90'])) == sorted(map(float, v_res['da90']))
+    assert [len(trace['series']) for trace in results['voltage_traces']] == [50] * 5
+    assert [len(pkpd['apd90']) for pkpd in results['pkpd_results']] == [synthetic.PKPD_COLUMNS] * 3
+
+
+def test_pk_data():
+    lines = [line.split('\t') for line in synthetic.pk_data(timepoints=10, columns=4).splitlines()]
+    assert [len(line) for line in lines] == [5] * 10
+    times = [float(line[0]) for line in lines]
+    assert times == sorted(set(times))
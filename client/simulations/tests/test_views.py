@@ -1,17 +1,25 @@
 import datetime
+import gzip
+import io
 import json
 import os
+import re
 import shutil
 import sys
 import uuid
 
 import httpx
+import numpy
 import pandas
 import pytest
+import xmltodict
 from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from files.models import IonCurrent
+from prometheus_client import REGISTRY
 from simulations import views
 from simulations.models import Simulation
 from simulations.views import (
@@ -19,13 +27,14 @@ from simulations.views import (
     COMPILING_CELLML,
     INITIALISING,
     StatusSimulationView,
+    extract_version_info,
     get_from_api,
     listify,
     save_api_error_sync,
     start_simulation,
     to_float,
     to_int,
-    update_unassigned,
+    update_unassigned_array,
 )
 
 
@@ -92,6 +101,12 @@ def sim_all_data_concentration_points(simulation_range):
     return simulation_range
 
 
+def assert_stdout(sim):
+    data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'STDOUT.txt')
+    with open(data_source_file, encoding='utf-8') as file, sim.open_stdout() as stdout:
+        assert json.loads(file.read())['content'] == stdout.read()
+
+
 @pytest.mark.django_db
 def test_to_int():
     assert to_int(12.4) == 12.4
@@ -140,6 +155,26 @@ class TestGetFromApi:
             assert response == json_data
             assert simulation_range.status == Simulation.Status.NOT_STARTED
 
+    async def test_metrics(self, httpx_mock, simulation_range):
+        sim = await sync_to_async(Simulation)()
+
+        def sample(name, command='progress_status'):
+            return REGISTRY.get_sample_value(name, {'command': command}) or 0
+
+        calls, errors = sample('ap_manager_call_seconds_count'), sample('ap_manager_call_errors_total')
+        response_bytes = sample('ap_manager_response_bytes_sum')
+        httpx_mock.add_response(json={'success': ['Initialising...', '']})
+        httpx_mock.add_response(json={'error': 'some error message'})
+        async with httpx.AsyncClient(timeout=None) as client:
+            await get_from_api(client, 'progress_status', simulation_range)
+            assert sample('ap_manager_call_seconds_count') == calls + 1
+            assert sample('ap_manager_call_errors_total') == errors
+            assert sample('ap_manager_response_bytes_sum') > response_bytes
+
+            await get_from_api(client, 'progress_status', sim)
+            assert sample('ap_manager_call_seconds_count') == calls + 2
+            assert sample('ap_manager_call_errors_total') == errors + 1
+
     async def test_returns_error_msg(self, httpx_mock):
         sim = await sync_to_async(Simulation)()
         json_data = {'error': 'some error message'}
@@ -308,6 +343,54 @@ class TestReStartSimulation:
         simulation_pkdata.delete()
         assert not os.path.isfile(pkd_test_dest_file)
 
+    def test_pharmacokinetics_multipart(self, httpx_mock, simulation_pkdata, settings):
+        settings.AP_PREDICT_MULTIPART_SUBMISSION = True
+        pkd_test_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'small_sample.tsv')
+        pkd_test_dest_file = os.path.join(settings.MEDIA_ROOT, str(simulation_pkdata.PK_data))
+        shutil.copy(pkd_test_source_file, pkd_test_dest_file)
+
+        def check_request(request: httpx.Request):
+            # pk data is sent as a seperate (file) part, call data as json
+            content = request.read()
+            assert request.headers['Content-Type'].startswith('multipart/form-data')
+            assert f'filename="{simulation_pkdata.PK_data}"'.encode() in content
+            assert b'0.1\t1\t1.1\n0.2\t2\t2.1\n' in content
+            assert b'name="PK_data_file"' in content
+            data = content.split(b'name="data"\r\n\r\n')[1].split(b'\r\n')[0]
+            assert json.loads(data) == {'pacingFrequency': 0.05, 'pacingMaxTime': 5, 'modelId': '6'}
+            return httpx.Response(status_code=200, json={'success': {'id': '828b142a-9ecc-11ec-b909-0242ac120002'}})
+
+        httpx_mock.add_callback(check_request)
+        start_simulation(simulation_pkdata)
+        assert simulation_pkdata.ap_predict_call_id == '828b142a-9ecc-11ec-b909-0242ac120002'
+        assert simulation_pkdata.status == Simulation.Status.INITIALISING
+        simulation_pkdata.delete()
+        assert not os.path.isfile(pkd_test_dest_file)
+
+    def test_pharmacokinetics_multipart_fallback(self, httpx_mock, simulation_pkdata, settings):
+        settings.AP_PREDICT_MULTIPART_SUBMISSION = True
+        pkd_test_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'small_sample.tsv')
+        pkd_test_dest_file = os.path.join(settings.MEDIA_ROOT, str(simulation_pkdata.PK_data))
+        shutil.copy(pkd_test_source_file, pkd_test_dest_file)
+
+        def check_request(request: httpx.Request):
+            # older AP manager versions only accept json
+            if request.headers['Content-Type'].startswith('multipart/form-data'):
+                return httpx.Response(status_code=415)
+            assert json.loads(request.content) == {'pacingFrequency': 0.05,
+                                                   'pacingMaxTime': 5,
+                                                   'PK_data_file': '0.1\t1\t1.1\n0.2\t2\t2.1\n',
+                                                   'modelId': '6'}
+            return httpx.Response(status_code=200, json={'success': {'id': '828b142a-9ecc-11ec-b909-0242ac120002'}})
+
+        httpx_mock.add_callback(check_request)
+        httpx_mock.add_callback(check_request)
+        start_simulation(simulation_pkdata)
+        assert simulation_pkdata.ap_predict_call_id == '828b142a-9ecc-11ec-b909-0242ac120002'
+        assert simulation_pkdata.status == Simulation.Status.INITIALISING
+        simulation_pkdata.delete()
+        assert not os.path.isfile(pkd_test_dest_file)
+
     def test_cellml_file(self, httpx_mock, user, cellml_model_recipe, simulation_range):
         assert simulation_range.status == Simulation.Status.NOT_STARTED
         assert simulation_range.ap_predict_call_id == ''
@@ -528,6 +611,34 @@ class TestSimulationCreateView_and_TemplateView:
         assert str([m.message for m in response.context['INFO_MESSAGES']]) == \
             f"['Using existing simulation <em>{simulation_range.title}</em> as a template.']"
 
+    def test_initial_ion_currents(self, logged_in_user, client, simulation_range, cellml_model_recipe):
+        response = client.get(f'/simulations/{simulation_range.pk}/template')
+        initial = response.context['ion_formset'].initial
+        assert [i['ion_current'].name for i in initial] == ['IKr', 'INa', 'ICaL', 'IKs', 'IK1', 'Ito', 'INaL']
+        assert [i['current'] for i in initial] == [4.37, 44.716, 70, 45.3, 41.8, 13.4, 52.1]
+        assert initial[0]['spread_of_uncertainty'] is None
+        assert initial[0]['default_spread_of_uncertainty'] == 0.18
+        assert all(list(i['models']) == [simulation_range.model.pk] for i in initial)
+
+    def test_initial_constant_queries(self, logged_in_user, other_user, client, simulation_range, cellml_model_recipe):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                assert client.get(f'/simulations/{simulation_range.pk}/template').status_code == 200
+            return len(queries)
+
+        num_queries = count_queries()
+        IonCurrent.objects.create(author=logged_in_user, name='ICaT', metadata_tags='membrane_T_type_calcium_current')
+        for model in cellml_model_recipe.make(author=logged_in_user, predefined=False, _quantity=5):
+            model.ion_currents.set(IonCurrent.objects.all())
+        hidden_model = cellml_model_recipe.make(author=other_user, predefined=False)
+        hidden_model.ion_currents.set(IonCurrent.objects.all())
+
+        assert count_queries() == num_queries
+        response = client.get(f'/simulations/{simulation_range.pk}/template')
+        assert hidden_model.pk not in response.context['ion_formset'].initial[0]['models']
+        assert len(response.context['ion_formset'].initial[0]['models']) == 6
+        assert len(response.context['ion_formset'].initial) == 8
+
 
 @pytest.mark.django_db
 class TestSimulationEditView:
@@ -600,6 +711,43 @@ class TestSimulationVersionView:
         assert response.status_code == 200
 
 
+@pytest.mark.django_db
+class TestSimulationStdoutView:
+    def test_non_loged_in_cannot_see(self, user, client, simulation_range):
+        response = client.get(f'/simulations/{simulation_range.pk}/stdout')
+        assert response.status_code == 302
+
+    def test_non_owner_cannot_see(self, other_user, client, simulation_range):
+        client.login(username=other_user.email, password='password')
+        response = client.get(f'/simulations/{simulation_range.pk}/stdout')
+        assert response.status_code == 403
+
+    def test_no_stdout(self, logged_in_user, client, simulation_points):
+        response = client.get(f'/simulations/{simulation_points.pk}/stdout')
+        assert response.status_code == 404
+
+    def test_owner_can_see(self, logged_in_user, client, simulation_range):
+        data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'STDOUT.txt')
+        with open(data_source_file, encoding='utf-8') as file:
+            content = json.loads(file.read())['content']
+
+        response = client.get(f'/simulations/{simulation_range.pk}/stdout')
+        assert response.status_code == 200
+        assert 'Content-Encoding' not in response
+        assert b''.join(response.streaming_content).decode('utf-8') == content
+
+        response = client.get(f'/simulations/{simulation_range.pk}/stdout', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        assert response.status_code == 200
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(b''.join(response.streaming_content)).decode('utf-8') == content
+
+    def test_deleted_with_simulation(self, logged_in_user, simulation_range):
+        storage, name = simulation_range.STDOUT.storage, simulation_range.STDOUT.name
+        assert storage.exists(name)
+        simulation_range.delete()
+        assert not storage.exists(name)
+
+
 @pytest.mark.django_db
 class TestSimulationDeleteView:
     def test_owner_can_delete(self, logged_in_user, client, simulation_range):
@@ -729,6 +877,11 @@ class TestSpreadsheetSimulationView:
         response = client.get(f'/simulations/{sim_all_data.pk}/spreadsheet')
         self.check_xlsx_files(response, tmp_path, 'all_data.xlsx')
 
+    def test_archived(self, logged_in_user, client, sim_all_data, tmp_path):
+        sim_all_data.archive_results()
+        response = client.get(f'/simulations/{sim_all_data.pk}/spreadsheet')
+        self.check_xlsx_files(response, tmp_path, 'all_data.xlsx')
+
     def test_wrong_version_info1(self, logged_in_user, client, simulation_points, tmp_path):
         simulation_points.version_info = {'bla': 'bla'}
         simulation_points.save()
@@ -784,33 +937,226 @@ class TestDataSimulationView:
         response = client.get(f'/simulations/{sim_all_data_points.pk}/data')
         self.check_data_file(response.json(), 'all_data_points.txt')
 
+    def test_archived(self, logged_in_user, client, sim_all_data, tmp_path):
+        sim_all_data.archive_results()
+        response = client.get(f'/simulations/{sim_all_data.pk}/data')
+        self.check_data_file(response.json(), 'all_data.txt')
+
+    def test_binary(self, logged_in_user, client, sim_all_data):
+        json_data = client.get(f'/simulations/{sim_all_data.pk}/data').json()
+        response = client.get(f'/simulations/{sim_all_data.pk}/data?format=binary')
+        assert response['Content-Type'] == 'application/octet-stream'
+        content = response.content
+        header_length = int.from_bytes(content[:4], 'little')
+        assert (4 + header_length) % 8 == 0
+        data = json.loads(content[4:4 + header_length])
+        buffers = content[4 + header_length:]
+        for key in ('adp90', 'qnet', 'pkpd_results', 'traces'):
+            assert len(data[key]) == len(json_data[key])
+            for series, json_series in zip(data[key], json_data[key]):
+                ref = series.pop('data')
+                points = numpy.frombuffer(buffers, dtype=f"<{ref['dtype']}", count=2 * ref['length'],
+                                          offset=ref['offset']).reshape(-1, 2)
+                expected = numpy.array([[to_float(x), to_float(y)] for x, y in json_series.pop('data')])
+                assert series == json_series
+                numpy.testing.assert_allclose(points, expected, rtol=1e-6 if ref['dtype'] == 'f4' else 0)
+        assert data['messages'] == json_data['messages']
+        assert data['adp90_y_scale'] == json_data['adp90_y_scale']
+
+    @pytest.mark.django_db(transaction=True)
+    def test_asgi(self, user, async_client, sim_all_data):
+        async_client.force_login(user)
+        response = async_to_sync(async_client.get)(f'/simulations/{sim_all_data.pk}/data')
+        self.check_data_file(response.json(), 'all_data.txt')
+        assert async_to_sync(async_client.get)('/simulations/0/data').status_code == 404
+
+    def test_chart_non_owner(self, other_user, client, simulation_range):
+        client.login(username=other_user.email, password='password')
+        assert client.get(f'/simulations/{simulation_range.pk}/data/info').status_code == 403
+        assert client.get(f'/simulations/{simulation_range.pk}/data/traces').status_code == 403
+        client.logout()
+        assert client.get(f'/simulations/{simulation_range.pk}/data/adp90').status_code == 302
+
+    def test_info(self, logged_in_user, client, sim_all_data):
+        json_data = client.get(f'/simulations/{sim_all_data.pk}/data').json()
+        info = client.get(f'/simulations/{sim_all_data.pk}/data/info?format=binary').json()
+        assert info['messages'] == json_data['messages']
+        assert info['charts'] == ['adp90', 'qnet', 'pkpd', 'traces']
+        assert len(info['traces']) == len(json_data['traces'])
+        for trace, json_trace in zip(info['traces'], json_data['traces']):
+            assert trace.pop('data') == []
+            assert trace.pop('concentration') in json_trace['label']
+            json_trace.pop('data')
+            assert trace == json_trace
+
+    def test_info_no_results(self, logged_in_user, client, simulation_range):
+        response = client.get(f'/simulations/{simulation_range.pk}/data/info')
+        assert response.json() == {'messages': None, 'charts': [], 'traces': []}
+
+    @pytest.mark.parametrize('chart, keys', [
+        ('adp90', ('adp90', 'adp90_y_scale')),
+        ('qnet', ('qnet', 'qnet_y_scale')),
+        ('pkpd', ('pkpd_results', 'pkpd_results_y_scale')),
+        ('traces', ('traces', )),
+    ])
+    @pytest.mark.parametrize('sim', ['sim_all_data', 'sim_all_data_points'])
+    def test_chart(self, logged_in_user, client, request, sim, chart, keys):
+        sim = request.getfixturevalue(sim)
+        json_data = client.get(f'/simulations/{sim.pk}/data').json()
+        response = client.get(f'/simulations/{sim.pk}/data/{chart}')
+        assert response.json() == {key: json_data[key] for key in keys if key in json_data}
+
+    def test_traces_at_concentrations(self, logged_in_user, client, sim_all_data):
+        traces = client.get(f'/simulations/{sim_all_data.pk}/data/traces').json()['traces']
+        concentrations = [trace['label'].rsplit(' @ ', 1)[1].split()[0] for trace in traces]
+        response = client.get(f'/simulations/{sim_all_data.pk}/data/traces',
+                              {'conc': [concentrations[0], concentrations[-1]]})
+        # the colours are those of the traces in the legend
+        assert response.json()['traces'] == [traces[0], traces[-1]]
+
+    def test_etag(self, logged_in_user, client, sim_all_data):
+        assert 'ETag' not in client.get(f'/simulations/{sim_all_data.pk}/data/info')
+        sim_all_data.ap_predict_call_id = '828b142a-9ecc-11ec-b909-0242ac120002'
+        sim_all_data.save()
+        response = client.get(f'/simulations/{sim_all_data.pk}/data/qnet?format=binary')
+        assert response['ETag'] == '"828b142a-9ecc-11ec-b909-0242ac120002"'
+        response = client.get(f'/simulations/{sim_all_data.pk}/data/qnet?format=binary',
+                              HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == 304
+        assert not response.content
+
+        # a restarted simulation has new results
+        sim_all_data.status = Simulation.Status.RUNNING
+        sim_all_data.save()
+        response = client.get(f'/simulations/{sim_all_data.pk}/data/qnet', HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == 200
+
+    def test_chart_binary(self, logged_in_user, client, sim_all_data):
+        response = client.get(f'/simulations/{sim_all_data.pk}/data/qnet?format=binary')
+        assert response['Content-Type'] == 'application/octet-stream'
+        header_length = int.from_bytes(response.content[:4], 'little')
+        header = json.loads(response.content[4:4 + header_length])
+        assert set(header) == {'qnet', 'qnet_y_scale'}
+        assert len(response.content) == 4 + header_length + sum(16 * series['data']['length']
+                                                                for series in header['qnet'])
+
+
+class TestGraphData:
+    @staticmethod
+    def update_unassigned(unasgn, value):
+        # the original value by value check for unassigned values
+        try:
+            val = float(value)
+        except ValueError:
+            unasgn['unassigned'], unasgn['min_scale'], unasgn['max_scale'] = True, 1.5, 1.5
+            return
+
+        if val <= -1.0e+200:
+            unasgn['unassigned'], unasgn['min_scale'] = True, 1.5
+        elif val >= 1.0e+200:
+            unasgn['unassigned'], unasgn['max_scale'] = True, 1.5
+        else:
+            unasgn['max'], unasgn['min'] = max(unasgn['max'], val), min(unasgn['min'], val)
+
+    @classmethod
+    def add_series_data_loop(cls, series, unasgn, xs, rows):
+        # the original point by point processing
+        for x, row in zip(xs, rows):
+            for i, value in enumerate(row):
+                val = to_float(value)
+                series[i]['data'].append([x, val])
+                cls.update_unassigned(unasgn, val)
+
+    @pytest.mark.parametrize('rows', [
+        [],
+        [['0', '0'], ['1.5', '-2.25']],
+        [['-5', '-6'], ['-1', '-2']],  # the max starts at the smallest positive float
+        [['1.79769e+308', '3'], ['-1.79769e+308', '4']],
+        [['NoActionPotential_1', '3'], ['2', 'nan']],
+        [['1e309', '-3']],
+        [['1', '2'], ['3']],
+    ])
+    def test_same_as_loop(self, rows):
+        def empty():
+            return ([{'id': i, 'data': []} for i in range(2)],
+                    {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
+                     'min_scale': 1.1, 'max_scale': 1.1})
+        xs = [str(i) for i in range(len(rows))]
+        series, unasgn = empty()
+        views.add_series_data(series, unasgn, xs, rows)
+        loop_series, loop_unasgn = empty()
+        self.add_series_data_loop(loop_series, loop_unasgn, xs, rows)
+        assert json.dumps([series, unasgn]) == json.dumps([loop_series, loop_unasgn])
+
+
+class TestExtractVersionInfo:
+    @staticmethod
+    def version_info_regex(content):
+        # the original (whole content) regex based extraction
+        version_info = {}
+        match = re.search(r'(.+)\$CHASTE_TEST_OUTPUT', content, flags=re.DOTALL)
+        if match:
+            version_info['python_versions'] = match.group(1)
+        match = re.search(r'ApPredict args :(.*)', content)
+        if match:
+            version_info['appredict_args'] = match.group(1).replace('--', '\n--').replace(' \n--', '--', 1)
+        match = re.search(r'<ChasteBuildInfo>.*</ChasteBuildInfo>', content, re.DOTALL)
+        if match:
+            version_info['versions'] = xmltodict.parse(match.group(0))['ChasteBuildInfo']
+        return version_info
+
+    def test_stdout(self):
+        data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'STDOUT.txt')
+        with open(data_source_file, encoding='utf-8') as file:
+            content = json.loads(file.read())['content']
+        data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'version_info.txt')
+        with open(data_source_file, encoding='utf-8') as file:
+            assert extract_version_info(io.StringIO(content)) == json.loads(file.read())
+
+    @pytest.mark.parametrize('content', [
+        '',
+        'blabla',
+        '$CHASTE_TEST_OUTPUT',
+        '$CHASTE_TEST_OUTPUT\na\n$CHASTE_TEST_OUTPUT\nb\n',
+        'a$CHASTE_TEST_OUTPUT\nb\n$CHASTE_TEST_OUTPUT c$CHASTE_TEST_OUTPUT\n',
+        'ApPredict args : --model 1 --pacing-freq 1\nApPredict args : --other\n',
+        '<ChasteBuildInfo><a>1</a></ChasteBuildInfo>',
+        'x <ChasteBuildInfo>\n<a>1</a>\n</ChasteBuildInfo> y\n',
+        '</ChasteBuildInfo><ChasteBuildInfo>\n<a>1</a></ChasteBuildInfo>\n',
+        '<ChasteBuildInfo>\n<a><![CDATA[\n</ChasteBuildInfo>\n]]></a>\n</ChasteBuildInfo>\ne\n',
+    ])
+    def test_same_as_regex(self, content):
+        assert extract_version_info(io.StringIO(content)) == self.version_info_regex(content)
+
 
-@pytest.mark.django_db
 class TestUpdate_unassigned:
     @pytest.fixture
     def unassigned_info(self):
         return {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
                 'min_scale': 1.1, 'max_scale': 1.1}
 
+    @staticmethod
+    def update_unassigned(unasgn, *values):
+        update_unassigned_array(unasgn, *views.float_array([values]))
+
     def test_no_val(self, unassigned_info):
-        update_unassigned(unassigned_info, 'NoActionPotential_1')
-        unassigned_info == {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
-                            'min_scale': 1.5, 'max_scale': 1.5}
+        self.update_unassigned(unassigned_info, 'NoActionPotential_1')
+        assert unassigned_info == {'unassigned': True, 'max': sys.float_info.min, 'min': sys.float_info.max,
+                                   'min_scale': 1.5, 'max_scale': 1.5}
 
     def test_smaller(self, unassigned_info):
-        update_unassigned(unassigned_info, -1.0e+201)
-        unassigned_info == {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
-                            'min_scale': 1.5, 'max_scale': 1.1}
+        self.update_unassigned(unassigned_info, -1.0e+201)
+        assert unassigned_info == {'unassigned': True, 'max': sys.float_info.min, 'min': sys.float_info.max,
+                                   'min_scale': 1.5, 'max_scale': 1.1}
 
     def test_larger(self, unassigned_info):
-        update_unassigned(unassigned_info, 1.0e+201)
-        unassigned_info == {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
-                            'min_scale': 1.1, 'max_scale': 1.5}
+        self.update_unassigned(unassigned_info, 1.0e+201)
+        assert unassigned_info == {'unassigned': True, 'max': sys.float_info.min, 'min': sys.float_info.max,
+                                   'min_scale': 1.1, 'max_scale': 1.5}
 
     def test_normal_val(self, unassigned_info):
-        update_unassigned(unassigned_info, -6)
-        update_unassigned(unassigned_info, 25)
-        unassigned_info == {'unassigned': False, 'max': 25, 'min': -6, 'min_scale': 1.1, 'max_scale': 1.1}
+        self.update_unassigned(unassigned_info, -6, 25)
+        assert unassigned_info == {'unassigned': False, 'max': 25, 'min': -6, 'min_scale': 1.1, 'max_scale': 1.1}
 
 
 @pytest.mark.django_db
@@ -834,9 +1180,12 @@ class TestStatusSimulationView:
                str(simulation_pkdata.pk)]
         response = client.get(f"/simulations/status/true/{'/'.join(pks)}/")
         assert response.status_code == 200
-        assert response.json() == [{'pk': simulation_pkdata.pk, 'progress': 'Initialising..', 'status': 'NOT_STARTED'},
-                                   {'pk': sim_all_data_points.pk, 'progress': 'Completed', 'status': 'SUCCESS'},
-                                   {'pk': sim_all_data.pk, 'progress': 'Completed', 'status': 'SUCCESS'}]
+        assert response.json() == [{'pk': simulation_pkdata.pk, 'progress': 'Initialising..', 'status': 'NOT_STARTED',
+                                    'eta': None, 'version': None, 'spreadsheet': None},
+                                   {'pk': sim_all_data_points.pk, 'progress': 'Completed', 'status': 'SUCCESS',
+                                    'eta': None, 'version': None, 'spreadsheet': None},
+                                   {'pk': sim_all_data.pk, 'progress': 'Completed', 'status': 'SUCCESS', 'eta': None,
+                                    'version': None, 'spreadsheet': None}]
 
     def test_progress_nothng_to_update(self, logged_in_user, client, sim_all_data,
                                        sim_all_data_points, sim_all_data_concentration_points):
@@ -844,8 +1193,10 @@ class TestStatusSimulationView:
                str(sim_all_data_points.pk)]
         response = client.get(f"/simulations/status/false/{'/'.join(pks)}/")
         assert response.status_code == 200
-        assert response.json() == [{'pk': sim_all_data_points.pk, 'progress': 'Completed', 'status': 'SUCCESS'},
-                                   {'pk': sim_all_data.pk, 'progress': 'Completed', 'status': 'SUCCESS'}]
+        assert response.json() == [{'pk': sim_all_data_points.pk, 'progress': 'Completed', 'status': 'SUCCESS',
+                                    'eta': None, 'version': None, 'spreadsheet': None},
+                                   {'pk': sim_all_data.pk, 'progress': 'Completed', 'status': 'SUCCESS', 'eta': None,
+                                    'version': None, 'spreadsheet': None}]
 
     def test_progress_calls_update(self, logged_in_user, client, sim_all_data, sim_all_data_points,
                                    sim_all_data_concentration_points, simulation_pkdata, capsys):
@@ -889,11 +1240,10 @@ class TestStatusSimulationView:
 
     def test_update_progress(self, logged_in_user, simulation_points):
         def check_version_info(sim):
-            for command in ('STDOUT', 'version_info'):
-                assert getattr(sim, command)
-                data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', f'{command}.txt')
-                with open(data_source_file, encoding='utf-8') as file:
-                    assert json.loads(file.read()) == getattr(sim, command)
+            assert_stdout(sim)
+            data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', 'version_info.txt')
+            with open(data_source_file, encoding='utf-8') as file:
+                assert json.loads(file.read()) == sim.version_info
 
         view = StatusSimulationView()
 
@@ -927,7 +1277,7 @@ class TestStatusSimulationView:
         assert simulation_points.status == Simulation.Status.RUNNING
         assert not any((simulation_points.q_net, simulation_points.voltage_results,
                         simulation_points.voltage_traces, simulation_points.messages))
-        assert simulation_points.STDOUT == {'success': ['Initialising...', '0% completed', '']}
+        assert not simulation_points.STDOUT
         assert simulation_points.version_info == {}
 
         # stdout saved, but doesn't have a sensible content
@@ -937,7 +1287,8 @@ class TestStatusSimulationView:
         assert simulation_points.status == Simulation.Status.RUNNING
         assert not any((simulation_points.q_net, simulation_points.voltage_results,
                         simulation_points.voltage_traces, simulation_points.messages))
-        assert simulation_points.STDOUT == {'success': True, 'content': 'blabla'}
+        with simulation_points.open_stdout() as stdout:
+            assert stdout.read() == 'blabla'
         assert simulation_points.version_info == {}
 
         # stdout saved properly
@@ -1114,7 +1465,8 @@ class TestStatusSimulationView:
         out, _ = capsys.readouterr()
         assert out == ''
         # check data has been saved to the simulation
-        for command in ('q_net', 'voltage_results', 'voltage_traces', 'STDOUT', 'version_info'):
+        assert_stdout(simulation_range)
+        for command in ('q_net', 'voltage_results', 'voltage_traces', 'version_info'):
             assert getattr(simulation_range, command)
             data_source_file = os.path.join(settings.BASE_DIR, 'simulations', 'tests', f'{command}.txt')
             with open(data_source_file, encoding='utf-8') as file:
@@ -11,6 +11,27 @@ urlpatterns = [
     ),
 
 
+    re_path(
+        r'^results$',
+        views.SimulationResultsView.as_view(),
+        name='results_export',
+    ),
+    re_path(
+        r'^(?P<pk>\d+)/results$',
+        views.SimulationResultsView.as_view(),
+        name='simulation_results_export',
+    ),
+    re_path(
+        r'^export$',
+        views.SimulationExportView.as_view(),
+        name='simulation_export',
+    ),
+    re_path(
+        r'^summary$',
+        views.SimulationSummaryView.as_view(),
+        name='simulation_summary',
+    ),
+
     re_path(
         r'^new$',
         views.SimulationCreateView.as_view(),
@@ -41,6 +62,12 @@ urlpatterns = [
         name='simulation_version',
     ),
 
+    re_path(
+        r'^(?P<pk>\d+)/stdout$',
+        views.SimulationStdoutView.as_view(),
+        name='simulation_stdout',
+    ),
+
     re_path(
         r'^(?P<pk>\d+)/delete$',
         views.SimulationDeleteView.as_view(),
@@ -62,6 +89,11 @@ urlpatterns = [
         views.DataSimulationView.as_view(),
         name='simulation_data',
     ),
+    re_path(
+        r'^(?P<pk>\d+)/data/(?P<chart>info|adp90|qnet|pkpd|traces)$',
+        views.DataSimulationView.as_view(),
+        name='simulation_chart_data',
+    ),
     re_path(
         r'^(?P<pk>\d+)/spreadsheet$',
         views.SpreadsheetSimulationView.as_view(),
@@ -1,45 +1,78 @@
 import asyncio
 import copy
+import csv
+import importlib.util
 import io
-import re
+import json
+import os
+import struct
 import sys
-from itertools import zip_longest
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import chain, zip_longest
 from json.decoder import JSONDecodeError
+from time import perf_counter
 from urllib.parse import urljoin
 
 import httpx
 import jsonschema
+import numpy as np
 import xlsxwriter
 import xmltodict
 from asgiref.sync import async_to_sync, sync_to_async
 from braces.views import UserFormKwargsMixin
+from core import metrics, profiling
+from core.views import AsyncAccessMixin, streaming_content
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import FileResponse, HttpResponseNotFound, JsonResponse
-from django.urls import reverse_lazy
+from django.core.exceptions import PermissionDenied
+from django.core.files.base import ContentFile
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotFound,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.utils.decorators import classonlymethod
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.functional import cached_property
 from django.views.generic import View
-from django.views.generic.base import RedirectView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.views.generic.list import ListView
-from files.models import CellmlModel, IonCurrent
+from files.models import CellmlModel, IonCurrent, MediaFile
 
+from . import export, scheduler
 from .forms import (
     CompoundConcentrationPointFormSet,
     IonCurrentFormSet,
     SimulationEditForm,
+    SimulationFilterForm,
     SimulationForm,
 )
-from .models import CompoundConcentrationPoint, Simulation, SimulationIonCurrentParam
+from .models import (
+    CompoundConcentrationPoint,
+    Simulation,
+    SimulationIonCurrentParam,
+    SimulationSpreadsheet,
+    SimulationSummary,
+)
+from .summary import summarise
 
 
 DONE = '..done!'
 INITIALISING = 'Initialising..'
 COMPILING_CELLML = 'Converting CellML...'
 AP_MANAGER_URL = urljoin(settings.AP_PREDICT_ENDPOINT, 'api/collection/%s/%s')
+# responses indicating the AP manager does not accept multipart submissions
+MULTIPART_UNSUPPORTED = (404, 405, 415)
 JSON_SCHEMAS = {
     'q_net': {'type': 'array',
               'items': {'type': 'object',
@@ -125,11 +158,16 @@ async def get_from_api(client, call, sim):
     Get the result of an API call
     """
     response = {}
+    failed = True
+    start = perf_counter()
     try:
         res = await client.get(AP_MANAGER_URL % (sim.ap_predict_call_id, call), timeout=None)
+        metrics.AP_MANAGER_RESPONSE_BYTES.labels(call).observe(len(res.content))
         response = res.json()
         if 'error' in response:
             await save_api_error(sim, f"API error message: {str(response['error'])}")
+        else:
+            failed = False
     except JSONDecodeError:
         await save_api_error(sim, f'API call: {call} returned invalid JSON.')
     except httpx.HTTPError as e:
@@ -137,18 +175,70 @@ async def get_from_api(client, call, sim):
     except httpx.InvalidURL:
         await save_api_error(sim, f'Inavlid URL {AP_MANAGER_URL % (sim.ap_predict_call_id, call)}.')
     finally:
+        duration = perf_counter() - start
+        metrics.AP_MANAGER_CALL_SECONDS.labels(call).observe(duration)
+        profiling.record_ap_manager_call(duration)
         try:  # validate a succesful result if we have a schema for it
             if 'success' in response and call in JSON_SCHEMAS:
                 jsonschema.validate(instance=response['success'], schema=JSON_SCHEMAS[call])
         except jsonschema.exceptions.ValidationError as e:
+            failed = True
             await save_api_error(sim, f'Result to call {call} failed JSON validation: {e.message}')
         finally:
+            if failed:
+                metrics.AP_MANAGER_CALL_ERRORS.labels(call).inc()
             return response
 
 
-def start_simulation(sim):
+def submission_files(sim):
     """
-    Makes the request to start the simulation.
+    Paths of the input files that need to be sent to start the simulation (keyed by their name in the api call).
+    """
+    files = {}
+    if sim.pk_or_concs == Simulation.PkOptions.pharmacokinetics:  # pk data file
+        files['PK_data_file'] = sim.PK_data.path
+    if not sim.model.ap_predict_model_call:
+        files['cellml_file'] = sim.model.cellml_file.path
+    return files
+
+
+def read_file(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+async def post_json(client, call_data, files):
+    """
+    Start the simulation with a single json body, with the content of the input files embedded as strings.
+    """
+    call_data = dict(call_data)
+    for name, path in files.items():
+        call_data[name] = (await sync_to_async(read_file, thread_sensitive=False)(path)).decode('unicode-escape')
+    return await client.post(settings.AP_PREDICT_ENDPOINT, json=call_data)
+
+
+async def post_multipart(client, call_data, files):
+    """
+    Start the simulation with a multipart body, streaming the input files from disk rather than loading them.
+    The call data is sent as a json encoded `data` field.
+    Falls back to a json body, if the AP manager does not accept multipart submissions.
+    """
+    with ExitStack() as stack:
+        file_parts = {}
+        for name, path in files.items():
+            file = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+            file_parts[name] = (os.path.basename(path), stack.enter_context(file), 'text/plain')
+        response = await client.post(settings.AP_PREDICT_ENDPOINT, data={'data': json.dumps(call_data)},
+                                     files=file_parts)
+    if response.status_code in MULTIPART_UNSUPPORTED:
+        return await post_json(client, call_data, files)
+    return response
+
+
+def prepare_submission(sim):
+    """
+    (Re)sets the status and results of the simulation.
+    Returns the data for the api call starting the simulation and the input files to send with it.
     """
     # (re)set status and result
     sim.status = Simulation.Status.NOT_STARTED
@@ -161,17 +251,15 @@ def start_simulation(sim):
     sim.voltage_traces = ''
     sim.voltage_results = ''
     sim.pkpd_results = ''
+    sim.delete_archive()
 
     # build json data for api call
     call_data = {'pacingFrequency': sim.pacing_frequency,
                  'pacingMaxTime': sim.maximum_pacing_time}
-    if sim.pk_or_concs == Simulation.PkOptions.pharmacokinetics:  # pk data file
-        with open(sim.PK_data.path, 'rb') as PK_data_file:
-            call_data['PK_data_file'] = PK_data_file.read().decode('unicode-escape')
-    elif sim.pk_or_concs == Simulation.PkOptions.compound_concentration_points:
+    if sim.pk_or_concs == Simulation.PkOptions.compound_concentration_points:
         call_data['plasmaPoints'] = sorted(set([c.concentration
                                                 for c in CompoundConcentrationPoint.objects.filter(simulation=sim)]))
-    else:  # sim.pk_or_concs == Simulation.PkOptions.compound_concentration_range:
+    elif sim.pk_or_concs == Simulation.PkOptions.compound_concentration_range:
         call_data['plasmaMinimum'] = sim.minimum_concentration
         call_data['plasmaMaximum'] = sim.maximum_concentration
         call_data['plasmaIntermediatePointCount'] = sim.intermediate_point_count
@@ -179,9 +267,6 @@ def start_simulation(sim):
 
     if sim.model.ap_predict_model_call:
         call_data['modelId'] = sim.model.ap_predict_model_call
-    else:
-        with open(sim.model.cellml_file.path, 'rb') as cellml_file:
-            call_data['cellml_file'] = cellml_file.read().decode('unicode-escape')
 
     for current_param in SimulationIonCurrentParam.objects.filter(simulation=sim):
         call_data[current_param.ion_current.name] = {
@@ -192,32 +277,212 @@ def start_simulation(sim):
         if current_param.spread_of_uncertainty:
             call_data[current_param.ion_current.name]['spreads'] = \
                 {'c50Spread': current_param.spread_of_uncertainty}
+    return call_data, submission_files(sim)
+
+
+async def astart_simulation(sim):
+    """
+    Makes the request to start the simulation.
+    """
+    call_data, files = await sync_to_async(prepare_submission)(sim)
 
     # call api to start simulation
+    post = post_multipart if settings.AP_PREDICT_MULTIPART_SUBMISSION and files else post_json
+    outcome = 'error'
+    start = perf_counter()
+    sim.started_at = timezone.now()
     try:
-        response = httpx.post(settings.AP_PREDICT_ENDPOINT, json=call_data).json()
+        async with httpx.AsyncClient() as client:
+            response = (await post(client, call_data, files)).json()
         if 'error' in response:
-            save_api_error_sync(sim, f"API error message: {response['error']}")
+            await save_api_error(sim, f"API error message: {response['error']}")
         else:
             sim.ap_predict_call_id = response['success']['id']
             sim.status = Simulation.Status.INITIALISING
-            sim.save()
+            await sync_to_async(sim.save)()
+            outcome = 'success'
     except JSONDecodeError:
-        save_api_error_sync(sim, 'Starting simulation failed: returned invalid JSON.')
+        await save_api_error(sim, 'Starting simulation failed: returned invalid JSON.')
     except httpx.HTTPError as e:
-        save_api_error_sync(sim, f'API connection failed: {str(e)}.')
+        await save_api_error(sim, f'API connection failed: {str(e)}.')
     except httpx.InvalidURL:
-        save_api_error_sync(sim, f'Inavlid URL {settings.AP_PREDICT_ENDPOINT}.')
+        await save_api_error(sim, f'Inavlid URL {settings.AP_PREDICT_ENDPOINT}.')
+    finally:
+        duration = perf_counter() - start
+        metrics.SUBMISSION_SECONDS.labels(outcome).observe(duration)
+        profiling.record_ap_manager_call(duration)
+
+
+# for sync callers (the simulation create view and management command)
+start_simulation = async_to_sync(astart_simulation)
+
+
+def release_simulations():
+    """
+    Starts the queued simulations the scheduler releases (if there is capacity).
+    """
+    for sim in scheduler.claim():
+        start_simulation(sim)
+
+
+async def arelease_simulations(skip_locked=False):
+    sims = await sync_to_async(scheduler.claim)(skip_locked=skip_locked)
+    if sims:
+        await asyncio.wait([asyncio.ensure_future(astart_simulation(sim)) for sim in sims])
+
+
+def submit_simulation(sim):
+    """
+    Queues the simulation to be started, which happens straight away if the scheduler's limits allow.
+    """
+    scheduler.queue(sim)
+    release_simulations()
 
 
 class SimulationListView(LoginRequiredMixin, ListView):
     """
-    List all user's Simulations
+    List all user's Simulations, optionally filtered and ordered by their results (see `SimulationFilterForm`).
     """
     template_name = 'simulations/simulation_list.html'
 
+    @cached_property
+    def filter_form(self):
+        return SimulationFilterForm(self.request.GET or None)
+
     def get_queryset(self):
-        return Simulation.objects.filter(author=self.request.user)
+        return self.filter_form.filter(Simulation.objects.filter(author=self.request.user).select_related('summary'))
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(filter_form=self.filter_form, **kwargs)
+
+
+class Echo:
+    """
+    File-like object returning what is written, for streaming CSV rows.
+    """
+    def write(self, value):
+        return value
+
+
+class SimulationSummaryView(LoginRequiredMixin, View):
+    """
+    Exports the result summaries of the user's simulations as JSON (or CSV with ?format=csv), filtered and ordered
+    as the simulation list.
+    """
+    FIELDS = ('pk', 'title', 'created_at', 'summary__control_apd90', 'summary__max_delta_apd90',
+              'summary__max_delta_apd90_concentration', 'summary__min_qnet', 'summary__peak_pkpd_apd90',
+              'summary__peak_pkpd_timepoint', 'delta_apd90', 'qnet')
+
+    def get(self, request, *args, **kwargs):
+        form = SimulationFilterForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse(data={'errors': form.errors}, status=400)
+        sims = form.filter(Simulation.objects.filter(author=request.user, summary__isnull=False))
+        rows = sims.values_list(*self.FIELDS, 'model__name', 'model__version')
+        header = [field.replace('summary__', '') for field in self.FIELDS] + ['model']
+
+        def records():
+            for *values, model_name, model_version in rows.iterator(chunk_size=1000):
+                yield dict(zip(header, values + [f'{model_name} {model_version}'.strip()]))
+
+        if request.GET.get('format') == 'csv':
+            writer = csv.writer(Echo())
+            response = StreamingHttpResponse((writer.writerow(row) for row in
+                                              chain([header], (record.values() for record in records()))),
+                                             content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="simulation_summaries.csv"'
+            return response
+        return JsonResponse(data=list(records()), status=200, safe=False)
+
+
+class SimulationSelectionMixin:
+    """
+    Selects the user's successful simulations for export: those given with ?pk= (can be given multiple times) and / or
+    filtered and ordered as the simulation list.
+    """
+    def selected_simulations(self, request):
+        """
+        The selected simulations, and the errors in the selection (if any).
+        """
+        form = SimulationFilterForm(request.GET)
+        if not form.is_valid():
+            return None, form.errors
+        sims = Simulation.objects.filter(author=request.user, status=Simulation.Status.SUCCESS)
+        pks = request.GET.getlist('pk')
+        if pks:
+            if not all(pk.isdigit() for pk in pks):
+                return None, {'pk': ['Enter whole numbers.']}
+            sims = sims.filter(pk__in=pks)
+        return form.filter(sims), None
+
+
+class SimulationExportView(SimulationSelectionMixin, LoginRequiredMixin, View):
+    """
+    Bulk export of the (selected) simulations: a (streamed) ZIP with the spreadsheet of each simulation and their
+    result summaries, or with ?format=xlsx a single workbook summarising the results across the simulations.
+    """
+    def get(self, request, *args, **kwargs):
+        sims, errors = self.selected_simulations(request)
+        if errors:
+            return JsonResponse(data={'errors': errors}, status=400)
+
+        if request.GET.get('format') == 'xlsx':
+            return FileResponse(export.summary_workbook(sims), as_attachment=True,
+                                filename='AP-Portal_simulations.xlsx')
+        content = export.zip_stream(list(sims.values_list('pk', flat=True)), self.spreadsheet,
+                                    settings.SIMULATION_EXPORT_WORKERS, summaries=export.summary_rows(sims))
+        response = StreamingHttpResponse(streaming_content(request, content), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="AP-Portal_simulations.zip"'
+        return response
+
+    @staticmethod
+    def spreadsheet(pk):
+        """
+        The spreadsheet of a simulation (as bytes), the stored one if it has been built.
+        """
+        sim = Simulation.objects.select_related('spreadsheet').get(pk=pk)
+        spreadsheet = getattr(sim, 'spreadsheet', None)
+        if spreadsheet and spreadsheet.file and spreadsheet.result_version == sim.result_version:
+            with spreadsheet.file.open('rb') as file:
+                return file.read()
+        buffer = io.BytesIO()
+        SpreadsheetSimulationView().write_workbook(buffer, sim.rehydrate())
+        return buffer.getvalue()
+
+
+class SimulationResultsView(SimulationSelectionMixin, LoginRequiredMixin, View):
+    """
+    Exports the results of a simulation, or of the (selected) simulations, as tidy table (one value per row, see
+    `export.TIDY_COLUMNS`) for analysis: streamed as gzip compressed CSV, or with ?format=parquet as Parquet file
+    (if pyarrow is installed).
+    """
+    FORMATS = {'csv': (export.csv_gzip_stream, 'application/gzip', 'csv.gz'),
+               'parquet': (export.parquet_stream, 'application/vnd.apache.parquet', 'parquet')}
+
+    def get(self, request, *args, **kwargs):
+        output_format = request.GET.get('format', 'csv')
+        if output_format not in self.FORMATS:
+            return JsonResponse(data={'errors': {'format': [f'Choose one of: {", ".join(self.FORMATS)}.']}},
+                                status=400)
+        stream, content_type, extension = self.FORMATS[output_format]
+        if output_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            return JsonResponse(data={'errors': {'format': ['Parquet export is not available.']}}, status=501)
+
+        if 'pk' in self.kwargs:
+            sim = get_object_or_404(Simulation.objects.only('author'), pk=self.kwargs['pk'])
+            if sim.author_id != request.user.pk:
+                raise PermissionDenied()
+            pks, file_name = [sim.pk], f'AP-Portal_{sim.pk}_results'
+        else:
+            sims, errors = self.selected_simulations(request)
+            if errors:
+                return JsonResponse(data={'errors': errors}, status=400)
+            pks, file_name = list(sims.values_list('pk', flat=True)), 'AP-Portal_results'
+
+        response = StreamingHttpResponse(streaming_content(request, stream(export.tidy_results(pks))),
+                                         content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{file_name}.{extension}"'
+        return response
 
 
 class SimulationCreateView(LoginRequiredMixin, UserFormKwargsMixin, CreateView):
@@ -235,10 +500,20 @@ class SimulationCreateView(LoginRequiredMixin, UserFormKwargsMixin, CreateView):
         self.pk = kwargs.get('pk', None)
         return super().dispatch(request, *args, **kwargs)
 
-    def get_initial(self):
+    @cached_property
+    def template_simulation(self):
+        """
+        The simulation used as a template (if any), fetched once with its parameters and concentration points.
+        """
         if not self.pk:
             return None
-        sim = Simulation.objects.get(pk=self.pk)
+        return Simulation.objects.select_related('model')\
+            .prefetch_related('simulationioncurrentparam_set', 'compoundconcentrationpoint_set').get(pk=self.pk)
+
+    def get_initial(self):
+        sim = self.template_simulation
+        if not sim:
+            return None
         return {'notes': sim.notes,
                 'model': sim.model,
                 'pacing_frequency': sim.pacing_frequency,
@@ -258,8 +533,20 @@ class SimulationCreateView(LoginRequiredMixin, UserFormKwargsMixin, CreateView):
             visible_models = (CellmlModel.objects.filter(predefined=True) |
                               CellmlModel.objects.filter(predefined=False,
                                                          author=self.request.user)).values_list('pk', flat=True)
+            # map ion currents to the (visible) models using them in a single query
+            current_models = defaultdict(list)
+            for current_pk, model_pk in CellmlModel.ion_currents.through.objects\
+                    .filter(cellmlmodel__in=visible_models).order_by('cellmlmodel')\
+                    .values_list('ioncurrent', 'cellmlmodel'):
+                current_models[current_pk].append(model_pk)
+
+            params = {}
+            if self.template_simulation:
+                params = {param.ion_current_id: param
+                          for param in self.template_simulation.simulationioncurrentparam_set.all()}
+
             for curr in IonCurrent.objects.all().order_by('pk'):
-                param = SimulationIonCurrentParam.objects.filter(simulation=self.pk, ion_current=curr).first()
+                param = params.get(curr.pk, None)
                 initial.append({'current': param.current if param else None,
                                 'ion_current': curr,
                                 'hill_coefficient': to_int(param.hill_coefficient if param
@@ -274,9 +561,7 @@ class SimulationCreateView(LoginRequiredMixin, UserFormKwargsMixin, CreateView):
                                                                         else curr.default_spread_of_uncertainty),
                                 'channel_protein': curr.channel_protein,
                                 'gene': curr.gene, 'description': curr.description,
-                                'models': CellmlModel.objects.filter(pk__in=visible_models,
-                                                                     ion_currents__pk=curr.pk).values_list('pk',
-                                                                                                           flat=True)})
+                                'models': current_models[curr.pk]})
             form_kwargs = {'user': self.request.user}
             self.ion_formset = self.ion_formset_class(self.request.POST or None, initial=initial, prefix='ion',
                                                       form_kwargs=form_kwargs)
@@ -284,19 +569,22 @@ class SimulationCreateView(LoginRequiredMixin, UserFormKwargsMixin, CreateView):
 
     def get_concentration_formset(self):
         if not hasattr(self, 'concentration_formset') or self.concentration_formset is None:
-            initial = CompoundConcentrationPoint.objects.filter(simulation=self.pk)
+            initial = []
+            if self.template_simulation:
+                initial = [{'id': point.id, 'simulation_id': point.simulation_id, 'concentration': point.concentration}
+                           for point in self.template_simulation.compoundconcentrationpoint_set.all()]
             form_kwargs = {'user': self.request.user}
             self.concentration_formset = self.concentration_formset_class(self.request.POST or None,
                                                                           prefix='concentration',
-                                                                          initial=initial.values() if initial else [],
+                                                                          initial=initial,
                                                                           form_kwargs=form_kwargs)
         return self.concentration_formset
 
     def get_context_data(self, **kwargs):
         kwargs['ion_formset'] = self.get_ion_formset()
         kwargs['concentration_formset'] = self.get_concentration_formset()
-        if self.pk:
-            title = Simulation.objects.get(pk=self.pk).title
+        if self.template_simulation:
+            title = self.template_simulation.title
             kwargs['template_title'] = title
             messages.add_message(self.request, messages.INFO,
                                  'Using existing simulation <em>%s</em> as a template.' % title)
@@ -313,9 +601,10 @@ class SimulationCreateView(LoginRequiredMixin, UserFormKwargsMixin, CreateView):
             simulation = form.save()
             ion_formset.save(simulation=simulation)
             concentration_formset.save(simulation=simulation)
-            # kick off simulation
-            start_simulation(simulation)
-            return self.form_valid(form)
+            # kick off simulation (which is started from the queue, so don't save the form's instance again)
+            submit_simulation(simulation)
+            self.object = simulation
+            return HttpResponseRedirect(self.get_success_url())
         else:
             self.object = getattr(self, 'object', None)
             return self.form_invalid(form)
@@ -337,6 +626,15 @@ class SimulationEditView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargs
     def test_func(self):
         return self.get_object().author == self.request.user
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if form.has_changed():
+            # the stored spreadsheet includes the title and notes
+            SimulationSpreadsheet.objects.filter(simulation=self.object).delete()
+            if settings.SIMULATION_SPREADSHEET_WORKER and self.object.result_version:
+                queue_spreadsheet(self.object)
+        return response
+
 
 class SimulationResultView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargsMixin, DetailView):
     """
@@ -360,6 +658,28 @@ class SimulationVersionView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwa
         return self.get_object().author == self.request.user
 
 
+class SimulationStdoutView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargsMixin, DetailView):
+    """
+    Serves the STDOUT of the ApPredict run, as stored (gzip compressed) if the client accepts gzip.
+    """
+    model = Simulation
+
+    def test_func(self):
+        return self.get_object().author == self.request.user
+
+    def get(self, request, *args, **kwargs):
+        sim = self.get_object()
+        if not sim.STDOUT or not sim.STDOUT.storage.exists(sim.STDOUT.name):
+            raise Http404()
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = FileResponse(sim.STDOUT.open('rb'), content_type='text/plain; charset=utf-8')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(sim.open_stdout(), content_type='text/plain; charset=utf-8')
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
 class SimulationDeleteView(UserPassesTestMixin, DeleteView):
     """
     Delete a simulation
@@ -376,26 +696,65 @@ class SimulationDeleteView(UserPassesTestMixin, DeleteView):
         return reverse_lazy('simulations:simulation_list')
 
 
-class RestartSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargsMixin, RedirectView):
+class RestartSimulationView(AsyncAccessMixin, View):
     """
     View restarting the simulation
     """
-    model = Simulation
-
     def test_func(self):
-        return Simulation.objects.get(pk=self.kwargs['pk']).author == self.request.user
+        self.object = get_object_or_404(Simulation.objects.select_related('model'), pk=self.kwargs['pk'])
+        return self.object.author == self.request.user
 
-    def get_redirect_url(self, *args, **kwargs):
-        simulation = Simulation.objects.get(pk=self.kwargs['pk'])
-        start_simulation(simulation)
-        if 'result' in self.request.META['HTTP_REFERER']:
-            return reverse_lazy('simulations:simulation_result', args=[self.kwargs['pk']])
-        return reverse_lazy('simulations:simulation_list')
+    async def get(self, request, *args, **kwargs):
+        await SimulationSummary.objects.filter(simulation=self.object).adelete()
+        await SimulationSpreadsheet.objects.filter(simulation=self.object).adelete()
+        await sync_to_async(scheduler.queue)(self.object)
+        await arelease_simulations()
+        if 'result' in request.META.get('HTTP_REFERER', ''):
+            return HttpResponseRedirect(reverse('simulations:simulation_result', args=[self.kwargs['pk']]))
+        return HttpResponseRedirect(reverse('simulations:simulation_list'))
+
+
+def queue_spreadsheet(sim):
+    """
+    Queues building the spreadsheet of a successful simulation (for its current results) in the background.
+    Returns the spreadsheet.
+    """
+    spreadsheet, created = SimulationSpreadsheet.objects.get_or_create(
+        simulation=sim, defaults={'result_version': sim.result_version}
+    )
+    if not created and spreadsheet.result_version != sim.result_version:
+        spreadsheet.delete()
+        spreadsheet = SimulationSpreadsheet.objects.create(simulation=sim, result_version=sim.result_version)
+    return spreadsheet
+
+
+def build_spreadsheet(spreadsheet):
+    """
+    Builds and stores the spreadsheet, unless the simulation has since been restarted (or edited).
+    Returns whether the spreadsheet was built.
+    """
+    sim = Simulation.objects.get(pk=spreadsheet.simulation_id).rehydrate()
+    if sim.result_version != spreadsheet.result_version:
+        return False
+    buffer = io.BytesIO()
+    SpreadsheetSimulationView().write_workbook(buffer, sim)
+    spreadsheet.file.save(f'{sim.pk}/{spreadsheet.result_version}/AP-Portal_{sim.pk}.xlsx',
+                          ContentFile(buffer.getvalue()), save=False)
+    # only store it if the spreadsheet hasn't been removed (by a restart or edit) in the meantime
+    if not SimulationSpreadsheet.objects.filter(pk=spreadsheet.pk, result_version=spreadsheet.result_version,
+                                                queued_at=spreadsheet.queued_at)\
+            .update(file=spreadsheet.file.name, built_at=timezone.now()):
+        spreadsheet.file.delete(save=False)
+        return False
+    MediaFile.update_index(spreadsheet, spreadsheet.file, original_name=os.path.basename(spreadsheet.file.name))
+    return True
 
 
 class SpreadsheetSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargsMixin, DetailView):
     """
     Download the data as Spreadseet (.xlsx)
+    Spreadsheets of successful simulations are built once (in the background with SIMULATION_SPREADSHEET_WORKER,
+    otherwise on the first download) and then served as (protected) media file.
     """
     model = Simulation
 
@@ -478,7 +837,7 @@ class SpreadsheetSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFor
                 row += 1
         else:
             worksheet.write(row, 0, 'PK data file', bold)
-            worksheet.write(row, 1, str(sim.PK_data))
+            worksheet.write(row, 1, sim.PK_data_name)
             row += 1
         row += 1
         worksheet.write(row, 0, 'Notes', bold)
@@ -643,10 +1002,8 @@ class SpreadsheetSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFor
                 worksheet.write(row, 0, 'Python packages versions for chaste_codegen')
                 worksheet.write(row, 1, sim.version_info['python_versions'])
 
-    def get(self, request, *args, **kwargs):
-        sim = self.get_object()
-        buffer = io.BytesIO()
-        workbook = xlsxwriter.Workbook(buffer)
+    def write_workbook(self, file, sim):
+        workbook = xlsxwriter.Workbook(file)
         bold = workbook.add_format({'bold': True})
         self.input_values(workbook, bold, sim)
         self.qNet(workbook, bold, sim)
@@ -654,10 +1011,25 @@ class SpreadsheetSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFor
         self.voltage_traces(workbook, bold, sim)
         self.voltage_traces_plot(workbook, bold, sim)
         self.version_info(workbook, bold, sim)
-
         workbook.close()
+
+    @metrics.RENDER_SECONDS.labels('spreadsheet').time()
+    def get(self, request, *args, **kwargs):
+        sim = self.get_object()
+        if sim.result_version:
+            spreadsheet = queue_spreadsheet(sim)
+            if not spreadsheet.file and not settings.SIMULATION_SPREADSHEET_WORKER:
+                build_spreadsheet(spreadsheet)
+                spreadsheet.refresh_from_db()
+            if spreadsheet.file:
+                return HttpResponseRedirect(reverse('media', args=[spreadsheet.file.name]))
+            return render(request, 'simulations/simulation_spreadsheet_preparing.html', {'object': sim}, status=202)
+
+        # no (versioned) results to store the spreadsheet for
+        buffer = io.BytesIO()
+        self.write_workbook(buffer, sim.rehydrate())
         buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename='AP-Portal_%s.xlsx' % self.get_object().pk)
+        return FileResponse(buffer, as_attachment=True, filename='AP-Portal_%s.xlsx' % sim.pk)
 
 
 class StatusSimulationView(View):
@@ -669,18 +1041,13 @@ class StatusSimulationView(View):
 
     COMMANDS = ('q_net', 'voltage_traces', 'voltage_results', 'pkpd_results', 'messages')
 
-    @classonlymethod
-    def as_view(cls, **initkwargs):
-        view = super().as_view(**initkwargs)
-        view._is_coroutine = asyncio.coroutines._is_coroutine
-        return view
-
     async def save_data(self, client, command, sim):
         response = await get_from_api(client, command, sim)
         if response and 'success' in response:
             setattr(sim, command, response['success'])
 
     async def update_sim(self, client, sim):
+        finished = False
         response = await get_from_api(client, 'progress_status', sim)
         # get progress if there is progress
         progress_text = next((p for p in reversed(response.get('success', '')) if p), '')
@@ -713,25 +1080,46 @@ class StatusSimulationView(View):
                         sim.status = Simulation.Status.SUCCESS
                         sim.progress = 'Completed'
                         sim.api_errors = ''
+                        sim.finished_at = timezone.now()
+                        finished = True
+                        if sim.started_at:
+                            metrics.COMPLETION_SECONDS.observe((sim.finished_at - sim.started_at).total_seconds())
                     else:  # we didn't get any data after stopping, we must have stopped prematurely
                         await save_api_error(sim, ('Simulation stopped prematurely. '
                                                    '(No data available after simulation stopped).'))
         if not sim.version_info:  # save STDOUT if not yet saved
-            sim.STDOUT = await get_from_api(client, 'STDOUT', sim)
+            stdout = await get_from_api(client, 'STDOUT', sim)
             sim.version_info = {}
 
-            if 'content' in sim.STDOUT:
-                match = re.search(r'(.+)\$CHASTE_TEST_OUTPUT', sim.STDOUT['content'], flags=re.DOTALL)
-                if match:
-                    sim.version_info['python_versions'] = match.group(1)
-                match = re.search(r'ApPredict args :(.*)', sim.STDOUT['content'])
-                if match:
-                    sim.version_info['appredict_args'] = match.group(1).replace('--', '\n--').replace(' \n--', '--', 1)
-                match = re.search(r'<ChasteBuildInfo>.*</ChasteBuildInfo>', sim.STDOUT['content'], re.DOTALL)
-                if match:
-                    sim.version_info['versions'] = xmltodict.parse(match.group(0))['ChasteBuildInfo']
+            if 'content' in stdout:
+                await sync_to_async(sim.save_stdout)(stdout['content'])
+                sim.version_info = extract_version_info(io.StringIO(stdout['content']))
 
         await sync_to_async(sim.save)()
+        if finished:
+            await sync_to_async(summarise)(sim)
+            if settings.SIMULATION_SPREADSHEET_WORKER and sim.result_version:
+                await sync_to_async(queue_spreadsheet)(sim)
+
+    @staticmethod
+    def eta(sim):
+        """
+        The predicted time a running simulation finishes (in ISO 8601 format), if a runtime prediction is available.
+        """
+        if sim.status not in scheduler.ACTIVE_STATUSES or sim.estimated_runtime is None or not sim.started_at:
+            return None
+        return (sim.started_at + timedelta(seconds=sim.estimated_runtime)).isoformat()
+
+    @staticmethod
+    def spreadsheet(sim):
+        """
+        The state of the simulation's stored spreadsheet: ready, preparing or None (not queued, e.g. when spreadsheets
+        are built on download).
+        """
+        spreadsheet = getattr(sim, 'spreadsheet', None)
+        if spreadsheet is None or spreadsheet.result_version != sim.result_version:
+            return None
+        return 'ready' if spreadsheet.file else 'preparing'
 
     async def get(self, request, *args, **kwargs):
         authenticated, user_pk = await sync_to_async(lambda req: (req.user.is_authenticated, req.user.pk))(request)
@@ -740,51 +1128,223 @@ class StatusSimulationView(View):
 
         pks = set(map(int, self.kwargs['pks'].strip('/').split('/')))
         # get simulations to get status for and the ones that need updating
-        simulations = Simulation.objects.filter(author__pk=user_pk, pk__in=pks)
+        simulations = Simulation.objects.filter(author__pk=user_pk, pk__in=pks).select_related('spreadsheet')
         if self.kwargs['update'].lower() == 'false':
-            sims_to_update = await sync_to_async(list)(simulations.exclude(status=Simulation.Status.SUCCESS))
+            not_running = (Simulation.Status.SUCCESS, Simulation.Status.QUEUED)
+            sims_to_update = await sync_to_async(list)(simulations.exclude(status__in=not_running))
             if sims_to_update:
+                active = [sim for sim in sims_to_update if sim.status in scheduler.ACTIVE_STATUSES]
                 async with httpx.AsyncClient(timeout=None) as client:
                     await asyncio.wait([asyncio.ensure_future(self.update_sim(client, sim)) for sim in sims_to_update])
+                # simulations that finished make room for queued ones, unless the scheduler is already releasing them
+                if any(sim.status not in scheduler.ACTIVE_STATUSES for sim in active):
+                    await arelease_simulations(skip_locked=True)
 
         # gather data for status responses
         data = await sync_to_async(lambda sims: [{'pk': sim.pk,
                                                   'progress': sim.progress,
-                                                  'status': sim.status} for sim in sims])(simulations)
+                                                  'status': sim.status,
+                                                  'eta': self.eta(sim),
+                                                  'version': sim.result_version,
+                                                  'spreadsheet': self.spreadsheet(sim)} for sim in sims])(simulations)
         return JsonResponse(data=data,
                             status=200, safe=False)
 
 
-def update_unassigned(unasgn, value):
+def extract_version_info(lines):
     """
-    Updates whether we have seen unassigned qnet values.
-    If so we'll have to set a manual scale for the graph.
+    Extracts version information from ApPredict's STDOUT, given as (an iterable of) lines.
+    Apart from the results, only the text since the last marker (or closing tag) is kept while reading.
+    - python_versions: everything before the last occurrence of $CHASTE_TEST_OUTPUT
+    - appredict_args: the (first) line with ApPredict's args
+    - versions: the parsed ChasteBuildInfo xml, from the first opening to the last closing tag
     """
+    version_info = {}
+    marker, open_tag, close_tag = '$CHASTE_TEST_OUTPUT', '<ChasteBuildInfo>', '</ChasteBuildInfo>'
+    since_marker, build_info = io.StringIO(), None
+    python_versions = build_info_xml = None
+    for line in lines:
+        marker_pos = line.rfind(marker)
+        if marker_pos == -1:
+            since_marker.write(line)
+        else:
+            python_versions = (python_versions or '') + since_marker.getvalue() + line[:marker_pos] or None
+            since_marker = io.StringIO()
+            since_marker.write(line[marker_pos:])
+
+        if 'appredict_args' not in version_info and 'ApPredict args :' in line:
+            args = line.split('ApPredict args :', 1)[1].rstrip('\n')
+            version_info['appredict_args'] = args.replace('--', '\n--').replace(' \n--', '--', 1)
+
+        if build_info is None and open_tag in line:
+            build_info, line = io.StringIO(), line[line.index(open_tag):]
+        if build_info is not None:
+            close_pos = line.rfind(close_tag)
+            if close_pos == -1:
+                build_info.write(line)
+            else:
+                close_pos += len(close_tag)
+                build_info_xml = (build_info_xml or '') + build_info.getvalue() + line[:close_pos]
+                build_info = io.StringIO()
+                build_info.write(line[close_pos:])
+
+    if python_versions is not None:
+        version_info['python_versions'] = python_versions
+    if build_info_xml is not None:
+        version_info['versions'] = xmltodict.parse(build_info_xml)['ChasteBuildInfo']
+    return version_info
+
+
+MISSING = object()
+
+
+def float_array(rows):
+    """
+    Converts a table (list of rows) of values to a 2-d float array, as `to_float` does for each value.
+    Values that aren't numbers are NaN in the array, and returned by (row, column) position.
+    """
+    if not rows:
+        return np.empty((0, 0)), {}
     try:
-        val = float(value)
-    except ValueError:
+        return np.array(rows, dtype=float), {}
+    except ValueError:  # not all numbers, or rows of different lengths (cells missing from shorter rows are MISSING)
+        values = np.full((len(rows), max(map(len, rows))), np.nan)
+        invalid = {(i, j): MISSING for i, row in enumerate(rows) for j in range(len(row), values.shape[1])}
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                try:
+                    values[i, j] = float(value)
+                except ValueError:
+                    invalid[(i, j)] = value
+        return values, invalid
+
+
+def update_unassigned_array(unasgn, values, invalid):
+    """
+    Updates whether we have seen unassigned qnet values in the array (values that aren't numbers, or beyond +/-1e200).
+    If so we'll have to set a manual scale for the graph. Also updates the min / max of the other values.
+    """
+    if any(value is not MISSING for value in invalid.values()):
         unasgn['unassigned'], unasgn['min_scale'], unasgn['max_scale'] = True, 1.5, 1.5
-        return
-
-    if val <= -1.0e+200:
+    low, high = values <= -1.0e+200, values >= 1.0e+200
+    if low.any():
         unasgn['unassigned'], unasgn['min_scale'] = True, 1.5
-    elif val >= 1.0e+200:
+    if high.any():
         unasgn['unassigned'], unasgn['max_scale'] = True, 1.5
-    else:
-        unasgn['max'], unasgn['min'] = max(unasgn['max'], val), min(unasgn['min'], val)
+    assigned = values[~(low | high | np.isnan(values))]  # NaN values don't change the min / max
+    if assigned.size:
+        unasgn['max'] = max(unasgn['max'], float(assigned.max()))
+        unasgn['min'] = min(unasgn['min'], float(assigned.min()))
 
 
-class DataSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargsMixin, DetailView):
+def add_series_data(series, unasgn, xs, rows):
+    """
+    Adds the [x, value] points to the series, with a column of the table of values (rows) per series.
+    """
+    values, invalid = float_array(rows)
+    update_unassigned_array(unasgn, values, invalid)
+    columns = values.T.tolist()
+    for (i, j), value in invalid.items():
+        columns[j][i] = value
+    for series_dict, column in zip(series, columns):
+        series_dict['data'] = [[x, val] for x, val in zip(xs, column) if val is not MISSING]
+
+
+class DataSimulationView(AsyncAccessMixin, View):
 
     """
-    Retrieves the data (in json format) for rendering the graphs.
+    Retrieves the data (in json format, or with ?format=binary in a compact binary format) for rendering the graphs.
+    Either all data, or (so that the result page only downloads what is shown) that of a single chart: info (the
+    messages, which charts have data and the voltage traces without their data), adp90, qnet, pkpd or traces
+    (optionally only those at the concentrations given with ?conc=).
+    The (possibly large or archived) results are loaded and processed in a thread.
+    Responses carry the simulation's result version as ETag, which the result page uses to cache them.
     """
-    model = Simulation
+    CHARTS = ('adp90', 'qnet', 'pkpd', 'traces')
+    # the keys in the data of each chart, and the results it needs (the other results aren't loaded)
+    CHART_KEYS = {'adp90': ('adp90', 'adp90_y_scale'), 'qnet': ('qnet', 'qnet_y_scale'),
+                  'pkpd': ('pkpd_results', 'pkpd_results_y_scale'), 'traces': ('traces', )}
+    CHART_RESULTS = {'info': Simulation.ARCHIVED_FIELDS, 'adp90': ('voltage_results', ),
+                     'qnet': ('voltage_results', 'q_net'), 'pkpd': ('pkpd_results', ), 'traces': ('voltage_traces', )}
+    # the series in the binary format, with the (little-endian) type of their buffers (Float64 buffers go first,
+    # so that all buffers are aligned to their item size)
+    BINARY_SERIES = (('adp90', 'f8'), ('qnet', 'f8'), ('pkpd_results', 'f8'), ('traces', 'f4'))
 
     def test_func(self):
-        return self.get_object().author == self.request.user
+        sims = Simulation.objects.all()
+        if 'chart' in self.kwargs:
+            sims = sims.defer(*(set(Simulation.ARCHIVED_FIELDS) - set(self.CHART_RESULTS[self.kwargs['chart']])))
+        self.object = get_object_or_404(sims, pk=self.kwargs['pk'])
+        return self.object.author == self.request.user
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        start = perf_counter()
+        # results don't change until the simulation is restarted, so the browser can revalidate what it has
+        etag = quote_etag(self.object.result_version) if self.object.result_version else None
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+        chart = self.kwargs.get('chart')
+        if chart == 'info':
+            data = await sync_to_async(lambda: self.info(self.object.rehydrate()))()
+        elif chart:
+            concentrations = set(map(to_float, request.GET.getlist('conc'))) or None
+            data = await sync_to_async(lambda: self.graph_data(self.object.rehydrate(), charts=(chart, ),
+                                                               concentrations=concentrations))()
+            data = {key: value for key, value in data.items() if key in self.CHART_KEYS[chart]}
+        else:
+            data = await sync_to_async(lambda: self.graph_data(self.object.rehydrate()))()
+        if request.GET.get('format') == 'binary' and chart != 'info':
+            response = HttpResponse(self.binary_data(data), content_type='application/octet-stream')
+        else:
+            response = JsonResponse(data=data, status=200, safe=False)
+        if etag:
+            response['ETag'] = etag
+        metrics.RENDER_SECONDS.labels('data').observe(perf_counter() - start)
+        return response
+
+    @classmethod
+    def binary_data(cls, data):
+        """
+        Packs the graph data into a little-endian uint32 header length, followed by the JSON header (the graph data
+        with the data of each series replaced by the dtype, offset and length of its buffer) padded with spaces to a
+        multiple of 8 bytes, followed by the buffers with the series' [x, y] points. Values that aren't numbers become
+        NaN (which flot treats the same as the strings in the json format).
+        """
+        header, buffers, offset = dict(data), [], 0
+        for key, dtype in cls.BINARY_SERIES:
+            if key not in data:
+                continue
+            header[key] = []
+            for series in data[key]:
+                points, _ = float_array(series['data'])
+                buffer = points.astype(f'<{dtype}').tobytes()
+                header[key].append(dict(series, data={'dtype': dtype, 'offset': offset, 'length': len(points)}))
+                buffers.append(buffer)
+                offset += len(buffer)
+        header = json.dumps(header).encode('utf-8')
+        padding = b' ' * (-(4 + len(header)) % 8)
+        return b''.join([struct.pack('<I', len(header) + len(padding)), header, padding, *buffers])
+
+    @staticmethod
+    def trace_series(sim, i, trace):
+        return {'color': i, 'enabled': True, 'label': f"Simulation @ {sim.pacing_frequency} Hz @ {trace['name']} µM",
+                'data': [[series['name'], series['value']] for series in trace['series']]}
+
+    def info(self, sim):
+        results = {'adp90': sim.voltage_results, 'qnet': sim.voltage_results and sim.q_net, 'pkpd': sim.pkpd_results,
+                   'traces': sim.voltage_traces}
+        charts = [chart for chart in self.CHARTS if results[chart]]
+        traces = [dict(self.trace_series(sim, i, {**trace, 'series': []}), concentration=trace['name'])
+                  for i, trace in enumerate(sim.voltage_traces or [])]
+        return {'messages': sim.messages, 'charts': charts, 'traces': traces}
+
+    def graph_data(self, sim, charts=CHARTS, concentrations=None):
+        """
+        The data for the given charts (results for other charts may not be loaded), only including the voltage traces
+        at the given concentrations (if any).
+        """
         adp90_unasgn = {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
                         'min_scale': 1.1, 'max_scale': 1.1}
         qnet_unasgn = {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
@@ -792,7 +1352,6 @@ class DataSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargs
         pkpd_unasgn = {'unassigned': False, 'max': sys.float_info.min, 'min': sys.float_info.max,
                        'min_scale': 1.1, 'max_scale': 1.1}
 
-        sim = self.get_object()
         data = {'adp90': [],
                 'qnet': [],
                 'traces': [],
@@ -802,12 +1361,13 @@ class DataSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargs
         # headers
         num_percentiles = 0  # count number of percentiles, we assume we'll see the low ones first
         fill_alpha = 0.3
-        requested_concentrations = None
-        if sim.pk_or_concs == Simulation.PkOptions.compound_concentration_points:
-            requested_concentrations = tuple(to_float(c.concentration)
-                                             for c in CompoundConcentrationPoint.objects.filter(simulation=sim))
+        q_net = sim.q_net if 'qnet' in charts else None
 
-        if sim.voltage_results:
+        if ('adp90' in charts or 'qnet' in charts) and sim.voltage_results:
+            requested_concentrations = None
+            if sim.pk_or_concs == Simulation.PkOptions.compound_concentration_points:
+                requested_concentrations = tuple(to_float(c.concentration)
+                                                 for c in CompoundConcentrationPoint.objects.filter(simulation=sim))
             for percentile in sim.voltage_results[0]['da90']:
                 pct_label = f'Simulation @ {sim.pacing_frequency}Hz'
                 linewidth = 2
@@ -826,34 +1386,27 @@ class DataSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargs
                 else:
                     num_percentiles += 1
                 data['adp90'].append(series_dict)
-                if sim.q_net:
+                if q_net:
                     data['qnet'].append(copy.deepcopy(series_dict))
 
-            for v_res, qnet in zip_longest(sim.voltage_results[1:], (sim.q_net if sim.q_net else [])):
-                # cut off data for concentrations we haven't asked fro from qnet/adp90 graphs
-                if requested_concentrations and to_float(v_res['c']) not in requested_concentrations:
-                    continue
-                for i, da90 in enumerate(v_res['da90']):
-                    val = to_float(da90)
-                    data['adp90'][i]['data'].append([v_res['c'], val])
-                    update_unassigned(adp90_unasgn, val)
-                if qnet:
-                    for i, qnet in enumerate(qnet['qnet'].split(',')):
-                        val = to_float(qnet)
-                        data['qnet'][i]['data'].append([v_res['c'], val])
-                        update_unassigned(qnet_unasgn, val)
+            # cut off data for concentrations we haven't asked fro from qnet/adp90 graphs
+            q_net = q_net or []
+            rows = [(v_res, q_net[i] if i < len(q_net) else None) for i, v_res in enumerate(sim.voltage_results[1:])
+                    if not requested_concentrations or to_float(v_res['c']) in requested_concentrations]
+            add_series_data(data['adp90'], adp90_unasgn, [v_res['c'] for v_res, _ in rows],
+                            [v_res['da90'] for v_res, _ in rows])
+            qnet_rows = [(v_res['c'], qnet['qnet'].split(',')) for v_res, qnet in rows if qnet]
+            add_series_data(data['qnet'], qnet_unasgn, [c for c, _ in qnet_rows], [qnet for _, qnet in qnet_rows])
 
         # add pkd_results data
-        if sim.pkpd_results:
+        if 'pkpd' in charts and sim.pkpd_results:
             for i, _ in enumerate(listify(sim.pkpd_results[0]['apd90'])):
                 data['pkpd_results'].append({'label': f'Concentration {i + 1}', 'id': i, 'data': [],
                                              'lines': {'show': True, 'lineWidth': 2, 'fill': False},
                                              'points': {'show': False}, 'enabled': True})
-            for res in listify(sim.pkpd_results):
-                for i, conc in enumerate(listify(res['apd90'])):
-                    val = to_float(conc)
-                    data['pkpd_results'][i]['data'].append([res['timepoint'], val])
-                    update_unassigned(pkpd_unasgn, val)
+            pkpd_results = listify(sim.pkpd_results)
+            add_series_data(data['pkpd_results'], pkpd_unasgn, [res['timepoint'] for res in pkpd_results],
+                            [listify(res['apd90']) for res in pkpd_results])
 
         # scale y axis if there are unassigned values for qnet / adp90
         if adp90_unasgn['unassigned']:
@@ -867,12 +1420,8 @@ class DataSimulationView(LoginRequiredMixin, UserPassesTestMixin, UserFormKwargs
                                             'max': pkpd_unasgn['max_scale'] * pkpd_unasgn['max'], 'autoScale': 'none'}
 
         # add voltage traces data
-        if sim.voltage_traces:
-            for i, trace in enumerate(sim.voltage_traces):
-                data['traces'].append({'color': i, 'enabled': True,
-                                       'label': f"Simulation @ {sim.pacing_frequency} Hz @ {trace['name']} µM",
-                                       'data': [[series['name'], series['value']] for series in trace['series']]})
-
-        return JsonResponse(data=data,
-                            status=200, safe=False)
+        if 'traces' in charts and sim.voltage_traces:
+            data['traces'] = [self.trace_series(sim, i, trace) for i, trace in enumerate(sim.voltage_traces)
+                              if concentrations is None or to_float(trace['name']) in concentrations]
+        return data
 
@@ -0,0 +1,124 @@
+/*
+ * Persistent cache of (immutable) simulation results in the browser's IndexedDB.
+ * Entries are keyed by simulation pk, result version (see Simulation.result_version) and request,
+ * the least recently used entries are removed once the cache grows beyond `maxSize` bytes.
+ * If IndexedDB is not available all lookups miss and nothing gets stored.
+ */
+
+var resultCache = {
+  dbName: 'ap-nimbus-results',
+  storeName: 'results',
+  maxSize: 200 * 1024 * 1024,
+  db: null,
+  versions: {},
+
+  open: function()
+  {
+    if (this.db == null)
+    {
+      var cache = this;
+      this.db = new Promise(function(resolve, reject) {
+        if (!window.indexedDB)
+        {
+          reject('IndexedDB not available');
+          return;
+        }
+        var request = window.indexedDB.open(cache.dbName, 1);
+        request.onupgradeneeded = function() {
+          var store = request.result.createObjectStore(cache.storeName, {keyPath: 'key'});
+          store.createIndex('pk', 'pk');
+          store.createIndex('used', 'used');
+        };
+        request.onsuccess = function() { resolve(request.result); };
+        request.onerror = function() { reject(request.error); };
+      });
+    }
+    return this.db;
+  },
+
+  transaction: function(mode, action)
+  {
+    // run action(store) in a transaction, resolving with its result (or undefined on any error)
+    var cache = this;
+    return this.open().then(function(db) {
+      return new Promise(function(resolve, reject) {
+        var tx = db.transaction(cache.storeName, mode);
+        var result = action(tx.objectStore(cache.storeName));
+        tx.oncomplete = function() { resolve(result && result.result); };
+        tx.onerror = tx.onabort = function() { reject(tx.error); };
+      });
+    }).catch(function() { return undefined; });
+  },
+
+  get: function(pk, version, request)
+  {
+    // the cached response to the request, or undefined
+    if (!version)
+      return Promise.resolve(undefined);
+    var key = pk + '/' + version + '/' + request;
+    return this.transaction('readwrite', function(store) {
+      var get = store.get(key);
+      get.onsuccess = function() {
+        if (get.result)
+        {
+          get.result.used = Date.now();
+          store.put(get.result);
+        }
+      };
+      return get;
+    }).then(function(entry) { return entry && entry.data; });
+  },
+
+  put: function(pk, version, request, data, size)
+  {
+    if (!version)
+      return Promise.resolve();
+    var cache = this;
+    var entry = {key: pk + '/' + version + '/' + request, pk: pk, version: version, data: data, size: size,
+                 used: Date.now()};
+    return this.transaction('readwrite', function(store) { store.put(entry); }).then(function() {
+      return cache.trim();
+    });
+  },
+
+  trim: function()
+  {
+    // remove the least recently used entries beyond the maximum size
+    var cache = this;
+    return this.transaction('readwrite', function(store) {
+      var total = 0;
+      store.index('used').openCursor(null, 'prev').onsuccess = function(event) {
+        var cursor = event.target.result;
+        if (cursor)
+        {
+          total += cursor.value.size;
+          if (total > cache.maxSize)
+            cursor.delete();
+          cursor.continue();
+        }
+      };
+    });
+  },
+
+  evict: function(pk, version)
+  {
+    // remove the entries of a simulation for other result versions (e.g. after it has been restarted)
+    if (this.versions[pk] === version)
+      return Promise.resolve();
+    this.versions[pk] = version;
+    return this.transaction('readwrite', function(store) {
+      store.index('pk').openCursor(IDBKeyRange.only(pk)).onsuccess = function(event) {
+        var cursor = event.target.result;
+        if (cursor)
+        {
+          if (cursor.value.version !== version)
+            cursor.delete();
+          cursor.continue();
+        }
+      };
+    });
+  }
+};
+
+
+module.exports = resultCache;
@@ -29,8 +29,12 @@ require('./lib/flotcharts/jquery.flot.fillbetween.js');
 const marked = require("./lib/marked.min.js"); // Markdown render
 const SimpleMDE = require('./lib/simplemde.js');  // Simple markdown editor
 const notifications = require('./lib/notifications.js');
+const resultCache = require('./lib/resultcache.js');  // browser-side cache of results
 
 var graphRendered = false;
+var simulationPk = null;
+var resultVersion = null;
+var chartsLoaded = {};
 
 // set progressbar timeout, progressbar to update and get base url
 var progressBarTimeout = 3000;
@@ -98,6 +102,9 @@ function resetQnet(resetZoom){
             pkpd_resultsOptions = JSON.parse(JSON.stringify(pkpd_resultsOptionsNoZoom));
         }
         plotQnet('#pkpd_results-graph', 'pkpd_results', pkpd_resultsOptions);
+        if(chartsLoaded['pkpd_results']){  // make sure the legend does not get replotted
+            pkpd_resultsOptions['legend'] = {'show': false};
+        }
     }else if($('#adp90-graph').hasClass('show-graph')){
         if(resetZoom){
             adp90Options = JSON.parse(JSON.stringify(adp90OptionsNoZoom));
@@ -112,6 +119,9 @@ function resetQnet(resetZoom){
 }
 
 function plotQnet(divId, type, options){
+    if(!chartsLoaded[type]){ // the data is still loading, it is plotted once loaded
+        return;
+    }
     var data = [];
     for(let i=0; i< graphData[type].length; i++){
         if(graphData[type][i]['enabled']){
@@ -133,158 +143,240 @@ function plotTraces(tracesOptions){
 
 function toggleSeries(i){
     graphData['traces'][i].enabled = !graphData['traces'][i].enabled;
-    plotTraces(tracesOptions);
+    loadTraces([i], () => plotTraces(tracesOptions));
 }
 
-function renderGraph(pk){
-    $.ajax({type: 'GET',
-            url: `${base_url}/simulations/${pk}/data`,
-            dataType: 'json',
-            success: function(data) {
-                graphData = data;
-                // show messages if there are any
-                if(data['messages']){
-                    $('#messages').html(data['messages'].join('<br/>'));
-                    $("#messages-container").removeClass("hide-messages");
-                }
-                // set qnet series label and gather confidence intervals
-                for(let i=0; i< graphData['adp90'].length; i++){
-                    label = graphData['adp90'][i]['label'];
-                    const percentageMatch = label.match(/.+Hz (.+%).+/);
-                    if(percentageMatch == null){  // this is the main series set the label
-                        $('#qnet-series-name').html(label);
-                    }else{
-                        percentage = percentageMatch[1];
-                        if(confidencePercentages[percentage] == undefined){
-                            confidencePercentages[percentage] = [i];
-                        }else{
-                            confidencePercentages[percentage].push(i);
-                        }
-                    }
-                }
-                if (!$.isEmptyObject(confidencePercentages)){
-                    $('#confidence-percentages').removeClass('hide-messages');
-                    $('#confidence-percentages').empty();
-                    for (const [pct, series] of Object.entries(confidencePercentages)) {
-                        $('#confidence-percentages').append(`<input type="checkbox" id="${pct}" class="confidence-checkbox" checked> ${pct}<br/>`);
-                    }
-                }
-                // assign click action for confidence checkboxes
-                $('.confidence-checkbox').click(function(){
-                    for (const i of confidencePercentages[$(this).attr('id')]) {
-                        if(i < graphData['adp90'].length){
-                            graphData['adp90'][i]['enabled'] = !graphData['adp90'][i]['enabled'];
-                        }
-                        if(i < graphData['qnet'].length){
-                            graphData['qnet'][i]['enabled'] = !graphData['qnet'][i]['enabled'];
-                        }
-                    }
-                    resetQnet(false);
-                })
-                adp90Options = {legend: {show: false},
-                                grid: {hoverable: true, clickable: true},
-                                xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Concentration (μM)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05, },
-                                yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'Δ APD90 (%)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                selection: {mode: "xy"}
-                };
-                if($('#intermediate_point_log_scale_set').length > 0){
-                    adp90Options['xaxis']['mode'] = 'log';
-                };
-                if('adp90_y_scale' in graphData){  // if we are given a scale, apply it
-                    $.extend(adp90Options['yaxis'], adp90Options['yaxis'], graphData['adp90_y_scale'] );
-                }
+function decodeGraphData(buffer){
+    // decode the binary graph data (see DataSimulationView.binary_data), typed arrays use the platform's byte order
+    // which is little-endian on all supported browsers
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    for (const key of ['adp90', 'qnet', 'pkpd_results', 'traces']){
+        if(!(key in data)){
+            continue;
+        }
+        data[key].forEach(function (series) {
+            const ref = series['data'];
+            const arrayType = ref['dtype'] == 'f4' ? Float32Array : Float64Array;
+            const values = new arrayType(buffer, 4 + headerLength + ref['offset'], 2 * ref['length']);
+            series['data'] = Array.from({length: ref['length']}, (_, i) => [values[2 * i], values[2 * i + 1]]);
+        });
+    }
+    return data;
+}
 
-                tracesOptions = {legend: {show: true, container: $('#legendContainerTraces').get(0)},
-                                series: {lines: {show: true, lineWidth: 2}, points: {show: false}},
-                                grid: {hoverable: true, clickable: true},
-                                xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Time (ms)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'Membrane Voltage (mV)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                selection: {mode: "xy"}
-                };
-                plotQnet('#adp90-graph', 'adp90', adp90Options);
-                // clone options for zoom reset
-                adp90OptionsNoZoom = JSON.parse(JSON.stringify(adp90Options));
-                $('#adp90-graph').bind('plotselected', (event, ranges) => zoom(ranges, adp90Options, (opts) => plotQnet('#adp90-graph', 'adp90', adp90Options)));
-                $('#adp90-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Conc.: ', ' µM', 'Δ APD90: ', ' %', '#hoverdata'));
-                $('#adp90-graph').mouseout((event)=>hoverOut('Conc.: ', ' µM', 'Δ APD90: ', ' %', '#hoverdata'));
-
-                if(graphData['pkpd_results'].length > 0){
-                    // show graph, so we can draw
-                    $('#pkpd_results').click();
-
-                    pkpd_resultsOptions = {legend: {show: true, container: $('#legendContainerpkpd_results').get(0)},
-                                   series: {lines: {show: true, lineWidth: 2}, points: {show: true}},
-                                   grid: {hoverable: true, clickable: true},
-                                   xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Timepoint (h)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                   yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'ADP90 (ms)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                   selection: {mode: "xy"}
-                    };
-                    if('pkpd_results_y_scale' in graphData){  // if we are given a scale, apply it
-                        $.extend(pkpd_resultsOptions['yaxis'], pkpd_resultsOptions['yaxis'], graphData['pkpd_results_y_scale'] );
-                    }
-                    plotQnet('#pkpd_results-graph', 'pkpd_results', pkpd_resultsOptions);
-                    // make sure the legend does not get replotted
-                    pkpd_resultsOptions['legend'] = {'show': false};
-                    pkpd_resultsOptionsNoZoom = JSON.parse(JSON.stringify(pkpd_resultsOptions)); // clone options for zoom reset
-
-                    $('#pkpd_results-graph').bind('plotselected', (event, ranges) => zoom(ranges, pkpd_resultsOptions, (opts) => plotQnet('#pkpd_results-graph', 'pkpd_results', pkpd_resultsOptions)));
-                    $('#pkpd_results-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Timepoint: ', ' h', 'ADP90: ', ' ms', '#hoverdata'));
-                    $('#pkpd_results-graph').mouseout((event)=>hoverOut('Timepoint: ', ' h', 'ADP90: ', ' ms', '#hoverdata'));
-					$('#pkpd_results').show();
-                }else{
-                    // hide qnet button
-                    $('#pkpd_results').hide();
+function cachedGet(request, ajaxOptions, size, callback){
+    // get data from the browser's result cache, or fetch it (and cache it)
+    resultCache.get(simulationPk, resultVersion, request).then(function(cached){
+        if(cached !== undefined){
+            callback(cached);
+            return;
+        }
+        $.ajax(Object.assign({type: 'GET', url: `${base_url}/simulations/${simulationPk}/data/${request}`,
+                success: function(data){
+                    resultCache.put(simulationPk, resultVersion, request, data, size(data));
+                    callback(data);
                 }
+        }, ajaxOptions));
+    });
+}
 
-                if(graphData['qnet'].length > 0){
-                    // show graph, so we can draw
-                    $('#qnet').click();
-
-                    qnetOptions = {legend: {show: false},
-                                   series: {lines: {show: true, lineWidth: 2}, points: {show: true}},
-                                   grid: {hoverable: true, clickable: true},
-                                   xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Concentration (μM)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                   yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'qNet (C/F)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
-                                   selection: {mode: "xy"}
-                    };
-                    if($('#intermediate_point_log_scale_set').length > 0){
-                        qnetOptions['xaxis']['mode'] = 'log';
-                    };
-					
-                    if('qnet_y_scale' in graphData){  // if we are given a scale, apply it
-                        $.extend(qnetOptions['yaxis'], qnetOptions['yaxis'], graphData['qnet_y_scale'] );
-                    }
-                    qnetOptionsNoZoom = JSON.parse(JSON.stringify(qnetOptions)); // clone options for zoom reset
-                    plotQnet('#qnet-graph', 'qnet', qnetOptions);
-                    $('#qnet-graph').bind('plotselected', (event, ranges) => zoom(ranges, qnetOptions, (opts) => plotQnet('#qnet-graph', 'qnet', qnetOptions)));
-                    $('#qnet-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Conc.: ', ' µM', 'qNet: ', ' C/F', '#hoverdata'));
-                    $('#qnet-graph').mouseout((event)=>hoverOut('Conc.: ', ' µM', 'qNet: ', ' C/F', '#hoverdata'));
-                    $('#qnet').show();
-                }
-                plotTraces(tracesOptions);
-                // make sure the legend does not get replotted
-                tracesOptions['legend'] = {'show': false};
-                tracesOptionsNoZoom = JSON.parse(JSON.stringify(tracesOptions)); // clone options for zoom reset
-                $('#traces-graph').bind('plotselected', (event, ranges) => zoom(ranges, tracesOptions, plotTraces));
-                $('#traces-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Time: ', ' ms', 'Membrane Voltage: ', ' mV', '#hoverdataTraces'));
-                $('#traces-graph').mouseout((event)=>hoverOut('Time: ', ' ms', 'Membrane Voltage: ', ' mV', '#hoverdataTraces'));
-
-                // allow toggling voltage traces in legend
-                var labelIndex = 0;
-                var checboxesMapObj = {'\u2610': '\u2611', '\u2611': '\u2610'};
-                checboxes_regex_str = /\u2610|\u2611/gi;
-                $('#legendContainerTraces > .legendLayer > g').each(function(){
-                    textElem = $(this).find('text > tspan');
-                    textElem.html(`<a href="" onclick="event.preventDefault();" id='${labelIndex}' class='toggleTrace'>\u2611 ${textElem.html()}</a>`);
-                    link = $(textElem).find('a');
-                    link.click(function(){
-                        text = $(this).html().replace(checboxes_regex_str, (matched) => checboxesMapObj[matched]);
-                        $(this).html(text);
-                        toggleSeries($(this).attr('id'));
-                    });
-                    labelIndex++;
-                });
+function loadChartData(chart, query, callback){
+    // fetch the (binary) data of a single chart, see DataSimulationView
+    cachedGet(`${chart}?format=binary${query}`, {xhrFields: {responseType: 'arraybuffer'}}, (buffer) => buffer.byteLength,
+              (buffer) => callback(decodeGraphData(buffer)));
+}
+
+function loadTraces(indices, callback){
+    // fetch the data of the given traces, if not loaded yet
+    const toLoad = indices.filter((i) => !graphData['traces'][i].loaded);
+    if(toLoad.length == 0){
+        callback();
+        return;
+    }
+    toLoad.forEach((i) => graphData['traces'][i].loaded = true);
+    const query = toLoad.map((i) => `&conc=${encodeURIComponent(graphData['traces'][i].concentration)}`).join('');
+    loadChartData('traces', query, function(data){
+        data['traces'].forEach(function (trace) {
+            graphData['traces'][trace['color']]['data'] = trace['data'];
+        });
+        callback();
+    });
+}
+
+function showChart(type){
+    // the data of the ADP90, qNet and PKPD charts is loaded when the chart is first shown
+    if(type in chartsLoaded){
+        resetQnet(false);  // reset the graph so that selected intervals are drawn
+        return;
+    }
+    chartsLoaded[type] = false;
+    loadChartData({'adp90': 'adp90', 'qnet': 'qnet', 'pkpd_results': 'pkpd'}[type], '', function(data){
+        Object.assign(graphData, data);
+        chartSetup[type]();
+        chartsLoaded[type] = true;
+        resetQnet(false);
+    });
+}
+
+function setupAdp90(){
+    // set qnet series label and gather confidence intervals
+    for(let i=0; i< graphData['adp90'].length; i++){
+        label = graphData['adp90'][i]['label'];
+        const percentageMatch = label.match(/.+Hz (.+%).+/);
+        if(percentageMatch == null){  // this is the main series set the label
+            $('#qnet-series-name').html(label);
+        }else{
+            percentage = percentageMatch[1];
+            if(confidencePercentages[percentage] == undefined){
+                confidencePercentages[percentage] = [i];
+            }else{
+                confidencePercentages[percentage].push(i);
+            }
+        }
+    }
+    if (!$.isEmptyObject(confidencePercentages)){
+        $('#confidence-percentages').removeClass('hide-messages');
+        $('#confidence-percentages').empty();
+        for (const [pct, series] of Object.entries(confidencePercentages)) {
+            $('#confidence-percentages').append(`<input type="checkbox" id="${pct}" class="confidence-checkbox" checked> ${pct}<br/>`);
+        }
+    }
+    // assign click action for confidence checkboxes
+    $('.confidence-checkbox').click(function(){
+        for (const i of confidencePercentages[$(this).attr('id')]) {
+            if(i < graphData['adp90'].length){
+                graphData['adp90'][i]['enabled'] = !graphData['adp90'][i]['enabled'];
+            }
+            if(graphData['qnet'] && i < graphData['qnet'].length){
+                graphData['qnet'][i]['enabled'] = !graphData['qnet'][i]['enabled'];
+            }
+        }
+        resetQnet(false);
+    })
+    adp90Options = {legend: {show: false},
+                    grid: {hoverable: true, clickable: true},
+                    xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Concentration (μM)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05, },
+                    yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'Δ APD90 (%)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                    selection: {mode: "xy"}
+    };
+    if($('#intermediate_point_log_scale_set').length > 0){
+        adp90Options['xaxis']['mode'] = 'log';
+    };
+    if('adp90_y_scale' in graphData){  // if we are given a scale, apply it
+        $.extend(adp90Options['yaxis'], adp90Options['yaxis'], graphData['adp90_y_scale'] );
+    }
+    // clone options for zoom reset
+    adp90OptionsNoZoom = JSON.parse(JSON.stringify(adp90Options));
+    $('#adp90-graph').bind('plotselected', (event, ranges) => zoom(ranges, adp90Options, (opts) => plotQnet('#adp90-graph', 'adp90', adp90Options)));
+    $('#adp90-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Conc.: ', ' µM', 'Δ APD90: ', ' %', '#hoverdata'));
+    $('#adp90-graph').mouseout((event)=>hoverOut('Conc.: ', ' µM', 'Δ APD90: ', ' %', '#hoverdata'));
+}
+
+function setupPkpd(){
+    pkpd_resultsOptions = {legend: {show: true, container: $('#legendContainerpkpd_results').get(0)},
+                   series: {lines: {show: true, lineWidth: 2}, points: {show: true}},
+                   grid: {hoverable: true, clickable: true},
+                   xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Timepoint (h)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                   yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'ADP90 (ms)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                   selection: {mode: "xy"}
+    };
+    if('pkpd_results_y_scale' in graphData){  // if we are given a scale, apply it
+        $.extend(pkpd_resultsOptions['yaxis'], pkpd_resultsOptions['yaxis'], graphData['pkpd_results_y_scale'] );
+    }
+    pkpd_resultsOptionsNoZoom = JSON.parse(JSON.stringify(pkpd_resultsOptions)); // clone options for zoom reset
+    // make sure the legend does not get replotted (after it is first drawn)
+    pkpd_resultsOptionsNoZoom['legend'] = {'show': false};
+
+    $('#pkpd_results-graph').bind('plotselected', (event, ranges) => zoom(ranges, pkpd_resultsOptions, (opts) => plotQnet('#pkpd_results-graph', 'pkpd_results', pkpd_resultsOptions)));
+    $('#pkpd_results-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Timepoint: ', ' h', 'ADP90: ', ' ms', '#hoverdata'));
+    $('#pkpd_results-graph').mouseout((event)=>hoverOut('Timepoint: ', ' h', 'ADP90: ', ' ms', '#hoverdata'));
+}
 
+function setupQnet(){
+    // apply the confidence intervals selected so far
+    graphData['qnet'].forEach(function (series, i) {
+        if(graphData['adp90'] && i < graphData['adp90'].length){
+            series['enabled'] = graphData['adp90'][i]['enabled'];
+        }
+    });
+    qnetOptions = {legend: {show: false},
+                   series: {lines: {show: true, lineWidth: 2}, points: {show: true}},
+                   grid: {hoverable: true, clickable: true},
+                   xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Concentration (μM)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                   yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'qNet (C/F)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                   selection: {mode: "xy"}
+    };
+    if($('#intermediate_point_log_scale_set').length > 0){
+        qnetOptions['xaxis']['mode'] = 'log';
+    };
+
+    if('qnet_y_scale' in graphData){  // if we are given a scale, apply it
+        $.extend(qnetOptions['yaxis'], qnetOptions['yaxis'], graphData['qnet_y_scale'] );
+    }
+    qnetOptionsNoZoom = JSON.parse(JSON.stringify(qnetOptions)); // clone options for zoom reset
+    $('#qnet-graph').bind('plotselected', (event, ranges) => zoom(ranges, qnetOptions, (opts) => plotQnet('#qnet-graph', 'qnet', qnetOptions)));
+    $('#qnet-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Conc.: ', ' µM', 'qNet: ', ' C/F', '#hoverdata'));
+    $('#qnet-graph').mouseout((event)=>hoverOut('Conc.: ', ' µM', 'qNet: ', ' C/F', '#hoverdata'));
+}
+
+var chartSetup = {'adp90': setupAdp90, 'qnet': setupQnet, 'pkpd_results': setupPkpd};
+
+function setupTraces(){
+    tracesOptions = {legend: {show: true, container: $('#legendContainerTraces').get(0)},
+                    series: {lines: {show: true, lineWidth: 2}, points: {show: false}},
+                    grid: {hoverable: true, clickable: true},
+                    xaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'bottom', axisLabel: 'Time (ms)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                    yaxis: {axisLabelUseCanvas: true, axisLabelPadding: 10, position: 'left', axisLabel: 'Membrane Voltage (mV)', showTicks: false, showTickLabels: "all", autoscaleMargin: 0.05},
+                    selection: {mode: "xy"}
+    };
+    // initially only the traces at the lowest and highest concentration are shown (and downloaded)
+    const lastTrace = graphData['traces'].length - 1;
+    graphData['traces'].forEach((trace, i) => trace.enabled = (i == 0 || i == lastTrace));
+    // plot all traces (without data) to draw the legend
+    $.plot("#traces-graph", graphData['traces'], tracesOptions);
+    // make sure the legend does not get replotted
+    tracesOptions['legend'] = {'show': false};
+    tracesOptionsNoZoom = JSON.parse(JSON.stringify(tracesOptions)); // clone options for zoom reset
+    $('#traces-graph').bind('plotselected', (event, ranges) => zoom(ranges, tracesOptions, plotTraces));
+    $('#traces-graph').bind('plothover', (event, pos, item) => hover(event, pos, item, 'Time: ', ' ms', 'Membrane Voltage: ', ' mV', '#hoverdataTraces'));
+    $('#traces-graph').mouseout((event)=>hoverOut('Time: ', ' ms', 'Membrane Voltage: ', ' mV', '#hoverdataTraces'));
+
+    // allow toggling voltage traces in legend
+    var labelIndex = 0;
+    var checboxesMapObj = {'\u2610': '\u2611', '\u2611': '\u2610'};
+    checboxes_regex_str = /\u2610|\u2611/gi;
+    $('#legendContainerTraces > .legendLayer > g').each(function(){
+        textElem = $(this).find('text > tspan');
+        checkbox = graphData['traces'][labelIndex].enabled ? '\u2611' : '\u2610';
+        textElem.html(`<a href="" onclick="event.preventDefault();" id='${labelIndex}' class='toggleTrace'>${checkbox} ${textElem.html()}</a>`);
+        link = $(textElem).find('a');
+        link.click(function(){
+            text = $(this).html().replace(checboxes_regex_str, (matched) => checboxesMapObj[matched]);
+            $(this).html(text);
+            toggleSeries($(this).attr('id'));
+        });
+        labelIndex++;
+    });
+    loadTraces([0, lastTrace].filter((i) => i >= 0), () => plotTraces(tracesOptions));
+}
+
+function renderGraph(pk, version){
+    // first get what there is to show, the data of each chart / trace is loaded when it is shown
+    simulationPk = pk;
+    resultVersion = version;
+    cachedGet('info', {dataType: 'json'}, (info) => JSON.stringify(info).length,
+            function(info) {
+                graphData = {'traces': info['traces']};
+                chartsLoaded = {};
+                // show messages if there are any
+                if(info['messages']){
+                    $('#messages').html(info['messages'].join('<br/>'));
+                    $("#messages-container").removeClass("hide-messages");
+                }
+                $('#pkpd_results').toggle(info['charts'].includes('pkpd'));
+                $('#qnet').toggle(info['charts'].includes('qnet'));
+                setupTraces();
 
                 // add reset actions
                 $('#resetqnet').click(() => resetQnet(true));
@@ -297,7 +389,7 @@ function renderGraph(pk){
                 $('#adp90').click();
 				$('#adp90').show();
             }
-    });
+    );
 }
 
 function setSimulationButtonVisibility(button, isvisble){
@@ -310,6 +402,14 @@ function setSimulationButtonVisibility(button, isvisble){
     }
 }
 
+function setSpreadsheetState(pk, state){
+    // spreadsheets are built in the background, show when it's being prepared
+    const link = $(`#spreadsheetexport${pk} a`);
+    const title = state == 'preparing' ? 'Preparing spreadsheet (.xlsx)...' : 'Export as spreadsheet (.xlsx)';
+    link.attr('title', title);
+    link.find('img').attr('alt', title).css('opacity', state == 'preparing' ? 0.4 : 1);
+}
+
 function updateProgressbar(skipUpdate=false){
     progressbar_id = undefined;
     if($('.progressbar').length){
@@ -333,16 +433,23 @@ function updateProgressbar(skipUpdate=false){
                     data.forEach(function (simulation) {
                         bar = $(`#progressbar-${simulation['pk']}`);
                         // set label
-                        bar.find('.progress-label').text(simulation['progress']); // set label
+                        label = simulation['progress'];
+                        if(simulation['eta']){ // predicted finish time
+                            label += ` (expected to finish at ${new Date(simulation['eta']).toLocaleTimeString([], {hour: '2-digit', minute: '2-digit'})})`;
+                        }
+                        bar.find('.progress-label').text(label); // set label
                         // update icons
                         setSimulationButtonVisibility(`#spreadsheetexport${simulation['pk']}`, simulation['status'] == 'SUCCESS');
+                        setSpreadsheetState(simulation['pk'], simulation['spreadsheet']);
                         setSimulationButtonVisibility(`#restart${simulation['pk']}`, simulation['status'] == 'FAILED');
+                        // results of an earlier run (before a restart) are no longer needed
+                        resultCache.evict(simulation['pk'], simulation['version']);
                         // update progress bar
                         if(simulation['status'] == 'SUCCESS'){
                             bar.progressbar('value', 100);
                             // show graph
                             if($('#traces-graph').length > 0 && !graphRendered){
-                                renderGraph(simulation['pk']);
+                                renderGraph(simulation['pk'], simulation['version']);
                                 graphRendered = true;
                             }
                         }else{ // convert into number
@@ -378,6 +485,7 @@ function updateProgressIcons(skipUpdate=false){
                     icon = $(`#progressIcon-${simulation['pk']}`);
                     // update icons
                     setSimulationButtonVisibility(`#spreadsheetexport${simulation['pk']}`, simulation['status'] == 'SUCCESS');
+                    setSpreadsheetState(simulation['pk'], simulation['spreadsheet']);
                     setSimulationButtonVisibility(`#restart${simulation['pk']}`, simulation['status'] == 'FAILED');
                     // update progress icons
                     if(simulation['status'] == 'SUCCESS'){
@@ -608,7 +716,7 @@ $(document).ready(function(){
         scrollX: "850px",
         paging: true,
         fixedColumns: true,
-        order: [[1, 'desc']],
+        order: $('#simulations_table').data('ordered') ? [] : [[1, 'desc']], // keep the order by results
     } );
 
     // when we paginate to a different set of simulations, stop waiting & ask for status right away
@@ -643,7 +751,7 @@ $(document).ready(function(){
         $('#qnet').attr('disabled', false);
         $('#legendContainerpkpd_results').show();
         $('#legendContainerQnet').hide();
-        resetQnet(false);  // reset the graph so that selected intervals are drawn
+        showChart('pkpd_results');  // (load and) draw the graph, so that selected intervals are drawn
     });
 
     $('#adp90').click(function(){
@@ -658,7 +766,7 @@ $(document).ready(function(){
         $('#qnet').attr('disabled', false);
         $('#legendContainerpkpd_results').hide();
         $('#legendContainerQnet').show();
-        resetQnet(false);  // reset the graph so that selected intervals are drawn
+        showChart('adp90');  // (load and) draw the graph, so that selected intervals are drawn
     });
 
     $('#qnet').click(function(){
@@ -673,7 +781,7 @@ $(document).ready(function(){
         $('#qnet').attr('disabled', true);
         $('#legendContainerpkpd_results').hide();
         $('#legendContainerQnet').show();
-        resetQnet(false);  // reset the graph so that selected intervals are drawn
+        showChart('qnet');  // (load and) draw the graph, so that selected intervals are drawn
     });
 
     // model_name_tag and ap_predict_model_call only enabled if no file is selected
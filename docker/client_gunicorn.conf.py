@@ -0,0 +1,34 @@
+# gunicorn config for serving the client via ASGI (with uvicorn workers), used when DJANGO_SERVER=asgi
+import grp
+import os
+
+from prometheus_client import multiprocess
+
+
+chdir = '/opt/django/ap-nimbus-client/client'
+wsgi_app = 'config.asgi:application'
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# each worker handles many (mostly I/O bound) requests concurrently, so fewer processes are needed than with uwsgi
+workers = int(os.environ.get('ASGI_WORKERS', 4))
+
+bind = 'unix:/run/client.sock'
+pidfile = '/run/client.pid'
+user = 'appredict'
+group = 'appredict'
+
+# collect prometheus metrics over all worker processes (the directory is cleared on start up)
+raw_env = ['PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus_multiproc']
+
+errorlog = '/opt/django/media/gunicorn.log'
+graceful_timeout = 30
+
+
+def when_ready(server):
+    # allow nginx to connect to the socket
+    os.chown('/run/client.sock', 0, grp.getgrnam('www-data').gr_gid)
+    os.chmod('/run/client.sock', 0o660)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)